@@ -6,10 +6,44 @@ resource "aws_api_gateway_deployment" "crud_api_deployment" {
     aws_api_gateway_integration.read_integration,
     aws_api_gateway_integration.update_integration,
     aws_api_gateway_integration.delete_integration,
+    aws_api_gateway_integration.bulk_delete_integration,
   ]
 
   rest_api_id = aws_api_gateway_rest_api.crud_api.id
 
+  # A deployment is a snapshot of the API, so the stage is redeployed
+  # whenever a route, method, mapping template or response changes
+  triggers = {
+    redeployment = sha1(jsonencode([
+      aws_api_gateway_resource.items_resource,
+      aws_api_gateway_resource.item_resource,
+      aws_api_gateway_method.create_method,
+      aws_api_gateway_method.read_all_method,
+      aws_api_gateway_method.read_method,
+      aws_api_gateway_method.update_method,
+      aws_api_gateway_method.delete_method,
+      aws_api_gateway_method.bulk_delete_method,
+      aws_api_gateway_integration.create_integration,
+      aws_api_gateway_integration.read_all_integration,
+      aws_api_gateway_integration.read_integration,
+      aws_api_gateway_integration.update_integration,
+      aws_api_gateway_integration.delete_integration,
+      aws_api_gateway_integration.bulk_delete_integration,
+      aws_api_gateway_integration_response.create_integration_response,
+      aws_api_gateway_integration_response.read_all_integration_response,
+      aws_api_gateway_integration_response.read_integration_response,
+      aws_api_gateway_integration_response.update_integration_response,
+      aws_api_gateway_integration_response.delete_integration_response,
+      aws_api_gateway_integration_response.bulk_delete_integration_response,
+      aws_api_gateway_method_response.create_method_response,
+      aws_api_gateway_method_response.read_all_method_response,
+      aws_api_gateway_method_response.read_method_response,
+      aws_api_gateway_method_response.update_method_response,
+      aws_api_gateway_method_response.delete_method_response,
+      aws_api_gateway_method_response.bulk_delete_method_response,
+    ]))
+  }
+
   lifecycle {
     create_before_destroy = true
   }
@@ -79,6 +79,14 @@ resource "aws_api_gateway_method" "delete_method" {
   }
 }
 
+# DELETE method for bulk deleting items by ids or prefix
+resource "aws_api_gateway_method" "bulk_delete_method" {
+  rest_api_id   = aws_api_gateway_rest_api.crud_api.id
+  resource_id   = aws_api_gateway_resource.items_resource.id
+  http_method   = "DELETE"
+  authorization = "NONE"
+}
+
 # SQS integrations for API Gateway with single queue
 resource "aws_api_gateway_integration" "create_integration" {
   rest_api_id = aws_api_gateway_rest_api.crud_api.id
@@ -98,6 +106,7 @@ resource "aws_api_gateway_integration" "create_integration" {
     "application/json" = <<EOF
 Action=SendMessage&MessageBody=$util.urlEncode({
   "operation": "create",
+  "requestId": "$context.requestId",
   "payload": $input.json('$')
 })
 EOF
@@ -122,7 +131,12 @@ resource "aws_api_gateway_integration" "read_all_integration" {
     "application/json" = <<EOF
 Action=SendMessage&MessageBody=$util.urlEncode({
   "operation": "list",
-  "queryParams": $input.json('$')
+  "requestId": "$context.requestId",
+  "queryParams": {
+#foreach($param in $input.params().querystring.keySet())
+    "$param": "$util.escapeJavaScript($input.params().querystring.get($param))"#if($foreach.hasNext),#end
+#end
+  }
 })
 EOF
   }
@@ -146,7 +160,13 @@ resource "aws_api_gateway_integration" "read_integration" {
     "application/json" = <<EOF
 Action=SendMessage&MessageBody=$util.urlEncode({
   "operation": "get",
-  "id": "$input.params('id')"
+  "requestId": "$context.requestId",
+  "id": "$input.params('id')",
+  "queryParams": {
+#foreach($param in $input.params().querystring.keySet())
+    "$param": "$util.escapeJavaScript($input.params().querystring.get($param))"#if($foreach.hasNext),#end
+#end
+  }
 })
 EOF
   }
@@ -170,7 +190,9 @@ resource "aws_api_gateway_integration" "update_integration" {
     "application/json" = <<EOF
 Action=SendMessage&MessageBody=$util.urlEncode({
   "operation": "update",
+  "requestId": "$context.requestId",
   "id": "$input.params('id')",
+  "expectedVersion": "$util.escapeJavaScript($input.params('If-Match'))",
   "payload": $input.json('$')
 })
 EOF
@@ -195,12 +217,38 @@ resource "aws_api_gateway_integration" "delete_integration" {
     "application/json" = <<EOF
 Action=SendMessage&MessageBody=$util.urlEncode({
   "operation": "delete",
+  "requestId": "$context.requestId",
   "id": "$input.params('id')"
 })
 EOF
   }
 }
 
+resource "aws_api_gateway_integration" "bulk_delete_integration" {
+  rest_api_id = aws_api_gateway_rest_api.crud_api.id
+  resource_id = aws_api_gateway_resource.items_resource.id
+  http_method = aws_api_gateway_method.bulk_delete_method.http_method
+
+  type                    = "AWS"
+  integration_http_method = "POST"
+  uri                     = "arn:aws:apigateway:${var.aws_region}:sqs:path/${data.aws_caller_identity.current.account_id}/${aws_sqs_queue.crud_queue.name}"
+  credentials             = aws_iam_role.api_gateway_sqs_role.arn
+  
+  request_parameters = {
+    "integration.request.header.Content-Type" = "'application/x-www-form-urlencoded'"
+  }
+  
+  request_templates = {
+    "application/json" = <<EOF
+Action=SendMessage&MessageBody=$util.urlEncode({
+  "operation": "delete",
+  "requestId": "$context.requestId",
+  "payload": $input.json('$')
+})
+EOF
+  }
+}
+
 # API Gateway integration responses
 resource "aws_api_gateway_integration_response" "create_integration_response" {
   rest_api_id = aws_api_gateway_rest_api.crud_api.id
@@ -370,6 +418,39 @@ resource "aws_api_gateway_method_response" "delete_method_response" {
   }
 }
 
+resource "aws_api_gateway_integration_response" "bulk_delete_integration_response" {
+  rest_api_id = aws_api_gateway_rest_api.crud_api.id
+  resource_id = aws_api_gateway_resource.items_resource.id
+  http_method = aws_api_gateway_method.bulk_delete_method.http_method
+  status_code = aws_api_gateway_method_response.bulk_delete_method_response.status_code
+  
+  response_templates = {
+    "application/json" = <<EOF
+{
+  "message": "Bulk delete request received",
+  "requestId": "$context.requestId"
+}
+EOF
+  }
+  
+  depends_on = [aws_api_gateway_integration.bulk_delete_integration]
+}
+
+resource "aws_api_gateway_method_response" "bulk_delete_method_response" {
+  rest_api_id = aws_api_gateway_rest_api.crud_api.id
+  resource_id = aws_api_gateway_resource.items_resource.id
+  http_method = aws_api_gateway_method.bulk_delete_method.http_method
+  status_code = "202"
+  
+  response_models = {
+    "application/json" = "Empty"
+  }
+  
+  response_parameters = {
+    "method.response.header.Access-Control-Allow-Origin" = true
+  }
+}
+
 # IAM Role for API Gateway to send messages to SQS
 resource "aws_iam_role" "api_gateway_sqs_role" {
   name = "${var.project_name}-api-gateway-sqs-role"
@@ -0,0 +1,265 @@
+#!/usr/bin/env python3
+"""
+Cold-start benchmark for the Lambda handlers.
+
+Every handler is loaded in a fresh interpreter started with -X importtime.
+The script records the import time of lambda_function, the wall time of
+module init, and the latency of the first and second invocation. AWS calls
+go to a local stand-in endpoint that answers every request with an empty
+JSON document, so no AWS account is needed.
+
+Usage:
+    python benchmarks/cold_start.py                     # compare with baseline
+    python benchmarks/cold_start.py --update-baseline   # store a new baseline
+    python benchmarks/cold_start.py --mode eager --handlers create read
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+BENCHMARK_DIR = os.path.dirname(os.path.abspath(__file__))
+FUNCTIONS_DIR = os.path.join(os.path.dirname(BENCHMARK_DIR), 'lambda-functions')
+SHARED_DIR = os.path.join(FUNCTIONS_DIR, 'shared')
+DEFAULT_BASELINE = os.path.join(BENCHMARK_DIR, 'cold_start_baseline.json')
+
+METRICS = ('import_ms', 'init_ms', 'first_invoke_ms', 'warm_invoke_ms')
+
+
+def sqs_event(message):
+    return {
+        'Records': [{
+            'messageId': 'benchmark-message',
+            'body': json.dumps(message)
+        }]
+    }
+
+
+def websocket_event(route, body=None, query=None):
+    return {
+        'requestContext': {
+            'connectionId': 'benchmark-connection',
+            'routeKey': route,
+            'domainName': 'localhost',
+            'stage': 'benchmark'
+        },
+        'queryStringParameters': query or {},
+        'body': json.dumps(body or {})
+    }
+
+
+# One representative event per handler. websocket-default posts to
+# https://<domainName>, which the plain HTTP stand-in cannot serve, so its
+# invocation measures the error path.
+HANDLER_EVENTS = {
+    'create': sqs_event({'operation': 'create', 'requestId': 'r-1', 'payload': {'name': 'item'}}),
+    'read': sqs_event({'operation': 'get', 'requestId': 'r-2', 'id': 'item-1'}),
+    'update': sqs_event({'operation': 'update', 'requestId': 'r-3', 'id': 'item-1', 'payload': {'name': 'new'}}),
+    'delete': sqs_event({'operation': 'delete', 'requestId': 'r-4', 'id': 'item-1'}),
+    'notification': sqs_event({'requestId': 'r-5', 'operation': 'create', 'status': 'success', 'result': {'id': 'item-1'}}),
+    'websocket-connect': websocket_event('$connect', query={'requestId': 'r-6'}),
+    'websocket-disconnect': websocket_event('$disconnect'),
+    'websocket-default': websocket_event('$default', body={'action': 'ping'}),
+}
+
+# Runs inside the fresh interpreter; prints one JSON line with the timings
+CHILD_SCRIPT = '''
+import json, sys, time
+start = time.perf_counter()
+sys.path[:0] = [sys.argv[1], sys.argv[2]]
+import lambda_function
+imported = time.perf_counter()
+
+class Context:
+    function_name = 'benchmark'
+    aws_request_id = 'benchmark'
+    def get_remaining_time_in_millis(self):
+        return 15000
+
+event = json.loads(sys.argv[3])
+lambda_function.lambda_handler(event, Context())
+first = time.perf_counter()
+lambda_function.lambda_handler(event, Context())
+second = time.perf_counter()
+print('BENCHMARK ' + json.dumps({
+    'init_ms': (imported - start) * 1000,
+    'first_invoke_ms': (first - imported) * 1000,
+    'warm_invoke_ms': (second - first) * 1000
+}))
+'''
+
+
+class StandInHandler(BaseHTTPRequestHandler):
+    """Answers every AWS API call with an empty JSON document"""
+
+    def do_POST(self):
+        self.rfile.read(int(self.headers.get('Content-Length') or 0))
+        body = b'{}'
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/x-amz-json-1.0')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    do_GET = do_POST
+    do_PUT = do_POST
+    do_DELETE = do_POST
+
+    def log_message(self, format, *args):
+        pass
+
+
+def start_stand_in():
+    server = ThreadingHTTPServer(('127.0.0.1', 0), StandInHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f'http://127.0.0.1:{server.server_address[1]}'
+
+
+def child_env(endpoint, mode):
+    env = dict(os.environ)
+    env.update({
+        'AWS_ENDPOINT_URL': endpoint,
+        'AWS_ACCESS_KEY_ID': 'benchmark',
+        'AWS_SECRET_ACCESS_KEY': 'benchmark',
+        'AWS_DEFAULT_REGION': 'us-east-1',
+        'AWS_MAX_ATTEMPTS': '1',
+        'TABLE_NAME': 'benchmark-items',
+        'CONNECTIONS_TABLE_NAME': 'benchmark-connections',
+        'NOTIFICATION_QUEUE_URL': f'{endpoint}/000000000000/benchmark-notifications',
+        'WEBSOCKET_API_ENDPOINT': endpoint,
+        'LOG_LEVEL': 'ERROR',
+        'COLD_START_MODE': mode,
+        'PYTHONDONTWRITEBYTECODE': '1'
+    })
+    return env
+
+
+def parse_import_time(stderr):
+    """
+    Return the cumulative import time of lambda_function in milliseconds
+    """
+    for line in stderr.splitlines():
+        if not line.startswith('import time:'):
+            continue
+        parts = line.split('|')
+        if len(parts) == 3 and parts[2].strip() == 'lambda_function':
+            return int(parts[1].strip()) / 1000
+    return None
+
+
+def run_once(name, env):
+    function_dir = os.path.join(FUNCTIONS_DIR, name)
+    result = subprocess.run(
+        [sys.executable, '-X', 'importtime', '-c', CHILD_SCRIPT,
+         function_dir, SHARED_DIR, json.dumps(HANDLER_EVENTS[name])],
+        env=env, capture_output=True, text=True, timeout=120
+    )
+    timings = None
+    for line in result.stdout.splitlines():
+        if line.startswith('BENCHMARK '):
+            timings = json.loads(line[len('BENCHMARK '):])
+    if result.returncode != 0 or timings is None:
+        raise RuntimeError(f"{name} failed:\n{result.stderr[-2000:]}")
+    timings['import_ms'] = parse_import_time(result.stderr)
+    return timings
+
+
+def benchmark(names, runs, mode):
+    server, endpoint = start_stand_in()
+    env = child_env(endpoint, mode)
+    results = {}
+    try:
+        for name in names:
+            samples = [run_once(name, env) for _ in range(runs)]
+            results[name] = {
+                metric: round(statistics.median(sample[metric] for sample in samples), 2)
+                for metric in METRICS
+            }
+    finally:
+        server.shutdown()
+    return results
+
+
+def compare(results, baseline, threshold, min_delta_ms):
+    """
+    Return a list of (handler, metric, baseline, current) regressions
+    """
+    regressions = []
+    for name, metrics in results.items():
+        for metric, value in metrics.items():
+            previous = baseline.get(name, {}).get(metric)
+            if previous is None or value is None:
+                continue
+            if value > previous * (1 + threshold) and value - previous > min_delta_ms:
+                regressions.append((name, metric, previous, value))
+    return regressions
+
+
+def print_table(results, baseline):
+    header = f"{'handler':<22}" + ''.join(f"{metric:>18}" for metric in METRICS)
+    print(header)
+    print('-' * len(header))
+    for name, metrics in results.items():
+        cells = []
+        for metric in METRICS:
+            value = metrics[metric]
+            previous = baseline.get(name, {}).get(metric)
+            cell = f"{value:.1f}" if value is not None else 'n/a'
+            if previous and value is not None:
+                cell += f" ({(value - previous) / previous:+.0%})"
+            cells.append(f"{cell:>18}")
+        print(f"{name:<22}" + ''.join(cells))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--handlers', nargs='+', choices=sorted(HANDLER_EVENTS), default=list(HANDLER_EVENTS))
+    parser.add_argument('--runs', type=int, default=5, help='fresh interpreters per handler (median is reported)')
+    parser.add_argument('--mode', choices=['lazy', 'eager'], default='lazy', help='COLD_START_MODE for the handlers')
+    parser.add_argument('--baseline', default=DEFAULT_BASELINE)
+    parser.add_argument('--update-baseline', action='store_true')
+    parser.add_argument('--threshold', type=float, default=0.2, help='allowed relative slowdown')
+    parser.add_argument('--min-delta-ms', type=float, default=5.0, help='ignore slowdowns smaller than this')
+    parser.add_argument('--output', help='also write the results as JSON to this file')
+    args = parser.parse_args()
+
+    results = benchmark(args.handlers, args.runs, args.mode)
+
+    baseline = {}
+    if os.path.exists(args.baseline):
+        with open(args.baseline) as f:
+            baseline = json.load(f).get(args.mode, {})
+
+    print_table(results, baseline)
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump({args.mode: results}, f, indent=2)
+
+    if args.update_baseline:
+        stored = {}
+        if os.path.exists(args.baseline):
+            with open(args.baseline) as f:
+                stored = json.load(f)
+        stored.setdefault(args.mode, {}).update(results)
+        with open(args.baseline, 'w') as f:
+            json.dump(stored, f, indent=2, sort_keys=True)
+        print(f"\nBaseline written to {args.baseline}")
+        return 0
+
+    if not baseline:
+        print("\nNo baseline found, run with --update-baseline to store one")
+        return 0
+
+    regressions = compare(results, baseline, args.threshold, args.min_delta_ms)
+    for name, metric, previous, value in regressions:
+        print(f"REGRESSION {name} {metric}: {previous:.1f} ms -> {value:.1f} ms")
+    return 1 if regressions else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
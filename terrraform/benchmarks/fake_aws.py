@@ -0,0 +1,995 @@
+"""
+In-memory stand-ins for DynamoDB, SQS and the API Gateway Management API.
+
+FakeAWS answers the HTTP requests of real botocore clients through the
+before-send event, so request serialization, response parsing and retry
+handling run exactly as in Lambda while no network or AWS account is
+involved. Every call is counted per operation and can be slowed down by a
+configurable per-service latency or rejected with an injected throttle.
+
+Only the subset of each API used by the Lambda functions is implemented.
+"""
+import base64
+import hashlib
+import json
+import random
+import re
+import threading
+import time
+import uuid
+import zlib
+from collections import Counter
+from decimal import Decimal
+
+from botocore.awsrequest import AWSResponse
+
+DYNAMODB_ERROR_PREFIX = 'com.amazonaws.dynamodb.v20120810#'
+SQS_ERROR_PREFIX = 'com.amazonaws.sqs#'
+
+SCAN_PAGE_BYTES = 1024 * 1024
+
+
+class FakeAWSError(Exception):
+    """Raised by a fake operation; turned into an AWS error response"""
+
+    def __init__(self, code, message, status=400, extra=None):
+        super().__init__(message)
+        self.code = code
+        self.message = message
+        self.status = status
+        self.extra = extra or {}
+
+
+class RawBody:
+    """Minimal raw body accepted by AWSResponse"""
+
+    def __init__(self, data):
+        self.data = data
+
+    def stream(self, **kwargs):
+        yield self.data
+
+
+# ---------------------------------------------------------------------------
+# AttributeValue helpers
+# ---------------------------------------------------------------------------
+
+def to_python(value):
+    """
+    Convert an AttributeValue to a comparable Python value
+    """
+    if value is None:
+        return None
+    (kind, data), = value.items()
+    if kind == 'S':
+        return data
+    if kind == 'N':
+        return Decimal(data)
+    if kind == 'B':
+        return base64.b64decode(data) if isinstance(data, str) else data
+    if kind == 'BOOL':
+        return data
+    if kind == 'NULL':
+        return None
+    if kind == 'M':
+        return {key: to_python(item) for key, item in data.items()}
+    if kind == 'L':
+        return [to_python(item) for item in data]
+    if kind == 'SS':
+        return set(data)
+    if kind == 'NS':
+        return {Decimal(item) for item in data}
+    if kind == 'BS':
+        return set(data)
+    raise FakeAWSError('ValidationException', f'Unsupported attribute type {kind}')
+
+
+def number(value):
+    """
+    Return an N AttributeValue for a Decimal
+    """
+    text = format(value.normalize(), 'f') if value == value.to_integral_value() else str(value)
+    return {'N': text}
+
+
+def key_string(key):
+    return json.dumps(key, sort_keys=True)
+
+
+def item_size(item):
+    return len(json.dumps(item))
+
+
+# ---------------------------------------------------------------------------
+# Expressions
+# ---------------------------------------------------------------------------
+
+TOKEN_PATTERN = re.compile(r'\s*(?:(#[\w-]+)|(:[\w-]+)|(<>|<=|>=|=|<|>)|([(),\[\].+-])|(\w+))')
+KEYWORDS = {'AND', 'OR', 'NOT', 'BETWEEN', 'IN', 'SET', 'REMOVE', 'ADD', 'DELETE'}
+
+
+def tokenize(expression):
+    tokens = []
+    position = 0
+    expression = expression.rstrip()
+    while position < len(expression):
+        match = TOKEN_PATTERN.match(expression, position)
+        if not match or match.end() == position:
+            raise FakeAWSError('ValidationException', f'Invalid expression: {expression}')
+        name, value, comparator, symbol, word = match.groups()
+        if name:
+            tokens.append(('name', name))
+        elif value:
+            tokens.append(('value', value))
+        elif comparator:
+            tokens.append(('cmp', comparator))
+        elif symbol:
+            tokens.append(('sym', symbol))
+        elif word.upper() in KEYWORDS:
+            tokens.append(('kw', word.upper()))
+        else:
+            tokens.append(('word', word))
+        position = match.end()
+    return tokens
+
+
+class Parser:
+    """
+    Recursive descent parser for condition, key condition, projection and
+    update expressions. Paths are returned as lists of map keys and list
+    indexes, values as AttributeValues.
+    """
+
+    def __init__(self, expression, names=None, values=None):
+        self.tokens = tokenize(expression or '')
+        self.position = 0
+        self.names = names or {}
+        self.values = values or {}
+
+    def peek(self, offset=0):
+        index = self.position + offset
+        return self.tokens[index] if index < len(self.tokens) else (None, None)
+
+    def next(self):
+        token = self.peek()
+        self.position += 1
+        return token
+
+    def accept(self, kind, text=None):
+        token_kind, token_text = self.peek()
+        if token_kind == kind and (text is None or token_text == text):
+            self.position += 1
+            return True
+        return False
+
+    def expect(self, kind, text=None):
+        if not self.accept(kind, text):
+            raise FakeAWSError('ValidationException', f'Expected {text or kind} at token {self.peek()}')
+
+    def done(self):
+        return self.position >= len(self.tokens)
+
+    # Paths and operands
+
+    def name(self, token):
+        kind, text = token
+        if kind == 'name':
+            if text not in self.names:
+                raise FakeAWSError('ValidationException', f'Unresolved attribute name {text}')
+            return self.names[text]
+        if kind == 'word':
+            return text
+        raise FakeAWSError('ValidationException', f'Expected attribute name at token {token}')
+
+    def path(self):
+        elements = [self.name(self.next())]
+        while True:
+            if self.accept('sym', '.'):
+                elements.append(self.name(self.next()))
+            elif self.accept('sym', '['):
+                kind, text = self.next()
+                elements.append(int(text))
+                self.expect('sym', ']')
+            else:
+                return elements
+
+    def value(self, token):
+        if token[1] not in self.values:
+            raise FakeAWSError('ValidationException', f'Unresolved attribute value {token[1]}')
+        return self.values[token[1]]
+
+    def operand(self):
+        """
+        Return a function item -> AttributeValue
+        """
+        kind, text = self.peek()
+        if kind == 'value':
+            value = self.value(self.next())
+            return lambda item: value
+        if kind == 'word' and text == 'size' and self.peek(1) == ('sym', '('):
+            self.position += 2
+            path = self.path()
+            self.expect('sym', ')')
+
+            def size(item):
+                value = resolve(item, path)
+                if value is None:
+                    return None
+                (value_kind, data), = value.items()
+                length = len(base64.b64decode(data)) if value_kind == 'B' else len(data)
+                return {'N': str(length)}
+            return size
+        path = self.path()
+        return lambda item: resolve(item, path)
+
+    # Conditions
+
+    def condition(self):
+        left = self.conjunction()
+        while self.accept('kw', 'OR'):
+            right = self.conjunction()
+            left = (lambda a, b: lambda item: a(item) or b(item))(left, right)
+        return left
+
+    def conjunction(self):
+        left = self.negation()
+        while self.accept('kw', 'AND'):
+            right = self.negation()
+            left = (lambda a, b: lambda item: a(item) and b(item))(left, right)
+        return left
+
+    def negation(self):
+        if self.accept('kw', 'NOT'):
+            inner = self.negation()
+            return lambda item: not inner(item)
+        return self.predicate()
+
+    def predicate(self):
+        if self.accept('sym', '('):
+            inner = self.condition()
+            self.expect('sym', ')')
+            return inner
+
+        kind, text = self.peek()
+        if kind == 'word' and text in CONDITION_FUNCTIONS and self.peek(1) == ('sym', '('):
+            self.position += 2
+            path = self.path()
+            argument = None
+            if self.accept('sym', ','):
+                argument = self.operand()
+            self.expect('sym', ')')
+            function = CONDITION_FUNCTIONS[text]
+            return lambda item: function(resolve(item, path), argument(item) if argument else None)
+
+        left = self.operand()
+        if self.accept('kw', 'BETWEEN'):
+            low = self.operand()
+            self.expect('kw', 'AND')
+            high = self.operand()
+            return lambda item: compare('<=', low(item), left(item)) and compare('<=', left(item), high(item))
+        if self.accept('kw', 'IN'):
+            self.expect('sym', '(')
+            candidates = [self.operand()]
+            while self.accept('sym', ','):
+                candidates.append(self.operand())
+            self.expect('sym', ')')
+            return lambda item: any(compare('=', left(item), candidate(item)) for candidate in candidates)
+
+        kind, comparator = self.next()
+        if kind != 'cmp':
+            raise FakeAWSError('ValidationException', f'Expected comparator, got {comparator}')
+        right = self.operand()
+        return lambda item: compare(comparator, left(item), right(item))
+
+    # Projections
+
+    def projection(self):
+        paths = [self.path()]
+        while self.accept('sym', ','):
+            paths.append(self.path())
+        return paths
+
+    # Updates
+
+    def update(self):
+        actions = []
+        while not self.done():
+            kind, clause = self.next()
+            if kind != 'kw' or clause not in ('SET', 'REMOVE', 'ADD', 'DELETE'):
+                raise FakeAWSError('ValidationException', f'Invalid update clause {clause}')
+            while True:
+                path = self.path()
+                if clause == 'SET':
+                    self.expect('cmp', '=')
+                    actions.append((clause, path, self.set_value()))
+                elif clause == 'REMOVE':
+                    actions.append((clause, path, None))
+                else:
+                    actions.append((clause, path, self.value(self.next())))
+                if not self.accept('sym', ','):
+                    break
+        return actions
+
+    def set_value(self):
+        left = self.set_operand()
+        if self.accept('sym', '+'):
+            right = self.set_operand()
+            return lambda item: arithmetic(left(item), right(item), 1)
+        if self.accept('sym', '-'):
+            right = self.set_operand()
+            return lambda item: arithmetic(left(item), right(item), -1)
+        return left
+
+    def set_operand(self):
+        kind, text = self.peek()
+        if kind == 'word' and text in ('if_not_exists', 'list_append') and self.peek(1) == ('sym', '('):
+            self.position += 2
+            first = self.set_operand()
+            self.expect('sym', ',')
+            second = self.set_operand()
+            self.expect('sym', ')')
+            if text == 'if_not_exists':
+                return lambda item: first(item) if first(item) is not None else second(item)
+            return lambda item: {'L': (first(item) or {'L': []})['L'] + (second(item) or {'L': []})['L']}
+        return self.operand()
+
+
+def resolve(item, path):
+    value = {'M': item}
+    for element in path:
+        if isinstance(element, int):
+            if 'L' not in value or element >= len(value['L']):
+                return None
+            value = value['L'][element]
+        else:
+            if 'M' not in value or element not in value['M']:
+                return None
+            value = value['M'][element]
+    return value
+
+
+def assign(item, path, value):
+    container = {'M': item}
+    for element in path[:-1]:
+        container = container['M' if not isinstance(element, int) else 'L'][element]
+    last = path[-1]
+    if isinstance(last, int):
+        values = container['L']
+        if last >= len(values):
+            values.append(value)
+        else:
+            values[last] = value
+    else:
+        container['M'][last] = value
+
+
+def remove(item, path):
+    container = resolve(item, path[:-1]) if len(path) > 1 else {'M': item}
+    if container is None:
+        return
+    last = path[-1]
+    if isinstance(last, int):
+        if 'L' in container and last < len(container['L']):
+            del container['L'][last]
+    else:
+        container.get('M', {}).pop(last, None)
+
+
+def compare(comparator, left, right):
+    if left is None or right is None:
+        return comparator == '<>' and (left is None) != (right is None)
+    if next(iter(left)) != next(iter(right)):
+        return comparator == '<>'
+    a, b = to_python(left), to_python(right)
+    if comparator == '=':
+        return a == b
+    if comparator == '<>':
+        return a != b
+    try:
+        return {'<': a < b, '<=': a <= b, '>': a > b, '>=': a >= b}[comparator]
+    except TypeError:
+        return False
+
+
+def arithmetic(left, right, sign):
+    if left is None or right is None or 'N' not in left or 'N' not in right:
+        raise FakeAWSError('ValidationException', 'An operand in the update expression has an incorrect data type')
+    return number(Decimal(left['N']) + sign * Decimal(right['N']))
+
+
+def begins_with(value, prefix):
+    if value is None or prefix is None or next(iter(value)) != next(iter(prefix)):
+        return False
+    return to_python(value).startswith(to_python(prefix))
+
+
+def contains(value, operand):
+    if value is None or operand is None:
+        return False
+    container = to_python(value)
+    if isinstance(container, str):
+        return 'S' in operand and operand['S'] in container
+    return to_python(operand) in container
+
+
+CONDITION_FUNCTIONS = {
+    'attribute_exists': lambda value, _: value is not None,
+    'attribute_not_exists': lambda value, _: value is None,
+    'begins_with': begins_with,
+    'contains': contains,
+    'attribute_type': lambda value, kind: value is not None and next(iter(value)) == to_python(kind),
+}
+
+
+def condition_function(expression, names, values):
+    if not expression:
+        return None
+    parser = Parser(expression, names, values)
+    function = parser.condition()
+    if not parser.done():
+        raise FakeAWSError('ValidationException', f'Unexpected token {parser.peek()} in {expression}')
+    return function
+
+
+def project(item, expression, names):
+    if not expression:
+        return item
+    projected = {}
+    for path in Parser(expression, names).projection():
+        value = resolve(item, path)
+        if value is None:
+            continue
+        # Nested paths keep their enclosing maps, list elements are compacted
+        parents, last = path[:-1], path[-1]
+        list_name = None
+        if isinstance(last, int) and parents and not isinstance(parents[-1], int):
+            list_name = parents.pop()
+        target = projected
+        for element in parents:
+            if isinstance(element, int):
+                break
+            target = target.setdefault(element, {'M': {}})['M']
+        else:
+            if list_name is not None:
+                target.setdefault(list_name, {'L': []})['L'].append(json.loads(json.dumps(value)))
+            else:
+                target[last] = json.loads(json.dumps(value))
+            continue
+        projected[path[0]] = json.loads(json.dumps(resolve(item, path[:1])))
+    return projected
+
+
+# ---------------------------------------------------------------------------
+# DynamoDB
+# ---------------------------------------------------------------------------
+
+class FakeTable:
+    """
+    One table with a hash key, optional range key and global secondary indexes
+    """
+
+    def __init__(self, name, hash_key, range_key=None, indexes=None):
+        self.name = name
+        self.hash_key = hash_key
+        self.range_key = range_key
+        # index name -> (hash key, range key)
+        self.indexes = dict(indexes or {})
+        self.items = {}
+
+    def key_of(self, item):
+        key = {self.hash_key: item[self.hash_key]}
+        if self.range_key:
+            key[self.range_key] = item[self.range_key]
+        return key
+
+    def validate_key(self, key):
+        expected = {self.hash_key} | ({self.range_key} if self.range_key else set())
+        if set(key) != expected:
+            raise FakeAWSError('ValidationException', 'The provided key element does not match the schema')
+        return key_string(key)
+
+    def put(self, item):
+        if self.hash_key not in item or (self.range_key and self.range_key not in item):
+            raise FakeAWSError('ValidationException', 'One or more parameter values were invalid: Missing the key')
+        self.items[key_string(self.key_of(item))] = item
+
+
+class FakeDynamoDB:
+    """
+    DynamoDB operations working on AttributeValue documents
+    """
+
+    def __init__(self, unprocessed_rate=0.0, seed=None):
+        self.tables = {}
+        self.lock = threading.RLock()
+        self.unprocessed_rate = unprocessed_rate
+        self.random = random.Random(seed)
+
+    def create_table(self, name, hash_key, range_key=None, indexes=None):
+        self.tables[name] = FakeTable(name, hash_key, range_key, indexes)
+        return self.tables[name]
+
+    def table(self, name):
+        if name not in self.tables:
+            raise FakeAWSError('ResourceNotFoundException', f'Requested resource not found: Table: {name} not found')
+        return self.tables[name]
+
+    def unprocessed(self):
+        return self.unprocessed_rate and self.random.random() < self.unprocessed_rate
+
+    def check_condition(self, params, current):
+        condition = condition_function(
+            params.get('ConditionExpression'),
+            params.get('ExpressionAttributeNames'),
+            params.get('ExpressionAttributeValues')
+        )
+        if condition and not condition(current or {}):
+            extra = {}
+            if current and params.get('ReturnValuesOnConditionCheckFailure') == 'ALL_OLD':
+                extra['Item'] = current
+            raise FakeAWSError('ConditionalCheckFailedException', 'The conditional request failed', extra=extra)
+
+    def DescribeTable(self, params):
+        table = self.table(params['TableName'])
+
+        def key_schema(hash_key, range_key):
+            return [
+                {'AttributeName': name, 'KeyType': key_type}
+                for name, key_type in ((hash_key, 'HASH'), (range_key, 'RANGE')) if name
+            ]
+
+        names = {table.hash_key, table.range_key} | {key for keys in table.indexes.values() for key in keys}
+        return {'Table': {
+            'TableName': table.name,
+            'KeySchema': key_schema(table.hash_key, table.range_key),
+            # The fake only models string keys
+            'AttributeDefinitions': [{'AttributeName': name, 'AttributeType': 'S'} for name in sorted(names - {None})],
+            'GlobalSecondaryIndexes': [
+                {'IndexName': name, 'KeySchema': key_schema(*keys)} for name, keys in table.indexes.items()
+            ],
+            'ItemCount': len(table.items)
+        }}
+
+    def GetItem(self, params):
+        with self.lock:
+            table = self.table(params['TableName'])
+            item = table.items.get(table.validate_key(params['Key']))
+            if item is None:
+                return {}
+            return {'Item': project(item, params.get('ProjectionExpression'), params.get('ExpressionAttributeNames'))}
+
+    def PutItem(self, params):
+        with self.lock:
+            table = self.table(params['TableName'])
+            key = key_string(table.key_of(params['Item'])) if table.hash_key in params['Item'] else None
+            current = table.items.get(key)
+            self.check_condition(params, current)
+            table.put(params['Item'])
+            if params.get('ReturnValues') == 'ALL_OLD' and current:
+                return {'Attributes': current}
+            return {}
+
+    def UpdateItem(self, params):
+        with self.lock:
+            table = self.table(params['TableName'])
+            key = table.validate_key(params['Key'])
+            current = table.items.get(key)
+            self.check_condition(params, current)
+
+            item = json.loads(json.dumps(current)) if current else dict(params['Key'])
+            parser = Parser(params.get('UpdateExpression'), params.get('ExpressionAttributeNames'),
+                            params.get('ExpressionAttributeValues'))
+            actions = parser.update()
+            # All operands are evaluated against the item before the update
+            updates = []
+            for clause, path, operand in actions:
+                if clause == 'SET':
+                    updates.append((clause, path, operand(current or dict(params['Key']))))
+                else:
+                    updates.append((clause, path, operand))
+            for clause, path, value in updates:
+                if path[0] in params['Key']:
+                    raise FakeAWSError('ValidationException', 'Cannot update attribute that is part of the key')
+                if clause == 'SET':
+                    assign(item, path, value)
+                elif clause == 'REMOVE':
+                    remove(item, path)
+                elif clause == 'ADD':
+                    existing = resolve(item, path)
+                    if 'N' in value:
+                        assign(item, path, arithmetic(existing or {'N': '0'}, value, 1))
+                    else:
+                        (kind, members), = value.items()
+                        merged = list(dict.fromkeys((existing or {kind: []})[kind] + members))
+                        assign(item, path, {kind: merged})
+                elif clause == 'DELETE':
+                    existing = resolve(item, path)
+                    if existing:
+                        (kind, members), = value.items()
+                        assign(item, path, {kind: [m for m in existing[kind] if m not in members]})
+            table.items[key] = item
+
+            return_values = params.get('ReturnValues', 'NONE')
+            if return_values == 'ALL_NEW':
+                return {'Attributes': item}
+            if return_values == 'ALL_OLD' and current:
+                return {'Attributes': current}
+            if return_values in ('UPDATED_NEW', 'UPDATED_OLD'):
+                source = item if return_values == 'UPDATED_NEW' else (current or {})
+                names = {path[0] for _, path, _ in actions}
+                return {'Attributes': {name: source[name] for name in names if name in source}}
+            return {}
+
+    def DeleteItem(self, params):
+        with self.lock:
+            table = self.table(params['TableName'])
+            key = table.validate_key(params['Key'])
+            current = table.items.get(key)
+            self.check_condition(params, current)
+            table.items.pop(key, None)
+            if params.get('ReturnValues') == 'ALL_OLD' and current:
+                return {'Attributes': current}
+            return {}
+
+    def BatchWriteItem(self, params):
+        requests = params['RequestItems']
+        if sum(len(entries) for entries in requests.values()) > 25:
+            raise FakeAWSError('ValidationException', 'Too many items requested for the BatchWriteItem call')
+        unprocessed = {}
+        with self.lock:
+            for table_name, entries in requests.items():
+                table = self.table(table_name)
+                keys = [
+                    key_string(table.key_of(entry['PutRequest']['Item'])) if 'PutRequest' in entry
+                    else table.validate_key(entry['DeleteRequest']['Key'])
+                    for entry in entries
+                ]
+                if len(set(keys)) != len(keys):
+                    raise FakeAWSError('ValidationException', 'Provided list of item keys contains duplicates')
+                for key, entry in zip(keys, entries):
+                    if self.unprocessed():
+                        unprocessed.setdefault(table_name, []).append(entry)
+                    elif 'PutRequest' in entry:
+                        table.put(entry['PutRequest']['Item'])
+                    else:
+                        table.items.pop(key, None)
+        return {'UnprocessedItems': unprocessed}
+
+    def BatchGetItem(self, params):
+        requests = params['RequestItems']
+        if sum(len(request['Keys']) for request in requests.values()) > 100:
+            raise FakeAWSError('ValidationException', 'Too many items requested for the BatchGetItem call')
+        responses = {}
+        unprocessed = {}
+        with self.lock:
+            for table_name, request in requests.items():
+                table = self.table(table_name)
+                responses[table_name] = []
+                for key in request['Keys']:
+                    if self.unprocessed():
+                        pending = unprocessed.setdefault(table_name, dict(request, Keys=[]))
+                        pending['Keys'].append(key)
+                        continue
+                    item = table.items.get(table.validate_key(key))
+                    if item is not None:
+                        responses[table_name].append(
+                            project(item, request.get('ProjectionExpression'), request.get('ExpressionAttributeNames'))
+                        )
+        return {'Responses': responses, 'UnprocessedKeys': unprocessed}
+
+    def page(self, params, candidates, key_of):
+        """
+        Apply ExclusiveStartKey, Limit, the 1 MB page size, filter and projection
+        """
+        start = params.get('ExclusiveStartKey')
+        if start:
+            start_string = key_string(key_of(start))
+            for position, item in enumerate(candidates):
+                if key_string(key_of(item)) == start_string:
+                    candidates = candidates[position + 1:]
+                    break
+
+        limit = params.get('Limit')
+        evaluated = []
+        size = 0
+        for item in candidates:
+            if limit and len(evaluated) >= limit:
+                break
+            if size >= SCAN_PAGE_BYTES:
+                break
+            evaluated.append(item)
+            size += item_size(item)
+
+        condition = condition_function(
+            params.get('FilterExpression'),
+            params.get('ExpressionAttributeNames'),
+            params.get('ExpressionAttributeValues')
+        )
+        matched = [item for item in evaluated if not condition or condition(item)]
+        response = {'ScannedCount': len(evaluated), 'Count': len(matched)}
+        if params.get('Select') != 'COUNT':
+            response['Items'] = [
+                project(item, params.get('ProjectionExpression'), params.get('ExpressionAttributeNames'))
+                for item in matched
+            ]
+        if evaluated and len(evaluated) < len(candidates):
+            response['LastEvaluatedKey'] = key_of(evaluated[-1])
+        return response
+
+    def Scan(self, params):
+        with self.lock:
+            table = self.table(params['TableName'])
+            items = list(table.items.items())
+        total = params.get('TotalSegments')
+        if total:
+            segment = params['Segment']
+            items = [(key, item) for key, item in items if zlib.crc32(key.encode()) % total == segment]
+        candidates = [item for _, item in items]
+        index_keys = table.indexes.get(params.get('IndexName')) if params.get('IndexName') else None
+        if index_keys:
+            candidates = [item for item in candidates if all(k in item for k in index_keys if k)]
+        return self.page(params, candidates, lambda item: self.full_key(table, item, index_keys))
+
+    def full_key(self, table, item, index_keys):
+        key = table.key_of(item)
+        for name in index_keys or ():
+            if name:
+                key[name] = item[name]
+        return key
+
+    def Query(self, params):
+        with self.lock:
+            table = self.table(params['TableName'])
+            items = list(table.items.values())
+        index_name = params.get('IndexName')
+        if index_name:
+            if index_name not in table.indexes:
+                raise FakeAWSError('ValidationException', f'The table does not have the specified index: {index_name}')
+            hash_key, range_key = table.indexes[index_name]
+        else:
+            hash_key, range_key = table.hash_key, table.range_key
+
+        key_condition = condition_function(
+            params['KeyConditionExpression'],
+            params.get('ExpressionAttributeNames'),
+            params.get('ExpressionAttributeValues')
+        )
+        candidates = [
+            item for item in items
+            if hash_key in item and (not range_key or range_key in item) and key_condition(item)
+        ]
+        if range_key:
+            candidates.sort(key=lambda item: to_python(item[range_key]),
+                            reverse=params.get('ScanIndexForward') is False)
+        index_keys = (hash_key, range_key) if index_name else None
+        return self.page(params, candidates, lambda item: self.full_key(table, item, index_keys))
+
+
+# ---------------------------------------------------------------------------
+# SQS
+# ---------------------------------------------------------------------------
+
+class FakeSQS:
+    """
+    Queues keyed by queue URL; messages are kept so they can be inspected
+    """
+
+    def __init__(self):
+        self.queues = {}
+        # MessageId -> monotonic time a received message becomes visible again
+        self.visible_at = {}
+        self.lock = threading.Lock()
+
+    def messages(self, queue_url):
+        return self.queues.setdefault(queue_url, [])
+
+    def store(self, queue_url, body, attributes=None):
+        if len(body.encode()) > 256 * 1024:
+            raise FakeAWSError('InvalidParameterValue', 'Message must be shorter than 262144 bytes')
+        message = {
+            'MessageId': str(uuid.uuid4()),
+            'ReceiptHandle': str(uuid.uuid4()),
+            'Body': body,
+            'MD5OfBody': hashlib.md5(body.encode()).hexdigest(),
+            'MessageAttributes': attributes or {}
+        }
+        with self.lock:
+            self.messages(queue_url).append(message)
+        return message
+
+    def SendMessage(self, params):
+        message = self.store(params['QueueUrl'], params['MessageBody'], params.get('MessageAttributes'))
+        return {'MessageId': message['MessageId'], 'MD5OfMessageBody': message['MD5OfBody']}
+
+    def SendMessageBatch(self, params):
+        entries = params['Entries']
+        if len(entries) > 10:
+            raise FakeAWSError('AWS.SimpleQueueService.TooManyEntriesInBatchRequest', 'Maximum number of entries per request are 10')
+        if sum(len(entry['MessageBody'].encode()) for entry in entries) > 256 * 1024:
+            raise FakeAWSError('AWS.SimpleQueueService.BatchRequestTooLong', 'Batch requests cannot be longer than 262144 bytes')
+        successful, failed = [], []
+        for entry in entries:
+            try:
+                message = self.store(params['QueueUrl'], entry['MessageBody'], entry.get('MessageAttributes'))
+                successful.append({'Id': entry['Id'], 'MessageId': message['MessageId'],
+                                   'MD5OfMessageBody': message['MD5OfBody']})
+            except FakeAWSError as e:
+                failed.append({'Id': entry['Id'], 'SenderFault': True, 'Code': e.code, 'Message': e.message})
+        return {'Successful': successful, 'Failed': failed}
+
+    def ReceiveMessage(self, params):
+        # Received messages stay hidden for VisibilityTimeout seconds (30 by
+        # default) and get a new receipt handle on every receive
+        now = time.monotonic()
+        hidden_until = now + params.get('VisibilityTimeout', 30)
+        received = []
+        with self.lock:
+            for message in self.messages(params['QueueUrl']):
+                if len(received) >= params.get('MaxNumberOfMessages', 1):
+                    break
+                if self.visible_at.get(message['MessageId'], 0) > now:
+                    continue
+                self.visible_at[message['MessageId']] = hidden_until
+                message['ReceiptHandle'] = str(uuid.uuid4())
+                received.append(dict(message))
+        return {'Messages': received} if received else {}
+
+    def DeleteMessage(self, params):
+        with self.lock:
+            messages = self.messages(params['QueueUrl'])
+            messages[:] = [m for m in messages if m['ReceiptHandle'] != params['ReceiptHandle']]
+        return {}
+
+    def DeleteMessageBatch(self, params):
+        handles = {entry['ReceiptHandle'] for entry in params['Entries']}
+        with self.lock:
+            messages = self.messages(params['QueueUrl'])
+            messages[:] = [m for m in messages if m['ReceiptHandle'] not in handles]
+        return {'Successful': [{'Id': entry['Id']} for entry in params['Entries']], 'Failed': []}
+
+    def GetQueueAttributes(self, params):
+        with self.lock:
+            count = len(self.messages(params['QueueUrl']))
+        return {'Attributes': {'ApproximateNumberOfMessages': str(count)}}
+
+
+# ---------------------------------------------------------------------------
+# API Gateway Management API
+# ---------------------------------------------------------------------------
+
+class FakeConnections:
+    """
+    WebSocket connections; posts to connections in gone raise GoneException
+    """
+
+    def __init__(self):
+        self.gone = set()
+        self.posts = Counter()
+        self.lock = threading.Lock()
+
+    def post(self, connection_id, data):
+        with self.lock:
+            if connection_id in self.gone:
+                raise FakeAWSError('GoneException', f'Connection {connection_id} is gone', status=410)
+            self.posts[connection_id] += 1
+
+
+# ---------------------------------------------------------------------------
+# botocore integration
+# ---------------------------------------------------------------------------
+
+class FakeAWS:
+    """
+    Routes botocore requests to the fake services.
+
+    latency maps 'dynamodb', 'sqs' and 'execute-api' to seconds added to
+    every call; throttle_rate is the share of DynamoDB calls rejected with
+    ProvisionedThroughputExceededException.
+    """
+
+    def __init__(self, latency=None, throttle_rate=0.0, unprocessed_rate=0.0, seed=None):
+        self.latency = dict(latency or {})
+        self.throttle_rate = throttle_rate
+        self.unprocessed_rate = unprocessed_rate
+        self.seed = seed
+        self.calls = Counter()
+        self.lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        """
+        Drop all tables, queues, connections and counters. Clients that are
+        already hooked up keep working against the new state.
+        """
+        self.random = random.Random(self.seed)
+        self.dynamodb = FakeDynamoDB(unprocessed_rate=self.unprocessed_rate, seed=self.seed)
+        self.sqs = FakeSQS()
+        self.connections = FakeConnections()
+        self.reset_counters()
+
+    def install(self, session=None):
+        """
+        Answer every request of clients created from session (the boto3
+        default session when omitted) from now on
+        """
+        if session is None:
+            import boto3
+            if boto3.DEFAULT_SESSION is None:
+                boto3.setup_default_session()
+            session = boto3.DEFAULT_SESSION
+        session.events.register('before-send', self.handle)
+        return self
+
+    def uninstall(self, session=None):
+        if session is None:
+            import boto3
+            session = boto3.DEFAULT_SESSION
+        if session is not None:
+            session.events.unregister('before-send', self.handle)
+
+    def reset_counters(self):
+        with self.lock:
+            self.calls.clear()
+
+    def count(self, name):
+        with self.lock:
+            self.calls[name] += 1
+
+    def delay(self, service):
+        seconds = self.latency.get(service, 0)
+        if seconds:
+            time.sleep(seconds)
+
+    def handle(self, request, **kwargs):
+        target = request.headers.get('X-Amz-Target')
+        if isinstance(target, bytes):
+            target = target.decode()
+        body = request.body or b'{}'
+        if hasattr(body, 'read'):
+            body = body.read()
+        if isinstance(body, bytes):
+            body = body.decode()
+
+        if target and target.startswith('DynamoDB_'):
+            return self.dispatch('dynamodb', self.dynamodb, target.split('.', 1)[1], body,
+                                 request.url, DYNAMODB_ERROR_PREFIX)
+        if target and target.startswith('AmazonSQS.'):
+            return self.dispatch('sqs', self.sqs, target.split('.', 1)[1], body,
+                                 request.url, SQS_ERROR_PREFIX)
+        if '/@connections/' in request.url:
+            return self.post_to_connection(request, body)
+        raise FakeAWSError('UnknownOperationException', f'No fake for {request.method} {request.url}')
+
+    def dispatch(self, service, backend, operation, body, url, error_prefix):
+        self.count(f'{service}.{operation}')
+        self.delay(service)
+        params = json.loads(body or '{}')
+        try:
+            if service == 'dynamodb' and self.throttle_rate and self.random.random() < self.throttle_rate:
+                raise FakeAWSError('ProvisionedThroughputExceededException', 'Rate of requests exceeds the allowed throughput')
+            handler = getattr(backend, operation, None)
+            if handler is None:
+                raise FakeAWSError('UnknownOperationException', f'{operation} is not implemented by the fake')
+            return self.response(url, 200, handler(params))
+        except FakeAWSError as e:
+            headers = {'x-amzn-query-error': f'{e.code};Sender'} if service == 'sqs' else {}
+            return self.response(url, e.status, dict({'__type': error_prefix + e.code, 'message': e.message}, **e.extra), headers)
+
+    def post_to_connection(self, request, body):
+        self.count('apigatewaymanagementapi.PostToConnection')
+        self.delay('execute-api')
+        connection_id = request.url.rsplit('/@connections/', 1)[1].split('?')[0]
+        from urllib.parse import unquote
+        try:
+            self.connections.post(unquote(connection_id), body)
+        except FakeAWSError as e:
+            return self.response(request.url, e.status, {'message': e.message}, {'x-amzn-ErrorType': e.code})
+        return self.response(request.url, 200, None)
+
+    @staticmethod
+    def response(url, status, payload, headers=None):
+        data = json.dumps(payload).encode() if payload is not None else b''
+        headers = dict({'Content-Type': 'application/x-amz-json-1.0', 'x-amzn-RequestId': str(uuid.uuid4())}, **(headers or {}))
+        if data:
+            headers['x-amz-crc32'] = str(zlib.crc32(data) & 0xffffffff)
+        return AWSResponse(url, status, headers, RawBody(data))
@@ -0,0 +1,597 @@
+#!/usr/bin/env python3
+"""
+Offline load test for the Lambda handlers.
+
+Each handler is imported in-process and invoked with synthetic SQS and
+WebSocket events. All AWS calls are answered by the in-memory fakes in
+fake_aws.py with a configurable latency per service, so the numbers reflect
+how many calls a handler makes and how well it overlaps them, not the
+network. For every scenario the script reports p50/p95/p99 invocation
+latency, records per second and AWS calls per record, and can write the
+results to JSON to compare them across commits. The EMF records written by
+the handlers are captured and summarised as time spent per stage.
+
+Invocations run concurrently in threads of one interpreter, which shares
+warm-container state (clients, caches, worker pools) between them; treat
+--concurrency as concurrent invocations of one warm container.
+
+Usage:
+    python benchmarks/load_test.py
+    python benchmarks/load_test.py --scenarios create update --batch-size 10 --concurrency 4
+    python benchmarks/load_test.py --latency dynamodb=10 sqs=20 --output results.json
+    python benchmarks/load_test.py --compare previous.json
+"""
+import argparse
+import contextlib
+import importlib.util
+import io
+import json
+import logging
+import os
+import platform
+import random
+import subprocess
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+BENCHMARK_DIR = os.path.dirname(os.path.abspath(__file__))
+FUNCTIONS_DIR = os.path.join(os.path.dirname(BENCHMARK_DIR), 'lambda-functions')
+SHARED_DIR = os.path.join(FUNCTIONS_DIR, 'shared')
+
+TABLE_NAME = 'loadtest-items'
+CONNECTIONS_TABLE_NAME = 'loadtest-connections'
+IDEMPOTENCY_TABLE_NAME = 'loadtest-idempotency'
+ITEM_INDEX_NAME = 'status-created_at-index'
+NOTIFICATION_QUEUE_URL = 'https://sqs.us-east-1.amazonaws.com/000000000000/loadtest-notifications'
+WEBSOCKET_API_ENDPOINT = 'https://loadtest.execute-api.us-east-1.amazonaws.com/benchmark'
+
+DEFAULT_LATENCY_MS = {'dynamodb': 4, 'sqs': 8, 'execute-api': 15}
+
+REPORTED_METRICS = ('p50_ms', 'p95_ms', 'p99_ms', 'records_per_second', 'aws_calls_per_record')
+
+sys.path.insert(0, BENCHMARK_DIR)
+sys.path.insert(0, SHARED_DIR)
+
+from fake_aws import FakeAWS  # noqa: E402
+
+
+class Context:
+    """Minimal Lambda context"""
+    function_name = 'loadtest'
+    aws_request_id = 'loadtest'
+
+    def get_remaining_time_in_millis(self):
+        return 15000
+
+
+def sqs_event(messages, invocation):
+    return {
+        'Records': [
+            {
+                'messageId': f'msg-{invocation}-{index}',
+                'body': json.dumps(message),
+                'attributes': {'ApproximateReceiveCount': '1'}
+            }
+            for index, message in enumerate(messages)
+        ]
+    }
+
+
+def websocket_event(route, connection_id, body=None, query=None):
+    return {
+        'requestContext': {
+            'connectionId': connection_id,
+            'routeKey': route,
+            'domainName': 'loadtest.execute-api.us-east-1.amazonaws.com',
+            'stage': 'benchmark'
+        },
+        'queryStringParameters': query or {},
+        'body': json.dumps(body or {})
+    }
+
+
+# ---------------------------------------------------------------------------
+# Data seeding
+# ---------------------------------------------------------------------------
+
+def seed_item(index):
+    return {
+        'id': {'S': f'item-{index:06d}'},
+        'name': {'S': f'Item {index}'},
+        'price': {'N': str(index % 500)},
+        'status': {'S': 'active' if index % 4 else 'archived'},
+        'created_at': {'S': f'2024-01-01T00:{index // 60 % 60:02d}:{index % 60:02d}'},
+        'updated_at': {'S': f'2024-01-01T00:{index // 60 % 60:02d}:{index % 60:02d}'},
+        'version': {'N': '1'}
+    }
+
+
+def create_tables(fake):
+    fake.dynamodb.create_table(TABLE_NAME, 'id', indexes={ITEM_INDEX_NAME: ('status', 'created_at')})
+    fake.dynamodb.create_table(CONNECTIONS_TABLE_NAME, 'connectionId', 'requestId',
+                               indexes={'requestId-index': ('requestId', None)})
+    fake.dynamodb.create_table(IDEMPOTENCY_TABLE_NAME, 'requestId')
+
+
+def seed_items(fake, count):
+    table = fake.dynamodb.table(TABLE_NAME)
+    for index in range(count):
+        table.put(seed_item(index))
+
+
+def seed_connections(fake, request_ids, per_request, gone_rate, rng):
+    table = fake.dynamodb.table(CONNECTIONS_TABLE_NAME)
+    for request_id in request_ids:
+        for index in range(per_request):
+            connection_id = f'{request_id}-conn-{index}'
+            table.put({
+                'connectionId': {'S': connection_id},
+                'requestId': {'S': request_id},
+                'timestamp': {'N': '0'}
+            })
+            if rng.random() < gone_rate:
+                fake.connections.gone.add(connection_id)
+
+
+# ---------------------------------------------------------------------------
+# Scenarios
+# ---------------------------------------------------------------------------
+
+class Scenario:
+    """
+    A handler plus the data it needs and a generator of events.
+    make_event(invocation, options, rng) returns (event, record_count).
+    """
+
+    def __init__(self, function, make_event, seed=None):
+        self.function = function
+        self.make_event = make_event
+        self.seed = seed
+
+
+def item_id(options, rng):
+    # Reads and updates favour a hot set of ids, like real traffic
+    if options.hot_keys and rng.random() < 0.8:
+        return f'item-{rng.randrange(min(options.hot_keys, options.items)):06d}'
+    return f'item-{rng.randrange(options.items):06d}'
+
+
+def create_event(invocation, options, rng):
+    messages = [
+        {
+            'operation': 'create',
+            'requestId': f'req-{invocation}-{index}',
+            'payload': {'name': f'Load {invocation}-{index}', 'price': rng.randrange(1000), 'status': 'active'}
+        }
+        for index in range(options.batch_size)
+    ]
+    return sqs_event(messages, invocation), len(messages)
+
+
+def read_get_event(invocation, options, rng):
+    messages = [
+        {'operation': 'get', 'requestId': f'req-{invocation}-{index}', 'id': item_id(options, rng)}
+        for index in range(options.batch_size)
+    ]
+    return sqs_event(messages, invocation), len(messages)
+
+
+def read_list_event(invocation, options, rng):
+    messages = [
+        {'operation': 'list', 'requestId': f'req-{invocation}-{index}', 'queryParams': {'limit': '50'}}
+        for index in range(options.batch_size)
+    ]
+    return sqs_event(messages, invocation), len(messages)
+
+
+def read_list_fields_event(invocation, options, rng):
+    messages = [
+        {'operation': 'list', 'requestId': f'req-{invocation}-{index}',
+         'queryParams': {'limit': '50', 'fields': 'name,price'}}
+        for index in range(options.batch_size)
+    ]
+    return sqs_event(messages, invocation), len(messages)
+
+
+def read_list_filtered_event(invocation, options, rng):
+    messages = [
+        {'operation': 'list', 'requestId': f'req-{invocation}-{index}',
+         'queryParams': {'limit': '50', 'status': 'archived', 'created_from': '2024-01-01T00:05:00'}}
+        for index in range(options.batch_size)
+    ]
+    return sqs_event(messages, invocation), len(messages)
+
+
+def read_batch_event(invocation, options, rng):
+    messages = [
+        {
+            'operation': 'get',
+            'requestId': f'req-{invocation}-{index}',
+            'ids': [item_id(options, rng) for _ in range(25)]
+        }
+        for index in range(options.batch_size)
+    ]
+    return sqs_event(messages, invocation), len(messages)
+
+
+def update_event(invocation, options, rng):
+    messages = [
+        {
+            'operation': 'update',
+            'requestId': f'req-{invocation}-{index}',
+            'id': item_id(options, rng),
+            'payload': {'name': f'Updated {invocation}-{index}', 'price': rng.randrange(1000)}
+        }
+        for index in range(options.batch_size)
+    ]
+    return sqs_event(messages, invocation), len(messages)
+
+
+def update_burst_event(invocation, options, rng):
+    # Progress-style bursts: every record of a batch hits one of three ids
+    ids = [item_id(options, rng) for _ in range(3)]
+    messages = [
+        {
+            'operation': 'update',
+            'requestId': f'req-{invocation}-{index}',
+            'id': rng.choice(ids),
+            'payload': {'progress': index, 'status': 'running' if index < options.batch_size - 1 else 'done'}
+        }
+        for index in range(options.batch_size)
+    ]
+    return sqs_event(messages, invocation), len(messages)
+
+
+def delete_event(invocation, options, rng):
+    # Every delete targets an item that still exists
+    start = invocation * options.batch_size
+    messages = [
+        {'operation': 'delete', 'requestId': f'req-{invocation}-{index}', 'id': f'item-{start + index:06d}'}
+        for index in range(options.batch_size)
+    ]
+    return sqs_event(messages, invocation), len(messages)
+
+
+def router_mixed_event(invocation, options, rng):
+    # Mixed batch for the router: creates, gets, updates and deletes in turn
+    start = invocation * options.batch_size
+    messages = []
+    for index in range(options.batch_size):
+        request_id = f'req-{invocation}-{index}'
+        operation = ('create', 'get', 'update', 'delete')[index % 4]
+        if operation == 'create':
+            messages.append({'operation': 'create', 'requestId': request_id,
+                             'payload': {'name': f'Load {invocation}-{index}', 'price': rng.randrange(1000)}})
+        elif operation == 'get':
+            messages.append({'operation': 'get', 'requestId': request_id, 'id': item_id(options, rng)})
+        elif operation == 'update':
+            messages.append({'operation': 'update', 'requestId': request_id, 'id': item_id(options, rng),
+                             'payload': {'price': rng.randrange(1000)}})
+        else:
+            messages.append({'operation': 'delete', 'requestId': request_id, 'id': f'item-{start + index:06d}'})
+    return sqs_event(messages, invocation), len(messages)
+
+
+def notification_request_ids(options):
+    return [f'sub-{index}' for index in range(options.subscribed_requests)]
+
+
+def notification_event(invocation, options, rng):
+    request_ids = notification_request_ids(options)
+    messages = [
+        {
+            'requestId': rng.choice(request_ids),
+            'operation': 'update',
+            'status': 'success',
+            'result': {'id': item_id(options, rng), 'name': 'Updated', 'price': 10}
+        }
+        for _ in range(options.batch_size)
+    ]
+    return sqs_event(messages, invocation), len(messages)
+
+
+def websocket_connect_event(invocation, options, rng):
+    return websocket_event('$connect', f'conn-{invocation}', query={'requestId': f'req-{invocation}'}), 1
+
+
+def websocket_disconnect_event(invocation, options, rng):
+    return websocket_event('$disconnect', f'sub-0-conn-{invocation}'), 1
+
+
+def websocket_default_event(invocation, options, rng):
+    return websocket_event('$default', f'conn-{invocation}', body={'action': 'ping'}), 1
+
+
+def websocket_subscribe_event(invocation, options, rng):
+    request_ids = [f'req-{invocation}-{index}' for index in range(options.batch_size)]
+    body = {'action': 'subscribe', 'requestIds': request_ids}
+    return websocket_event('$default', f'conn-{invocation}', body=body), len(request_ids)
+
+
+def seed_reads(fake, options, rng):
+    seed_items(fake, options.items)
+
+
+def seed_deletes(fake, options, rng):
+    seed_items(fake, max(options.items, (options.invocations + options.warmup) * options.batch_size))
+
+
+def seed_notifications(fake, options, rng):
+    seed_connections(fake, notification_request_ids(options), options.connections,
+                     options.gone_rate, rng)
+
+
+def seed_disconnects(fake, options, rng):
+    seed_connections(fake, ['sub-0'], options.invocations + options.warmup, 0, rng)
+
+
+SCENARIOS = {
+    'create': Scenario('create', create_event),
+    'read-get': Scenario('read', read_get_event, seed_reads),
+    'read-list': Scenario('read', read_list_event, seed_reads),
+    'read-list-fields': Scenario('read', read_list_fields_event, seed_reads),
+    'read-list-filtered': Scenario('read', read_list_filtered_event, seed_reads),
+    'read-batch': Scenario('read', read_batch_event, seed_reads),
+    'update': Scenario('update', update_event, seed_reads),
+    'update-burst': Scenario('update', update_burst_event, seed_reads),
+    'delete': Scenario('delete', delete_event, seed_deletes),
+    'router-mixed': Scenario('router', router_mixed_event, seed_deletes),
+    'notification': Scenario('notification', notification_event, seed_notifications),
+    'websocket-connect': Scenario('websocket-connect', websocket_connect_event),
+    'websocket-disconnect': Scenario('websocket-disconnect', websocket_disconnect_event, seed_disconnects),
+    'websocket-default': Scenario('websocket-default', websocket_default_event),
+    'websocket-subscribe': Scenario('websocket-default', websocket_subscribe_event),
+}
+
+
+# ---------------------------------------------------------------------------
+# Running
+# ---------------------------------------------------------------------------
+
+def load_handler(function, scenario_name):
+    """
+    Import a fresh copy of a function's lambda_function module, so module
+    level caches do not leak from one scenario into the next
+    """
+    path = os.path.join(FUNCTIONS_DIR, function, 'lambda_function.py')
+    module_name = 'loadtest_' + scenario_name.replace('-', '_')
+    spec = importlib.util.spec_from_file_location(module_name, path)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module.lambda_handler
+
+
+def failed_records(result, record_count):
+    """
+    Count the records an invocation reported as failed
+    """
+    if not isinstance(result, dict):
+        return record_count
+    if 'batchItemFailures' in result:
+        return len(result['batchItemFailures'])
+    status_code = result.get('statusCode', 200)
+    return record_count if isinstance(status_code, int) and status_code >= 400 else 0
+
+
+def percentile(samples, fraction):
+    """
+    Nearest-rank percentile of a sorted list
+    """
+    if not samples:
+        return None
+    rank = max(0, min(len(samples) - 1, int(round(fraction * len(samples) + 0.5)) - 1))
+    return samples[rank]
+
+
+def summarise_metrics(output):
+    """
+    Average the per-invocation EMF records written to stdout by the handlers.
+    Returns {metric: mean value per invocation}.
+    """
+    totals = {}
+    records = 0
+    for line in output.splitlines():
+        if not line.startswith('{') or '"_aws"' not in line:
+            continue
+        record = json.loads(line)
+        records += 1
+        for definition in record['_aws']['CloudWatchMetrics'][0]['Metrics']:
+            totals[definition['Name']] = totals.get(definition['Name'], 0) + record[definition['Name']]
+    return {name: round(total / records, 3) for name, total in sorted(totals.items())} if records else {}
+
+
+def run_scenario(name, fake, options):
+    scenario = SCENARIOS[name]
+    rng = random.Random(options.seed)
+    fake.reset()
+    create_tables(fake)
+    # The shared modules are imported once, so forget the requests that
+    # completed in earlier scenarios
+    idempotency = sys.modules.get('idempotency')
+    if idempotency:
+        idempotency.completed_cache.clear()
+    if scenario.seed:
+        scenario.seed(fake, options, rng)
+
+    handler = load_handler(scenario.function, name)
+    events = [scenario.make_event(invocation, options, rng)
+              for invocation in range(options.warmup + options.invocations)]
+
+    # Warm-up invocations create the clients and fill the caches
+    with contextlib.redirect_stdout(io.StringIO()):
+        for event, _ in events[:options.warmup]:
+            handler(event, Context())
+    fake.reset_counters()
+    events = events[options.warmup:]
+
+    def invoke(event_and_count):
+        event, record_count = event_and_count
+        start = time.perf_counter()
+        result = handler(event, Context())
+        elapsed = time.perf_counter() - start
+        return elapsed, record_count, failed_records(result, record_count)
+
+    output = io.StringIO()
+    start = time.perf_counter()
+    with contextlib.redirect_stdout(output), ThreadPoolExecutor(max_workers=options.concurrency) as executor:
+        samples = list(executor.map(invoke, events))
+    wall = time.perf_counter() - start
+
+    latencies = sorted(sample[0] * 1000 for sample in samples)
+    records = sum(sample[1] for sample in samples)
+    failed = sum(sample[2] for sample in samples)
+    calls = dict(sorted(fake.calls.items()))
+    total_calls = sum(calls.values())
+
+    return {
+        'function': scenario.function,
+        'invocations': len(samples),
+        'records': records,
+        'failed_records': failed,
+        'p50_ms': round(percentile(latencies, 0.50), 2),
+        'p95_ms': round(percentile(latencies, 0.95), 2),
+        'p99_ms': round(percentile(latencies, 0.99), 2),
+        'mean_ms': round(sum(latencies) / len(latencies), 2),
+        'max_ms': round(latencies[-1], 2),
+        'wall_seconds': round(wall, 3),
+        'records_per_second': round(records / wall, 1) if wall else None,
+        'aws_calls': total_calls,
+        'aws_calls_per_record': round(total_calls / records, 3) if records else None,
+        'calls_by_operation': calls,
+        'stage_metrics': summarise_metrics(output.getvalue())
+    }
+
+
+def configure_environment(options):
+    os.environ.update({
+        'AWS_ACCESS_KEY_ID': 'loadtest',
+        'AWS_SECRET_ACCESS_KEY': 'loadtest',
+        'AWS_DEFAULT_REGION': 'us-east-1',
+        'TABLE_NAME': TABLE_NAME,
+        'CONNECTIONS_TABLE_NAME': CONNECTIONS_TABLE_NAME,
+        'IDEMPOTENCY_TABLE_NAME': IDEMPOTENCY_TABLE_NAME,
+        'LIST_INDEXES': json.dumps([{'name': ITEM_INDEX_NAME, 'hash_key': 'status', 'range_key': 'created_at'}]),
+        'NOTIFICATION_QUEUE_URL': NOTIFICATION_QUEUE_URL,
+        'WEBSOCKET_API_ENDPOINT': WEBSOCKET_API_ENDPOINT,
+        'LOG_LEVEL': 'ERROR',
+        'COLD_START_MODE': 'lazy'
+    })
+    for assignment in options.env:
+        key, _, value = assignment.partition('=')
+        os.environ[key] = value
+    # The handlers set their own log levels; keep the output readable
+    if not options.verbose:
+        logging.disable(logging.CRITICAL)
+
+
+def git_commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=BENCHMARK_DIR,
+                              capture_output=True, text=True, timeout=10).stdout.strip() or None
+    except (OSError, subprocess.SubprocessError):
+        return None
+
+
+def parse_latency(values):
+    latency = dict(DEFAULT_LATENCY_MS)
+    for value in values:
+        service, _, milliseconds = value.partition('=')
+        if service not in latency:
+            raise argparse.ArgumentTypeError(f'Unknown service {service}, expected one of {", ".join(latency)}')
+        latency[service] = float(milliseconds)
+    return latency
+
+
+def print_table(results, previous):
+    header = f"{'scenario':<22}" + ''.join(f"{metric:>22}" for metric in REPORTED_METRICS) + f"{'failed':>8}"
+    print(header)
+    print('-' * len(header))
+    for name, metrics in results.items():
+        cells = []
+        for metric in REPORTED_METRICS:
+            value = metrics[metric]
+            before = previous.get(name, {}).get(metric)
+            cell = f"{value:.2f}" if value is not None else 'n/a'
+            if before and value is not None:
+                cell += f" ({(value - before) / before:+.0%})"
+            cells.append(f"{cell:>22}")
+        print(f"{name:<22}" + ''.join(cells) + f"{metrics['failed_records']:>8}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--scenarios', nargs='+', choices=list(SCENARIOS), default=list(SCENARIOS))
+    parser.add_argument('--batch-size', type=int, default=10, help='SQS records per invocation')
+    parser.add_argument('--concurrency', type=int, default=1, help='concurrent invocations')
+    parser.add_argument('--invocations', type=int, default=50, help='measured invocations per scenario')
+    parser.add_argument('--warmup', type=int, default=2, help='unmeasured invocations per scenario')
+    parser.add_argument('--latency', nargs='*', default=[], metavar='SERVICE=MS',
+                        help='per-call latency for dynamodb, sqs and execute-api')
+    parser.add_argument('--throttle-rate', type=float, default=0.0, help='share of DynamoDB calls throttled')
+    parser.add_argument('--unprocessed-rate', type=float, default=0.0,
+                        help='share of batch keys returned as unprocessed')
+    parser.add_argument('--items', type=int, default=1000, help='items seeded into the table')
+    parser.add_argument('--hot-keys', type=int, default=100, help='size of the frequently read id set (0 = uniform)')
+    parser.add_argument('--subscribed-requests', type=int, default=20, help='request ids with WebSocket subscribers')
+    parser.add_argument('--connections', type=int, default=5, help='connections per subscribed request id')
+    parser.add_argument('--gone-rate', type=float, default=0.0, help='share of connections that are gone')
+    parser.add_argument('--env', nargs='*', default=[], metavar='KEY=VALUE', help='extra handler environment')
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--output', help='write the results as JSON to this file')
+    parser.add_argument('--compare', help='previous JSON results to compare against')
+    parser.add_argument('--verbose', action='store_true', help='show handler logs')
+    options = parser.parse_args()
+
+    latency_ms = parse_latency(options.latency)
+    configure_environment(options)
+
+    fake = FakeAWS(
+        latency={service: value / 1000 for service, value in latency_ms.items()},
+        throttle_rate=options.throttle_rate,
+        unprocessed_rate=options.unprocessed_rate,
+        seed=options.seed
+    ).install()
+
+    results = {}
+    try:
+        for name in options.scenarios:
+            results[name] = run_scenario(name, fake, options)
+    finally:
+        fake.uninstall()
+
+    previous = {}
+    if options.compare:
+        with open(options.compare) as f:
+            previous = json.load(f).get('scenarios', {})
+
+    print_table(results, previous)
+
+    if options.output:
+        with open(options.output, 'w') as f:
+            json.dump({
+                'commit': git_commit(),
+                'timestamp': time.strftime('%Y-%m-%dT%H:%M:%SZ', time.gmtime()),
+                'python': platform.python_version(),
+                'config': {
+                    'batch_size': options.batch_size,
+                    'concurrency': options.concurrency,
+                    'invocations': options.invocations,
+                    'latency_ms': latency_ms,
+                    'throttle_rate': options.throttle_rate,
+                    'unprocessed_rate': options.unprocessed_rate,
+                    'items': options.items,
+                    'hot_keys': options.hot_keys,
+                    'subscribed_requests': options.subscribed_requests,
+                    'connections': options.connections,
+                    'gone_rate': options.gone_rate,
+                    'env': options.env
+                },
+                'scenarios': results
+            }, f, indent=2)
+        print(f"\nResults written to {options.output}")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -1,3 +1,10 @@
+locals {
+  # String key attributes of the list indexes
+  item_index_attributes = distinct(flatten([
+    for index in var.item_indexes : compact([index.hash_key, index.range_key])
+  ]))
+}
+
 # DynamoDB Table
 resource "aws_dynamodb_table" "crud_table" {
   name           = var.table_name
@@ -9,6 +16,25 @@ resource "aws_dynamodb_table" "crud_table" {
     type = "S"
   }
 
+  dynamic "attribute" {
+    for_each = local.item_index_attributes
+    content {
+      name = attribute.value
+      type = "S"
+    }
+  }
+
+  # Indexes that let the read Lambda answer filtered lists with Query
+  dynamic "global_secondary_index" {
+    for_each = var.item_indexes
+    content {
+      name            = global_secondary_index.value.name
+      hash_key        = global_secondary_index.value.hash_key
+      range_key       = global_secondary_index.value.range_key != "" ? global_secondary_index.value.range_key : null
+      projection_type = "ALL"
+    }
+  }
+
   # Best Practice: Enable point-in-time recovery
   point_in_time_recovery {
     enabled = var.enable_dynamodb_pitr
@@ -29,3 +55,31 @@ resource "aws_dynamodb_table" "crud_table" {
     Backup      = var.enable_dynamodb_pitr ? "enabled" : "disabled"
   }
 }
+
+# Idempotency records of processed requests, keyed by the API Gateway requestId
+resource "aws_dynamodb_table" "idempotency_table" {
+  name           = "${var.project_name}-idempotency"
+  billing_mode   = "PAY_PER_REQUEST"
+  hash_key       = "requestId"
+
+  attribute {
+    name = "requestId"
+    type = "S"
+  }
+
+  # Records are only needed while SQS may still redeliver the request
+  ttl {
+    attribute_name = "expires_at"
+    enabled        = true
+  }
+
+  server_side_encryption {
+    enabled = var.enable_dynamodb_encryption
+  }
+
+  tags = {
+    Name        = "${var.project_name}-idempotency"
+    Environment = var.environment
+    Service     = "crud-api"
+  }
+}
@@ -1,111 +1,260 @@
 import json
-import boto3
-import uuid
 import os
 import logging
-from datetime import datetime
 from botocore.exceptions import ClientError
+from aws_clients import get_client, preload
+from dynamodb_codec import deserialize, serialize_item
+from items import index_key_error, stamp_new_item
+from notifications import NotificationPublisher
+from metrics import log_metrics, timer
+from retry import RetryPolicy, is_retryable
+import idempotency
 
 # Configure logging
 log_level = os.environ.get('LOG_LEVEL', 'INFO')
 logger = logging.getLogger()
 logger.setLevel(getattr(logging, log_level))
 
-dynamodb = boto3.resource('dynamodb')
-sqs = boto3.client('sqs')
+# Build AWS clients during init only when COLD_START_MODE=eager
+preload(clients=['dynamodb', 'sqs'])
 
+# BatchWriteItem accepts at most 25 put requests per call
+BATCH_WRITE_SIZE = 25
+
+
+def chunk_entries(entries):
+    """
+    Split entries into BatchWriteItem sized chunks.
+    A single BatchWriteItem call rejects duplicate keys, so an id that is
+    already present in a chunk is pushed into a later one.
+    """
+    chunks = []
+    for entry in entries:
+        item_id = entry['item']['id']
+        for chunk in chunks:
+            if len(chunk) < BATCH_WRITE_SIZE and item_id not in chunk:
+                chunk[item_id] = entry
+                break
+        else:
+            chunks.append({item_id: entry})
+    return chunks
+
+
+def put_items_individually(table_name, chunk, attributes, policy):
+    """
+    Fallback used when a whole BatchWriteItem call is rejected, so that a
+    single invalid item does not fail the rest of the chunk.
+    Returns (retry, errors) like write_chunk.
+    """
+    retry = []
+    errors = []
+    for item_id, entry in chunk.items():
+        try:
+            policy.call(get_client('dynamodb').put_item, TableName=table_name, Item=attributes[item_id])
+        except ClientError as e:
+            logger.error(f"Failed to create item with ID {item_id}: {str(e)}")
+            if is_retryable(e):
+                retry.append(entry)
+            else:
+                errors.append((entry, f'DynamoDB error: {str(e)}'))
+    return retry, errors
+
+
+def write_chunk(table_name, chunk, policy):
+    """
+    Write one chunk with BatchWriteItem, retrying UnprocessedItems and
+    retryable errors with the policy's backoff.
+    Returns (retry, errors): the entries that may succeed when redelivered,
+    and (entry, message) pairs of the entries that failed permanently.
+    """
+    errors = []
+    attributes = {}
+    for item_id, entry in chunk.items():
+        try:
+            attributes[item_id] = serialize_item(entry['item'])
+        except (TypeError, ValueError) as e:
+            logger.error(f"Cannot store item with ID {item_id}: {str(e)}")
+            errors.append((entry, f'Cannot store item: {str(e)}'))
+    pending = {item_id: entry for item_id, entry in chunk.items() if item_id in attributes}
+
+    backoff = policy.backoff()
+    while pending:
+        try:
+            response = get_client('dynamodb').batch_write_item(
+                RequestItems={
+                    table_name: [
+                        {'PutRequest': {'Item': attributes[item_id]}}
+                        for item_id in pending
+                    ]
+                }
+            )
+        except ClientError as e:
+            error_code = e.response.get('Error', {}).get('Code')
+            if error_code == 'ValidationException':
+                logger.warning(f"Batch write rejected, retrying items individually: {str(e)}")
+                retry, failed = put_items_individually(table_name, pending, attributes, policy)
+                return retry, errors + failed
+            logger.error(f"DynamoDB error: {str(e)}")
+            if not is_retryable(e):
+                return [], errors + [(entry, f'DynamoDB error: {str(e)}') for entry in pending.values()]
+        else:
+            unprocessed = response.get('UnprocessedItems', {}).get(table_name, [])
+            unprocessed_ids = {deserialize(request['PutRequest']['Item']['id']) for request in unprocessed}
+            pending = {item_id: entry for item_id, entry in pending.items() if item_id in unprocessed_ids}
+            if not pending:
+                break
+            logger.warning(f"{len(pending)} unprocessed items, retrying (attempt {backoff.attempt})")
+
+        if not backoff.wait():
+            logger.error(f"Giving up on {len(pending)} items after {backoff.attempt} attempts")
+            break
+
+    return list(pending.values()), errors
+
+
+@log_metrics
 def lambda_handler(event, context):
     """
-    Lambda function to create an item in DynamoDB
-    Triggered by SQS message
+    Lambda function to create items in DynamoDB
+    Triggered by SQS messages; items of a batch are written with BatchWriteItem
+    and only the failed messages are reported back to the queue
     """
+    records = event.get('Records', [])
+    batch_item_failures = []
+
     try:
         # Get table name from environment variable
         table_name = os.environ.get('TABLE_NAME')
-        
+
         if not table_name:
             logger.error("TABLE_NAME environment variable not set")
             return {
-                'statusCode': 500,
-                'error': 'TABLE_NAME environment variable not set'
+                'batchItemFailures': [
+                    {'itemIdentifier': record.get('messageId')} for record in records
+                ]
             }
-        
-        # Process SQS event
-        logger.info(f"Received event: {json.dumps(event)}")
-        
-        # SQS can batch records, but we're using batch size 1
-        for record in event.get('Records', []):
+
+        logger.info(f"Received {len(records)} records")
+
+        entries = []
+        publisher = NotificationPublisher(context=context)
+        policy = RetryPolicy(context)
+        for record in records:
+            message_id = record.get('messageId')
             # Extract message body
             try:
                 message_body = record.get('body')
                 if not message_body:
                     logger.error("Empty message body")
                     continue
-                    
+
                 # Parse the message body
-                message_data = json.loads(message_body)
-                
+                with timer('Parse'):
+                    message_data = json.loads(message_body)
+
                 # Check operation type
                 operation = message_data.get('operation')
                 if operation != 'create':
                     logger.warning(f"Unexpected operation type: {operation}. Expected 'create'.")
                     continue
-                
+
                 # Get payload
                 item_data = message_data.get('payload', {})
-                
-                # Generate ID if not provided
-                if 'id' not in item_data:
-                    item_data['id'] = str(uuid.uuid4())
-                
-                # Add timestamp
-                item_data['created_at'] = datetime.utcnow().isoformat()
-                item_data['updated_at'] = datetime.utcnow().isoformat()
-                
-                # Get DynamoDB table
-                table = dynamodb.Table(table_name)
-                
-                # Put item in DynamoDB
-                logger.info(f"Creating item with ID: {item_data['id']}")
-                table.put_item(Item=item_data)
-                logger.info(f"Successfully created item with ID: {item_data['id']}")
-                
-                # Send notification to notification queue
-                notification_queue_url = os.environ.get('NOTIFICATION_QUEUE_URL')
-                if notification_queue_url:
-                    # Extract request ID from the original message
-                    request_id = message_data.get('requestId', str(uuid.uuid4()))
-                    
-                    # Send notification message
-                    sqs.send_message(
-                        QueueUrl=notification_queue_url,
-                        MessageBody=json.dumps({
-                            'requestId': request_id,
-                            'operation': 'create',
-                            'status': 'success',
-                            'result': item_data
-                        })
-                    )
-                    logger.info(f"Notification sent for requestId: {request_id}")
-                else:
-                    logger.warning("NOTIFICATION_QUEUE_URL not set, skipping notification")
-
-                
+                request_id = message_data.get('requestId')
+
+                # Generate ID if not provided and add timestamps
+                stamp_new_item(item_data, request_id)
+
+                # Ids are used as chunk keys, so a bad one must fail only
+                # its own record
+                if not isinstance(item_data['id'], str) or not item_data['id']:
+                    logger.error(f"Invalid item ID {item_data['id']!r}, expected a non-empty string")
+                    batch_item_failures.append({'itemIdentifier': message_id})
+                    continue
+
+                # Would fail on every redelivery, so it is answered instead
+                error = index_key_error(item_data)
+                if error:
+                    logger.error(f"Invalid item for request {request_id}: {error}")
+                    publisher.add(request_id, 'create', {'error': error}, 'error')
+                    continue
+
+                entries.append({
+                    'message_id': message_id,
+                    'request_id': request_id,
+                    'item': item_data
+                })
+
             except json.JSONDecodeError as e:
                 logger.error(f"Failed to parse message body: {str(e)}")
-            except ClientError as e:
-                logger.error(f"DynamoDB error: {str(e)}")
+                batch_item_failures.append({'itemIdentifier': message_id})
             except Exception as e:
                 logger.error(f"Error processing record: {str(e)}")
-        
-        return {
-            'statusCode': 200,
-            'message': 'Processing complete'
-        }
-        
+                batch_item_failures.append({'itemIdentifier': message_id})
+
+        # Skip redelivered requests that already completed, and hand the
+        # ones another invocation is still processing back to the queue
+        claims = idempotency.claim([entry['request_id'] for entry in entries], policy)
+        new_entries = []
+        for entry, claim in zip(entries, claims):
+            if claim.status == idempotency.NEW:
+                new_entries.append(entry)
+            elif claim.status == idempotency.IN_PROGRESS:
+                logger.info(f"Request {entry['request_id']} is already in progress")
+                batch_item_failures.append({'itemIdentifier': entry['message_id']})
+            else:
+                logger.info(f"Request {entry['request_id']} already completed, skipping")
+
+        # Write items in chunks of up to 25. Chunks that no longer fit in
+        # the remaining time are handed back to the queue unwritten.
+        completed = {}
+        released = []
+        for chunk in chunk_entries(new_entries):
+            if policy.expired():
+                retry, errors = list(chunk.values()), []
+                logger.warning(f"Out of time, returning {len(retry)} items to the queue")
+            else:
+                logger.info(f"Creating {len(chunk)} items")
+                retry, errors = write_chunk(table_name, chunk, policy)
+            failed_ids = set()
+            for entry in retry:
+                failed_ids.add(entry['item']['id'])
+                batch_item_failures.append({'itemIdentifier': entry['message_id']})
+                released.append(entry['request_id'])
+
+            # Permanent failures would fail again on every redelivery, so
+            # they are answered with an error instead
+            for entry, message in errors:
+                failed_ids.add(entry['item']['id'])
+                body = {'error': message}
+                publisher.add(entry['request_id'], 'create', body, 'error')
+                if entry['request_id']:
+                    completed[entry['request_id']] = {'statusCode': 500, 'body': body}
+
+            # Queue a notification for each stored item
+            for item_id, entry in chunk.items():
+                if item_id not in failed_ids:
+                    logger.info(f"Successfully created item with ID: {item_id}")
+                    publisher.add(entry['request_id'], 'create', entry['item'])
+                    if entry['request_id']:
+                        completed[entry['request_id']] = entry['item']
+
+        # The items are already stored, so failed notifications are only
+        # logged and the messages are not retried
+        publisher.flush()
+
+        idempotency.release(released)
+        idempotency.complete(completed)
+
+        if batch_item_failures:
+            logger.warning(f"{len(batch_item_failures)} of {len(records)} records failed")
+
+        return {'batchItemFailures': batch_item_failures}
+
     except Exception as e:
         logger.error(f"Unhandled exception: {str(e)}")
         return {
-            'statusCode': 500,
-            'error': f'Internal server error: {str(e)}'
+            'batchItemFailures': [
+                {'itemIdentifier': record.get('messageId')} for record in records
+            ]
         }
@@ -1,10 +1,342 @@
 import json
-import boto3
 import os
+import logging
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
 from botocore.exceptions import ClientError
+from aws_clients import get_client, preload
+from metrics import log_metrics, timer
+from notifications import NotificationPublisher
+from retry import RetryPolicy, is_retryable
+import idempotency
 
-dynamodb = boto3.resource('dynamodb')
+# Configure logging
+log_level = os.environ.get('LOG_LEVEL', 'INFO')
+logger = logging.getLogger()
+logger.setLevel(getattr(logging, log_level))
 
+# Build AWS clients during init only when COLD_START_MODE=eager
+preload(clients=['dynamodb', 'sqs'])
+
+# BatchWriteItem accepts at most 25 delete requests per call
+BATCH_WRITE_SIZE = 25
+
+# DynamoDB rejects partition keys longer than this
+MAX_ID_BYTES = 2048
+
+# Bulk delete settings
+BULK_DELETE_WORKERS = int(os.environ.get('BULK_DELETE_WORKERS', '8'))
+BULK_DELETE_MAX_ITEMS = int(os.environ.get('BULK_DELETE_MAX_ITEMS', '10000'))
+
+# Prefix deletes scan the table in parallel segments, and stop scanning after
+# BULK_DELETE_SCAN_MAX_SECONDS so the deletes still fit in the invocation
+BULK_DELETE_SCAN_SEGMENTS = int(os.environ.get('BULK_DELETE_SCAN_SEGMENTS', '8'))
+BULK_DELETE_SCAN_MAX_SECONDS = float(os.environ.get('BULK_DELETE_SCAN_MAX_SECONDS', '5'))
+
+# Batch deletes use the low-level client, which is thread safe
+delete_executor = ThreadPoolExecutor(max_workers=BULK_DELETE_WORKERS)
+
+HEADERS = {
+    'Content-Type': 'application/json',
+    'Access-Control-Allow-Origin': '*'
+}
+
+
+class InvalidRequest(Exception):
+    """Raised when request parameters cannot be used"""
+
+
+def valid_id(item_id):
+    """
+    Tell whether DynamoDB accepts item_id as a key. An invalid id in a
+    BatchWriteItem call rejects the whole chunk.
+    """
+    return isinstance(item_id, str) and 0 < len(item_id.encode('utf-8')) <= MAX_ID_BYTES
+
+
+def delete_item(table_name, item_id):
+    """
+    Delete a single item with one conditional DeleteItem call.
+    Returns (status_code, body).
+    """
+    try:
+        get_client('dynamodb').delete_item(
+            TableName=table_name,
+            Key={'id': {'S': item_id}},
+            ConditionExpression='attribute_exists(#id)',
+            ExpressionAttributeNames={'#id': 'id'}
+        )
+    except ClientError as e:
+        if e.response.get('Error', {}).get('Code') == 'ConditionalCheckFailedException':
+            return 404, {'error': 'Item not found'}
+        raise
+
+    return 200, {
+        'message': 'Item deleted successfully',
+        'id': item_id
+    }
+
+
+def delete_chunk(table_name, item_ids, policy):
+    """
+    Delete up to 25 items with BatchWriteItem, retrying UnprocessedItems and
+    retryable errors with the policy's backoff.
+    Returns {id: outcome}.
+    """
+    pending = list(item_ids)
+    outcomes = {}
+
+    backoff = policy.backoff()
+    while True:
+        try:
+            response = get_client('dynamodb').batch_write_item(
+                RequestItems={
+                    table_name: [
+                        {'DeleteRequest': {'Key': {'id': {'S': item_id}}}}
+                        for item_id in pending
+                    ]
+                }
+            )
+        except ClientError as e:
+            logger.error(f"DynamoDB error: {str(e)}")
+            # Permanent errors would fail again on every attempt
+            if not is_retryable(e):
+                raise
+            if not backoff.wait():
+                break
+            continue
+
+        unprocessed = {
+            request['DeleteRequest']['Key']['id']['S']
+            for request in response.get('UnprocessedItems', {}).get(table_name, [])
+        }
+        for item_id in pending:
+            if item_id not in unprocessed:
+                outcomes[item_id] = 'deleted'
+        pending = [item_id for item_id in pending if item_id in unprocessed]
+        if not pending:
+            return outcomes
+        logger.warning(f"{len(pending)} unprocessed deletes, retrying (attempt {backoff.attempt})")
+        if not backoff.wait():
+            break
+
+    for item_id in pending:
+        outcomes[item_id] = 'failed'
+    return outcomes
+
+
+class PrefixScan:
+    """
+    Parallel segmented scan for the ids starting with a prefix, bounded by
+    an item count, BULK_DELETE_SCAN_MAX_SECONDS and the retry policy's time
+    """
+
+    def __init__(self, table_name, prefix, max_items, policy):
+        self.table_name = table_name
+        self.prefix = prefix
+        self.max_items = max_items
+        self.policy = policy
+        self.deadline = time.monotonic() + BULK_DELETE_SCAN_MAX_SECONDS
+        self.item_ids = []
+        self.lock = threading.Lock()
+
+    def stopped(self):
+        return (len(self.item_ids) >= self.max_items or self.policy.expired()
+                or time.monotonic() >= self.deadline)
+
+    def scan_segment(self, segment, segments):
+        """
+        Scan one segment until it is done or the scan is stopped.
+        Returns True when matches may remain in the segment.
+        """
+        scan_kwargs = {
+            'TableName': self.table_name,
+            'ProjectionExpression': '#id',
+            'FilterExpression': 'begins_with(#id, :prefix)',
+            'ExpressionAttributeNames': {'#id': 'id'},
+            'ExpressionAttributeValues': {':prefix': {'S': self.prefix}},
+            'Segment': segment,
+            'TotalSegments': segments
+        }
+        while True:
+            response = self.policy.call(get_client('dynamodb').scan, **scan_kwargs)
+            with self.lock:
+                self.item_ids.extend(item['id']['S'] for item in response.get('Items', []))
+            if 'LastEvaluatedKey' not in response:
+                return False
+            if self.stopped():
+                return True
+            scan_kwargs['ExclusiveStartKey'] = response['LastEvaluatedKey']
+
+    def run(self):
+        """
+        Returns (ids, more) where more tells whether matches may remain
+        """
+        segments = max(1, BULK_DELETE_SCAN_SEGMENTS)
+        futures = [delete_executor.submit(self.scan_segment, segment, segments) for segment in range(segments)]
+        more = any([future.result() for future in futures])
+        return self.item_ids[:self.max_items], more or len(self.item_ids) > self.max_items
+
+
+def bulk_delete(table_name, item_ids=None, prefix=None, policy=None):
+    """
+    Delete many items by id list or id prefix with concurrent BatchWriteItem
+    calls. Batch deletes are unconditional, so ids that did not exist are
+    also reported as deleted.
+    Returns (status_code, body) with the outcome of every id.
+    """
+    more = False
+    policy = policy or RetryPolicy()
+    if prefix:
+        item_ids, more = PrefixScan(table_name, prefix, BULK_DELETE_MAX_ITEMS, policy).run()
+    elif not isinstance(item_ids, list) or not item_ids:
+        raise InvalidRequest('ids must be a non-empty list')
+    elif len(item_ids) > BULK_DELETE_MAX_ITEMS:
+        raise InvalidRequest(f'At most {BULK_DELETE_MAX_ITEMS} ids can be deleted at once')
+
+    # Numeric ids are accepted as their string form, anything else that
+    # DynamoDB would reject is refused before a chunk is sent
+    item_ids = [str(item_id) if isinstance(item_id, int) and not isinstance(item_id, bool) else item_id
+                for item_id in item_ids]
+    invalid = [item_id for item_id in item_ids if not valid_id(item_id)]
+    if invalid:
+        raise InvalidRequest(f'ids must be non-empty strings of at most {MAX_ID_BYTES} bytes, '
+                             f'invalid: {json.dumps([str(item_id)[:64] for item_id in invalid[:10]])}')
+
+    unique_ids = list(dict.fromkeys(item_ids))
+    futures = [
+        delete_executor.submit(delete_chunk, table_name, unique_ids[i:i + BATCH_WRITE_SIZE], policy)
+        for i in range(0, len(unique_ids), BATCH_WRITE_SIZE)
+    ]
+    outcomes = {}
+    for future in futures:
+        outcomes.update(future.result())
+
+    failed = sum(1 for outcome in outcomes.values() if outcome == 'failed')
+    body = {
+        'message': 'Bulk delete completed' if not failed else 'Bulk delete completed with failures',
+        'results': [{'id': item_id, 'status': outcomes[item_id]} for item_id in unique_ids],
+        'deleted': len(unique_ids) - failed,
+        'failed': failed
+    }
+    if prefix:
+        body['prefix'] = prefix
+        body['more'] = more
+
+    return (200 if not failed else 207), body
+
+
+def delete(table_name, item_id, bulk_data, policy=None):
+    """
+    Dispatch a single or bulk delete.
+    Returns (status_code, body).
+    """
+    if item_id:
+        if not valid_id(item_id):
+            return 400, {'error': f'Item ID must be a string of at most {MAX_ID_BYTES} bytes'}
+        return delete_item(table_name, item_id)
+
+    bulk_data = bulk_data or {}
+    if not isinstance(bulk_data, dict):
+        return 400, {'error': 'Request body must be a JSON object'}
+    if not bulk_data.get('ids') and not bulk_data.get('prefix'):
+        return 400, {'error': 'Item ID is required in path'}
+
+    try:
+        return bulk_delete(table_name, bulk_data.get('ids'), bulk_data.get('prefix'), policy)
+    except InvalidRequest as e:
+        return 400, {'error': str(e)}
+
+
+def handle_sqs_event(event, table_name, context=None):
+    """
+    Process delete messages delivered by the CRUD queue.
+    Messages that hit retryable errors until the time budget ran out are
+    returned as batchItemFailures.
+    """
+    policy = RetryPolicy(context)
+    publisher = NotificationPublisher(context=context)
+    batch_item_failures = []
+    requests = []
+    for record in event.get('Records', []):
+        try:
+            with timer('Parse'):
+                message_data = json.loads(record.get('body') or '{}')
+            operation = message_data.get('operation')
+            if operation != 'delete':
+                logger.warning(f"Unexpected operation type: {operation}. Expected 'delete'.")
+                continue
+
+            bulk_data = message_data.get('payload') or {}
+            if message_data.get('ids'):
+                bulk_data = dict(bulk_data, ids=message_data['ids'])
+            requests.append((record.get('messageId'), message_data.get('requestId'),
+                             message_data.get('id'), bulk_data))
+
+        except json.JSONDecodeError as e:
+            logger.error(f"Failed to parse message body: {str(e)}")
+        except Exception as e:
+            logger.error(f"Error processing record: {str(e)}")
+
+    # A redelivered delete would otherwise report 404 for an item it removed
+    claims = idempotency.claim([request_id for _, request_id, _, _ in requests], policy)
+    completed = {}
+    released = []
+    for (message_id, request_id, item_id, bulk_data), claim in zip(requests, claims):
+        if claim.status == idempotency.IN_PROGRESS:
+            logger.info(f"Delete request {request_id} is already in progress")
+            batch_item_failures.append({'itemIdentifier': message_id})
+            continue
+        if claim.status != idempotency.NEW:
+            logger.info(f"Skipping redelivered delete request {request_id} ({claim.status})")
+            continue
+        try:
+            if policy.expired():
+                raise TimeoutError('No time left in this invocation')
+            status_code, body = policy.call(delete, table_name, item_id, bulk_data, policy)
+            if status_code == 207:
+                # Some ids stayed unprocessed; batch deletes are unconditional,
+                # so the redelivery can safely repeat the whole request
+                logger.warning(f"Bulk delete {request_id} left {body['failed']} ids, returning it to the queue")
+                released.append(request_id)
+                batch_item_failures.append({'itemIdentifier': message_id})
+                continue
+            logger.info(f"Delete finished with status {status_code}")
+            publisher.add(request_id, 'delete', body,
+                          'success' if status_code < 400 else 'error')
+            if request_id:
+                completed[request_id] = {'statusCode': status_code, 'body': body}
+
+        except ClientError as e:
+            logger.error(f"DynamoDB error: {str(e)}")
+            if is_retryable(e):
+                released.append(request_id)
+                batch_item_failures.append({'itemIdentifier': message_id})
+            else:
+                # Permanent errors would fail again on every redelivery, so
+                # the request is answered with an error instead
+                body = {'error': f'DynamoDB error: {str(e)}'}
+                publisher.add(request_id, 'delete', body, 'error')
+                if request_id:
+                    completed[request_id] = {'statusCode': 500, 'body': body}
+        except Exception as e:
+            logger.error(f"Error processing record: {str(e)}")
+            released.append(request_id)
+            batch_item_failures.append({'itemIdentifier': message_id})
+
+    publisher.flush()
+
+    idempotency.release(released)
+    idempotency.complete(completed)
+
+    if batch_item_failures:
+        logger.warning(f"{len(batch_item_failures)} delete messages returned to the queue")
+
+    return {'batchItemFailures': batch_item_failures}
+
+
+@log_metrics
 def lambda_handler(event, context):
     """
     Lambda function to delete an item from DynamoDB
@@ -12,78 +344,49 @@ def lambda_handler(event, context):
     try:
         # Get table name from environment variable
         table_name = os.environ.get('TABLE_NAME')
-        
+
         if not table_name:
             return {
                 'statusCode': 500,
-                'headers': {
-                    'Content-Type': 'application/json',
-                    'Access-Control-Allow-Origin': '*'
-                },
+                'headers': HEADERS,
                 'body': json.dumps({
                     'error': 'TABLE_NAME environment variable not set'
                 })
             }
-        
+
+        # Messages from the CRUD queue; an unexpected error returns the
+        # whole batch to the queue
+        if 'Records' in event:
+            try:
+                return handle_sqs_event(event, table_name, context)
+            except Exception as e:
+                logger.error(f"Unhandled exception: {str(e)}")
+                return {
+                    'batchItemFailures': [
+                        {'itemIdentifier': record.get('messageId')} for record in event['Records']
+                    ]
+                }
+
         # Extract item ID from path parameters
         item_id = None
         if 'pathParameters' in event and event['pathParameters']:
             item_id = event['pathParameters'].get('id')
-        
-        if not item_id:
-            return {
-                'statusCode': 400,
-                'headers': {
-                    'Content-Type': 'application/json',
-                    'Access-Control-Allow-Origin': '*'
-                },
-                'body': json.dumps({
-                    'error': 'Item ID is required in path'
-                })
-            }
-        
-        # Get DynamoDB table
-        table = dynamodb.Table(table_name)
-        
-        # Check if item exists before deleting
-        existing_item = table.get_item(Key={'id': item_id})
-        if 'Item' not in existing_item:
-            return {
-                'statusCode': 404,
-                'headers': {
-                    'Content-Type': 'application/json',
-                    'Access-Control-Allow-Origin': '*'
-                },
-                'body': json.dumps({
-                    'error': 'Item not found'
-                })
-            }
-        
-        # Delete item from DynamoDB
-        response = table.delete_item(
-            Key={'id': item_id},
-            ReturnValues='ALL_OLD'
-        )
-        
+
+        # Bulk deletes carry ids or a prefix in the body
+        bulk_data = json.loads(event['body']) if not item_id and event.get('body') else {}
+
+        status_code, body = delete(table_name, item_id, bulk_data, RetryPolicy(context))
+
         return {
-            'statusCode': 200,
-            'headers': {
-                'Content-Type': 'application/json',
-                'Access-Control-Allow-Origin': '*'
-            },
-            'body': json.dumps({
-                'message': 'Item deleted successfully',
-                'id': item_id
-            })
+            'statusCode': status_code,
+            'headers': HEADERS,
+            'body': json.dumps(body)
         }
-        
+
     except ClientError as e:
         return {
             'statusCode': 500,
-            'headers': {
-                'Content-Type': 'application/json',
-                'Access-Control-Allow-Origin': '*'
-            },
+            'headers': HEADERS,
             'body': json.dumps({
                 'error': f'DynamoDB error: {str(e)}'
             })
@@ -91,10 +394,7 @@ def lambda_handler(event, context):
     except Exception as e:
         return {
             'statusCode': 500,
-            'headers': {
-                'Content-Type': 'application/json',
-                'Access-Control-Allow-Origin': '*'
-            },
+            'headers': HEADERS,
             'body': json.dumps({
                 'error': f'Internal server error: {str(e)}'
             })
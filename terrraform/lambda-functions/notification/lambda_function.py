@@ -1,22 +1,211 @@
+import base64
 import json
 import os
-import boto3
 import logging
-from boto3.dynamodb.conditions import Key
+import time
+import zlib
+from concurrent.futures import ThreadPoolExecutor
+from aws_clients import get_client, preload
+from metrics import log_metrics, timer
+from notifications import KEY_ATTRIBUTES, keys_only
+from retry import RetryPolicy
+from subscriptions import COMPRESSED, DELTA, FULL, KEYS_ONLY, unsubscribe
 
 # Configure logging
 logger = logging.getLogger()
 logger.setLevel(logging.INFO)
 
-# Initialize DynamoDB client
-dynamodb = boto3.resource('dynamodb')
-connections_table = dynamodb.Table(os.environ.get('CONNECTIONS_TABLE_NAME'))
+# Build AWS clients during init only when COLD_START_MODE=eager
+preload(clients=['dynamodb'])
 
+# Maximum number of concurrent post_to_connection calls
+FANOUT_MAX_WORKERS = int(os.environ.get('FANOUT_MAX_WORKERS', '16'))
+
+# Short-lived cache of requestId -> connection IDs across warm invocations
+CONNECTION_CACHE_TTL = float(os.environ.get('CONNECTION_CACHE_TTL', '5'))
+CONNECTION_CACHE_MAX_ENTRIES = int(os.environ.get('CONNECTION_CACHE_MAX_ENTRIES', '1024'))
+
+# Compressed payloads are only compressed above this size
+COMPRESSION_THRESHOLD_BYTES = int(os.environ.get('COMPRESSION_THRESHOLD_BYTES', '1024'))
+# post_to_connection rejects larger payloads; they are sent as keys-only
+WEBSOCKET_MAX_PAYLOAD_BYTES = int(os.environ.get('WEBSOCKET_MAX_PAYLOAD_BYTES', str(128 * 1024)))
+
+# The fan-out worker pool is kept at module scope so warm invocations
+# reuse its threads
+fanout_executor = ThreadPoolExecutor(max_workers=FANOUT_MAX_WORKERS)
+
+# requestId -> (expires_at, [(connection ID, payload mode)])
+connection_cache = {}
+
+
+def query_connections(request_id):
+    """
+    Return all (connection ID, payload mode) pairs for a request ID,
+    following pagination
+    """
+    connections = []
+    query_kwargs = {
+        'TableName': os.environ.get('CONNECTIONS_TABLE_NAME'),
+        'IndexName': 'requestId-index',
+        'KeyConditionExpression': 'requestId = :request_id',
+        # TTL deletion lags behind, so skip rows that have already expired
+        'FilterExpression': 'attribute_not_exists(expires_at) OR expires_at > :now',
+        'ExpressionAttributeValues': {
+            ':request_id': {'S': request_id},
+            ':now': {'N': str(int(time.time()))}
+        },
+        'ProjectionExpression': 'connectionId, #mode',
+        'ExpressionAttributeNames': {'#mode': 'mode'}
+    }
+    while True:
+        response = get_client('dynamodb').query(**query_kwargs)
+        connections.extend(
+            (item['connectionId']['S'], item.get('mode', {}).get('S', FULL))
+            for item in response.get('Items', [])
+        )
+        if 'LastEvaluatedKey' not in response:
+            return connections
+        query_kwargs['ExclusiveStartKey'] = response['LastEvaluatedKey']
+
+
+def get_connections(request_id):
+    """
+    Return the (connection ID, payload mode) pairs for a request ID, served
+    from the cache while fresh
+    """
+    now = time.monotonic()
+    cached = connection_cache.get(request_id)
+    if cached and cached[0] > now:
+        return cached[1]
+
+    connections = query_connections(request_id)
+
+    # Empty results are not cached so late subscribers are still found
+    if connections and CONNECTION_CACHE_TTL > 0:
+        if len(connection_cache) >= CONNECTION_CACHE_MAX_ENTRIES:
+            connection_cache.pop(next(iter(connection_cache)))
+        connection_cache.pop(request_id, None)
+        connection_cache[request_id] = (now + CONNECTION_CACHE_TTL, connections)
+    return connections
+
+
+def invalidate_connections(connection_ids):
+    """
+    Drop cached request IDs that reference any gone connection
+    """
+    if not connection_ids:
+        return
+    stale = [
+        request_id for request_id, (_, connections) in connection_cache.items()
+        if any(connection_id in connection_ids for connection_id, _ in connections)
+    ]
+    for request_id in stale:
+        del connection_cache[request_id]
+
+
+def build_payload(request_id, message_data, mode):
+    """
+    Render the notification of one message in a subscription's payload mode.
+    Payloads too large for post_to_connection fall back to keys-only.
+    """
+    result = message_data.get('result')
+    notification = {
+        'requestId': request_id,
+        'operation': message_data.get('operation'),
+        'status': message_data.get('status', 'success'),
+        'result': result,
+        'type': 'notification'
+    }
+    if message_data.get('truncated'):
+        notification['truncated'] = True
+    if message_data.get('pages'):
+        notification.update(page=message_data.get('page'), pages=message_data['pages'])
+
+    changed = message_data.get('changed')
+    if mode == KEYS_ONLY:
+        notification.update(result=keys_only(result), mode=KEYS_ONLY)
+    elif mode == DELTA and changed is not None and isinstance(result, dict):
+        attributes = KEY_ATTRIBUTES + tuple(changed)
+        notification.update(result={key: result[key] for key in attributes if key in result}, mode=DELTA)
+
+    data = json.dumps(notification)
+    if mode == COMPRESSED and len(data) > COMPRESSION_THRESHOLD_BYTES:
+        compressed = zlib.compress(json.dumps(result).encode('utf-8'))
+        notification.update(
+            result=base64.b64encode(compressed).decode('ascii'),
+            encoding='zlib+base64',
+            mode=COMPRESSED
+        )
+        data = json.dumps(notification)
+
+    if len(data.encode('utf-8')) > WEBSOCKET_MAX_PAYLOAD_BYTES:
+        logger.info(f"Notification for requestId {request_id} is too large, sending its keys only")
+        notification.pop('encoding', None)
+        notification.update(result=keys_only(result), mode=KEYS_ONLY, truncated=True)
+        data = json.dumps(notification)
+    return data
+
+
+def post_notification(client, connection_id, data):
+    """
+    Post a notification to a single connection.
+    Returns True when the connection is gone and should be removed.
+    """
+    try:
+        client.post_to_connection(ConnectionId=connection_id, Data=data)
+        logger.info(f"Notification sent to connection {connection_id}")
+    except client.exceptions.GoneException:
+        logger.info(f"Connection {connection_id} is gone, removing from table")
+        return True
+    except Exception as e:
+        logger.error(f"Error sending to connection {connection_id}: {str(e)}")
+    return False
+
+
+def fan_out(client, posts):
+    """
+    Send all (connection_id, data) posts concurrently.
+    Returns the set of connection IDs that are gone.
+    """
+    futures = [
+        (connection_id, fanout_executor.submit(post_notification, client, connection_id, data))
+        for connection_id, data in posts
+    ]
+    return {connection_id for connection_id, future in futures if future.result()}
+
+
+def remove_subscriptions(rows, policy=None):
+    """
+    Remove the (connection_id, request_id) rows of gone connections in batches.
+    Other subscriptions of a gone connection expire through TTL.
+    """
+    if not rows:
+        return
+    try:
+        failed = unsubscribe(rows, policy)
+        logger.info(f"Removed {len(rows) - len(failed)} subscriptions of gone connections")
+    except Exception as e:
+        logger.error(f"Error removing gone connections: {str(e)}")
+
+
+@log_metrics
 def lambda_handler(event, context):
     """
     Lambda function to send operation completion notifications to clients via WebSocket
     """
     try:
+        # Get API Gateway Management API endpoint from environment variable
+        endpoint = os.environ.get('WEBSOCKET_API_ENDPOINT')
+        if not endpoint:
+            logger.error("WEBSOCKET_API_ENDPOINT environment variable not set")
+            return {
+                'statusCode': 500,
+                'error': 'WEBSOCKET_API_ENDPOINT environment variable not set'
+            }
+
+        # Group messages by request ID so each request ID is looked up once
+        messages_by_request = {}
+
         # Process SQS event
         for record in event.get('Records', []):
             try:
@@ -25,80 +214,68 @@ def lambda_handler(event, context):
                 if not message_body:
                     logger.error("Empty message body")
                     continue
-                
+
                 # Parse the message body
-                message_data = json.loads(message_body)
-                
-                # Extract request ID and operation result
+                with timer('Parse'):
+                    message_data = json.loads(message_body)
+
+                # Extract request ID
                 request_id = message_data.get('requestId')
-                operation = message_data.get('operation')
-                result = message_data.get('result')
-                status = message_data.get('status', 'success')
-                
                 if not request_id:
                     logger.error("No request ID in message")
                     continue
-                
+
+                messages_by_request.setdefault(request_id, []).append(message_data)
+
+            except json.JSONDecodeError as e:
+                logger.error(f"Failed to parse message body: {str(e)}")
+            except Exception as e:
+                logger.error(f"Error processing record: {str(e)}")
+
+        # Collect the posts for every request so the batch is fanned out at once
+        posts = []
+        subscribed = {}
+        for request_id, messages in messages_by_request.items():
+            try:
                 # Find connections associated with this request ID
-                response = connections_table.query(
-                    IndexName='requestId-index',
-                    KeyConditionExpression=Key('requestId').eq(request_id)
-                )
-                
-                connections = response.get('Items', [])
+                connections = get_connections(request_id)
                 logger.info(f"Found {len(connections)} connections for requestId {request_id}")
-                
+
                 if not connections:
                     logger.warning(f"No connections found for requestId {request_id}")
                     continue
-                
-                # Get API Gateway Management API endpoint from environment variable
-                endpoint = os.environ.get('WEBSOCKET_API_ENDPOINT')
-                if not endpoint:
-                    logger.error("WEBSOCKET_API_ENDPOINT environment variable not set")
-                    continue
-                
-                # Initialize API Gateway Management API client
-                api_gateway_management_api = boto3.client(
-                    'apigatewaymanagementapi',
-                    endpoint_url=endpoint
-                )
-                
-                # Send notification to each connected client
-                for connection in connections:
-                    connection_id = connection.get('connectionId')
-                    try:
-                        api_gateway_management_api.post_to_connection(
-                            ConnectionId=connection_id,
-                            Data=json.dumps({
-                                'requestId': request_id,
-                                'operation': operation,
-                                'status': status,
-                                'result': result,
-                                'type': 'notification'
-                            })
-                        )
-                        logger.info(f"Notification sent to connection {connection_id}")
-                    except api_gateway_management_api.exceptions.GoneException:
-                        # Connection is no longer valid, remove it
-                        logger.info(f"Connection {connection_id} is gone, removing from table")
-                        connections_table.delete_item(Key={'connectionId': connection_id})
-                    except Exception as e:
-                        logger.error(f"Error sending to connection {connection_id}: {str(e)}")
-                
-            except json.JSONDecodeError as e:
-                logger.error(f"Failed to parse message body: {str(e)}")
+                subscribed[request_id] = [connection_id for connection_id, _ in connections]
+
+                for message_data in messages:
+                    # Each payload mode is rendered once per message
+                    payloads = {}
+                    for connection_id, mode in connections:
+                        if mode not in payloads:
+                            payloads[mode] = build_payload(request_id, message_data, mode)
+                        posts.append((connection_id, payloads[mode]))
+
             except Exception as e:
-                logger.error(f"Error processing record: {str(e)}")
-        
+                logger.error(f"Error looking up connections for requestId {request_id}: {str(e)}")
+
+        # Send notifications concurrently and clean up gone connections in one pass
+        if posts:
+            gone_connections = fan_out(get_client('apigatewaymanagementapi', endpoint_url=endpoint), posts)
+            invalidate_connections(gone_connections)
+            remove_subscriptions([
+                (connection_id, request_id)
+                for request_id, connection_ids in subscribed.items()
+                for connection_id in connection_ids
+                if connection_id in gone_connections
+            ], RetryPolicy(context))
+
         return {
             'statusCode': 200,
             'message': 'Processing complete'
         }
-        
+
     except Exception as e:
         logger.error(f"Unhandled exception: {str(e)}")
         return {
             'statusCode': 500,
             'error': f'Internal server error: {str(e)}'
-        }
\ No newline at end of file
+        }
@@ -1,10 +1,797 @@
 import json
-import boto3
 import os
+import base64
+import binascii
+import logging
+import re
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from botocore.exceptions import ClientError
+from aws_clients import get_client, preload
+from dynamodb_codec import deserialize_item
+from metrics import log_metrics, timer
+from notifications import NOTIFICATION_MAX_RESULT_BYTES, NotificationPublisher
+from retry import RetryPolicy, is_retryable
 
-dynamodb = boto3.resource('dynamodb')
+# Configure logging
+log_level = os.environ.get('LOG_LEVEL', 'INFO')
+logger = logging.getLogger()
+logger.setLevel(getattr(logging, log_level))
 
+# Build AWS clients during init only when COLD_START_MODE=eager
+preload(clients=['dynamodb', 'sqs'])
+
+# List budgets: a page stops once either the item or the byte budget is reached.
+# Pages reach the client as notifications, so the default byte budget stays
+# below the size at which notifications are cut down to keys.
+DEFAULT_LIST_LIMIT = 50
+MAX_LIST_LIMIT = int(os.environ.get('LIST_MAX_ITEMS', '1000'))
+MAX_LIST_BYTES = int(os.environ.get('LIST_MAX_BYTES', str(NOTIFICATION_MAX_RESULT_BYTES - 8 * 1024)))
+
+# DynamoDB applies Limit before a FilterExpression, so filtered pages read a
+# fixed number of items, and a filtered list stops after a number of pages
+# or seconds and hands out a cursor, even when it found fewer items
+FILTERED_PAGE_SIZE = int(os.environ.get('LIST_FILTERED_PAGE_SIZE', '1000'))
+FILTERED_MAX_ROUNDS = int(os.environ.get('LIST_FILTERED_MAX_ROUNDS', '50'))
+FILTERED_MAX_SECONDS = float(os.environ.get('LIST_FILTERED_MAX_SECONDS', '5'))
+
+# Parallel scan settings
+DEFAULT_SCAN_SEGMENTS = int(os.environ.get('SCAN_SEGMENTS', '4'))
+MAX_SCAN_SEGMENTS = int(os.environ.get('SCAN_MAX_SEGMENTS', '16'))
+
+# Warm-container item cache settings (a TTL of 0 disables the cache)
+ITEM_CACHE_TTL = float(os.environ.get('ITEM_CACHE_TTL', '5'))
+ITEM_CACHE_MAX_ENTRIES = int(os.environ.get('ITEM_CACHE_MAX_ENTRIES', '1000'))
+ITEM_CACHE_MAX_BYTES = int(os.environ.get('ITEM_CACHE_MAX_BYTES', str(8 * 1024 * 1024)))
+ITEM_CACHE_REVALIDATE = os.environ.get('ITEM_CACHE_REVALIDATE', 'true').lower() == 'true'
+
+# BatchGetItem accepts at most 100 keys per call
+BATCH_GET_SIZE = 100
+MAX_BATCH_GET_IDS = int(os.environ.get('BATCH_GET_MAX_IDS', '1000'))
+
+# Upper bound on the attribute paths of a fields= parameter
+MAX_PROJECTION_FIELDS = int(os.environ.get('PROJECTION_MAX_FIELDS', '50'))
+
+# One dot-separated part of a field path: a name with optional list indexes
+FIELD_SEGMENT = re.compile(r'^([^.\[\]]+)((?:\[\d+\])*)$')
+
+# Secondary indexes usable by filtered lists, as defined in dynamodb.tf:
+# [{"name": ..., "hash_key": ..., "range_key": ...}]
+LIST_INDEXES = json.loads(os.environ.get('LIST_INDEXES') or '[]')
+
+# Attributes a list may filter on: index keys plus any configured extras
+LIST_FILTER_ATTRIBUTES = set(filter(None, os.environ.get('LIST_FILTER_ATTRIBUTES', '').split(',')))
+for index in LIST_INDEXES:
+    LIST_FILTER_ATTRIBUTES.update(filter(None, (index['hash_key'], index.get('range_key'))))
+
+# Inclusive range filters on timestamps: parameter -> (attribute, comparison)
+RANGE_PARAMETERS = {
+    'created_from': ('created_at', '>='),
+    'created_to': ('created_at', '<='),
+    'updated_from': ('updated_at', '>='),
+    'updated_to': ('updated_at', '<=')
+}
+
+# Scan pages and batch get chunks are fetched with the low-level client,
+# which is thread safe
+read_executor = ThreadPoolExecutor(max_workers=MAX_SCAN_SEGMENTS)
+
+HEADERS = {
+    'Content-Type': 'application/json',
+    'Access-Control-Allow-Origin': '*'
+}
+
+
+class InvalidRequest(Exception):
+    """Raised when request parameters cannot be used"""
+
+
+class ItemCache:
+    """
+    Thread-safe LRU cache of items bounded by entry count and bytes.
+    Entries carry the item's updated_at so an older read never replaces a
+    newer one, and expired entries can be revalidated against the table.
+    """
+
+    def __init__(self, ttl, max_entries, max_bytes):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.entries = OrderedDict()
+        self.size = 0
+        self.lock = threading.Lock()
+        self.stats = {'hits': 0, 'misses': 0, 'revalidations': 0, 'evictions': 0}
+
+    @property
+    def enabled(self):
+        return self.ttl > 0 and self.max_entries > 0
+
+    def get(self, key):
+        """
+        Return (item, updated_at, fresh) for a cached key, or None
+        """
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None:
+                self.stats['misses'] += 1
+                return None
+            self.entries.move_to_end(key)
+            item, updated_at, expires_at, _ = entry
+            fresh = expires_at > time.monotonic()
+            self.stats['hits' if fresh else 'revalidations'] += 1
+            return item, updated_at, fresh
+
+    def put(self, key, item):
+        if not self.enabled:
+            return
+        updated_at = item.get('updated_at')
+        size = item_size(item)
+        if size > self.max_bytes:
+            return
+        with self.lock:
+            current = self.entries.get(key)
+            if current is not None:
+                if updated_at is not None and current[1] is not None and updated_at < current[1]:
+                    return
+                self.size -= current[3]
+            self.entries[key] = (item, updated_at, time.monotonic() + self.ttl, size)
+            self.entries.move_to_end(key)
+            self.size += size
+            while len(self.entries) > self.max_entries or self.size > self.max_bytes:
+                _, evicted = self.entries.popitem(last=False)
+                self.size -= evicted[3]
+                self.stats['evictions'] += 1
+
+    def touch(self, key):
+        """
+        Extend the TTL of an entry that was revalidated
+        """
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is not None:
+                self.entries[key] = entry[:2] + (time.monotonic() + self.ttl,) + entry[3:]
+
+    def invalidate(self, key):
+        with self.lock:
+            entry = self.entries.pop(key, None)
+            if entry is not None:
+                self.size -= entry[3]
+
+    def snapshot(self):
+        with self.lock:
+            return dict(self.stats, entries=len(self.entries), bytes=self.size)
+
+
+item_cache = ItemCache(ITEM_CACHE_TTL, ITEM_CACHE_MAX_ENTRIES, ITEM_CACHE_MAX_BYTES)
+
+
+def parse_fields(value):
+    """
+    Parse a fields parameter, given as a list or a comma separated string,
+    into attribute paths. A path is a tuple of names and list indexes, e.g.
+    "address.city" or "tags[0]". The id is always included.
+    """
+    if isinstance(value, str):
+        value = value.split(',')
+    if not isinstance(value, list):
+        raise InvalidRequest('fields must be a list or a comma separated string')
+
+    paths = [('id',)]
+    for field in value:
+        field = str(field).strip()
+        if not field:
+            continue
+        path = []
+        for part in field.split('.'):
+            match = FIELD_SEGMENT.match(part.strip())
+            if not match:
+                raise InvalidRequest(f'Invalid field: {field}')
+            path.append(match.group(1))
+            path.extend(int(index) for index in re.findall(r'\d+', match.group(2)))
+        if tuple(path) not in paths:
+            paths.append(tuple(path))
+
+    if len(paths) > MAX_PROJECTION_FIELDS + 1:
+        raise InvalidRequest(f'At most {MAX_PROJECTION_FIELDS} fields can be requested')
+    return paths
+
+
+def build_projection(paths):
+    """
+    Build ProjectionExpression arguments for attribute paths. Every name gets
+    an ExpressionAttributeNames placeholder, so reserved words and names
+    with special characters are safe.
+    """
+    names = {}
+    expressions = []
+    for path in paths:
+        expression = ''
+        for segment in path:
+            if isinstance(segment, int):
+                expression += f'[{segment}]'
+                continue
+            placeholder = names.setdefault(segment, f'#p{len(names)}')
+            expression += ('.' if expression else '') + placeholder
+        expressions.append(expression)
+    return {
+        'ProjectionExpression': ', '.join(expressions),
+        'ExpressionAttributeNames': {placeholder: name for name, placeholder in names.items()}
+    }
+
+
+def project_item(item, paths):
+    """
+    Apply a projection of top-level attributes to a cached item.
+    Returns None when a path is nested and DynamoDB has to apply it.
+    """
+    if any(len(path) > 1 for path in paths):
+        return None
+    return {path[0]: item[path[0]] for path in paths if path[0] in item}
+
+
+def encode_cursor(state):
+    """
+    Encode list pagination state as an opaque URL-safe cursor
+    """
+    return base64.urlsafe_b64encode(json.dumps(state, separators=(',', ':')).encode()).decode()
+
+
+def valid_key(key):
+    """
+    Check that a cursor key looks like a low-level DynamoDB key
+    """
+    return (isinstance(key, dict) and bool(key) and all(
+        isinstance(name, str) and isinstance(value, dict) and len(value) == 1
+        and next(iter(value)) in ('S', 'N', 'B') and isinstance(next(iter(value.values())), str)
+        for name, value in key.items()
+    ))
+
+
+def decode_cursor(cursor):
+    """
+    Decode a cursor produced by encode_cursor. A tampered cursor is
+    rejected here rather than failing the DynamoDB request.
+    """
+    try:
+        state = json.loads(base64.urlsafe_b64decode(str(cursor).encode()))
+    except (binascii.Error, ValueError, UnicodeDecodeError):
+        raise InvalidRequest('Invalid cursor')
+    if not isinstance(state, dict):
+        raise InvalidRequest('Invalid cursor')
+
+    if 'k' in state and not valid_key(state['k']):
+        raise InvalidRequest('Invalid cursor')
+    if 'i' in state and not isinstance(state['i'], str):
+        raise InvalidRequest('Invalid cursor')
+    if 't' in state:
+        total_segments = state['t']
+        segments = state.get('s')
+        if (not isinstance(total_segments, int) or isinstance(total_segments, bool)
+                or not 1 <= total_segments <= MAX_SCAN_SEGMENTS or not isinstance(segments, dict)):
+            raise InvalidRequest('Invalid cursor')
+        for segment, key in segments.items():
+            if not segment.isdigit() or int(segment) >= total_segments:
+                raise InvalidRequest('Invalid cursor')
+            if key is not None and not valid_key(key):
+                raise InvalidRequest('Invalid cursor')
+    return state
+
+
+def scan_page(table_name, start_key, limit, segment=None, total_segments=None, expression=None):
+    """
+    Fetch a single scan page. Returns (items, low-level LastEvaluatedKey).
+    expression holds extra request arguments such as a projection or filter.
+    """
+    scan_kwargs = {'TableName': table_name, 'Limit': limit}
+    if expression:
+        scan_kwargs.update(expression)
+    if start_key:
+        scan_kwargs['ExclusiveStartKey'] = start_key
+    if total_segments:
+        scan_kwargs['Segment'] = segment
+        scan_kwargs['TotalSegments'] = total_segments
+
+    response = get_client('dynamodb').scan(**scan_kwargs)
+    items = [deserialize_item(item) for item in response.get('Items', [])]
+    return items, response.get('LastEvaluatedKey')
+
+
+def query_page(table_name, start_key, limit, expression):
+    """
+    Fetch a single page of an index query. Returns (items, low-level LastEvaluatedKey).
+    """
+    query_kwargs = dict(expression, TableName=table_name, Limit=limit)
+    if start_key:
+        query_kwargs['ExclusiveStartKey'] = start_key
+
+    response = get_client('dynamodb').query(**query_kwargs)
+    items = [deserialize_item(item) for item in response.get('Items', [])]
+    return items, response.get('LastEvaluatedKey')
+
+
+def item_size(item):
+    """
+    Approximate the serialized size of an item in bytes
+    """
+    return len(json.dumps(item, default=str))
+
+
+def resume_key(item, key_attributes):
+    """
+    Build the ExclusiveStartKey that continues a page after item, used when
+    a page is cut short. Table and index keys are strings.
+    """
+    return {key: {'S': item[key]} for key in key_attributes}
+
+
+class ListBudget:
+    """
+    Round and time bound of one filtered list. Unfiltered lists are only
+    bounded by their item and byte budgets.
+    """
+
+    def __init__(self, expression):
+        self.filtered = bool(expression and 'FilterExpression' in expression)
+        self.rounds = 0
+        self.deadline = time.monotonic() + FILTERED_MAX_SECONDS
+
+    def page_limit(self, remaining):
+        return FILTERED_PAGE_SIZE if self.filtered else remaining
+
+    def next_round(self):
+        """
+        Count a round. Returns False once a filtered list should stop.
+        """
+        self.rounds += 1
+        return not self.filtered or (self.rounds < FILTERED_MAX_ROUNDS and time.monotonic() < self.deadline)
+
+
+def list_items_sequential(table_name, limit, state, expression=None, fetch_page=scan_page, key_attributes=('id',)):
+    """
+    Scan (or query) pages in order until the item or byte budget is reached
+    """
+    start_key = state.get('k')
+    budget = ListBudget(expression)
+    items = []
+    size = 0
+
+    while len(items) < limit and size < MAX_LIST_BYTES:
+        remaining = limit - len(items)
+        page, last_key = fetch_page(table_name, start_key, budget.page_limit(remaining), expression=expression)
+        if len(page) > remaining:
+            page = page[:remaining]
+            last_key = resume_key(page[-1], key_attributes)
+        for item in page:
+            items.append(item)
+            size += item_size(item)
+        start_key = last_key
+        if not last_key or not budget.next_round():
+            break
+
+    return items, ({'k': start_key} if start_key else None)
+
+
+def list_items_parallel(table_name, limit, total_segments, state, expression=None):
+    """
+    Scan all segments concurrently, merging pages as they arrive until the
+    item or byte budget is reached.
+    The cursor keeps the resume key of every unfinished segment.
+    """
+    if 't' in state:
+        total_segments = state['t']
+        pending = {int(segment): key for segment, key in state.get('s', {}).items()}
+    else:
+        pending = {segment: None for segment in range(total_segments)}
+
+    if not 1 <= total_segments <= MAX_SCAN_SEGMENTS:
+        raise InvalidRequest(f'segments must be between 1 and {MAX_SCAN_SEGMENTS}')
+
+    budget = ListBudget(expression)
+    items = []
+    size = 0
+
+    while pending and len(items) < limit and size < MAX_LIST_BYTES:
+        # Split the remaining items over the segments, so the pages of one
+        # round never add up to more than the limit
+        share, extra = divmod(limit - len(items), len(pending))
+        page_limits = {segment: budget.page_limit(share + (1 if index < extra else 0))
+                       for index, segment in enumerate(pending)}
+        futures = {
+            read_executor.submit(scan_page, table_name, start_key, page_limits[segment],
+                                 segment, total_segments, expression): segment
+            for segment, start_key in pending.items()
+            if page_limits[segment]
+        }
+        for future in as_completed(futures):
+            # Pages arriving after the budget is spent are dropped and the
+            # segment resumes from its previous key
+            if len(items) >= limit or size >= MAX_LIST_BYTES:
+                continue
+            segment = futures[future]
+            page, last_key = future.result()
+            # Filtered pages can hold more matches than are still needed
+            if len(page) > limit - len(items):
+                page = page[:limit - len(items)]
+                last_key = resume_key(page[-1], ('id',))
+            for item in page:
+                items.append(item)
+                size += item_size(item)
+            if last_key:
+                pending[segment] = last_key
+            else:
+                del pending[segment]
+        if not budget.next_round():
+            break
+
+    if not pending:
+        return items, None
+    return items, {'t': total_segments, 's': {str(segment): key for segment, key in pending.items()}}
+
+
+def parse_filters(query_params):
+    """
+    Collect list filters as {attribute: [(comparison, value)]}.
+    Equality filters use the attribute name as parameter, e.g. status=active.
+    """
+    filters = {}
+    for name, value in query_params.items():
+        if name in LIST_FILTER_ATTRIBUTES:
+            filters.setdefault(name, []).append(('=', str(value)))
+        elif name in RANGE_PARAMETERS:
+            attribute, comparison = RANGE_PARAMETERS[name]
+            filters.setdefault(attribute, []).append((comparison, str(value)))
+    for attribute, conditions in filters.items():
+        if len(conditions) > 1 and any(comparison == '=' for comparison, _ in conditions):
+            raise InvalidRequest(f'Conflicting filters on {attribute}')
+    return filters
+
+
+def choose_index(filters):
+    """
+    Pick the index whose hash key has an equality filter, preferring one
+    whose range key is filtered as well
+    """
+    best = None
+    for index in LIST_INDEXES:
+        if filters.get(index['hash_key'], [(None,)])[0][0] != '=':
+            continue
+        score = 2 if index.get('range_key') in filters else 1
+        if best is None or score > best[0]:
+            best = (score, index)
+    return best[1] if best else None
+
+
+def list_expression(filters, paths):
+    """
+    Turn list filters and a projection into request arguments. Filters on
+    the keys of the chosen index become the key condition, the rest a
+    FilterExpression.
+    Returns (index name or None, request arguments).
+    """
+    expression = build_projection(paths) if paths else {}
+    names = dict(expression.get('ExpressionAttributeNames', {}))
+    values = {}
+
+    def condition(attribute):
+        name = f'#c{len(names)}'
+        names[name] = attribute
+        placeholders = []
+        for comparison, value in sorted(filters[attribute]):
+            placeholders.append((comparison, f':c{len(values)}'))
+            values[placeholders[-1][1]] = {'S': value}
+        if len(placeholders) == 2:
+            # A lower and an upper bound
+            return f'{name} BETWEEN {placeholders[1][1]} AND {placeholders[0][1]}'
+        comparison, placeholder = placeholders[0]
+        return f'{name} {comparison} {placeholder}'
+
+    index = choose_index(filters)
+    key_attributes = []
+    if index:
+        key_attributes = [key for key in (index['hash_key'], index.get('range_key')) if key in filters]
+        expression['IndexName'] = index['name']
+        expression['KeyConditionExpression'] = ' AND '.join(condition(key) for key in key_attributes)
+    other_attributes = [attribute for attribute in filters if attribute not in key_attributes]
+    if other_attributes:
+        expression['FilterExpression'] = ' AND '.join(condition(attribute) for attribute in other_attributes)
+
+    if names:
+        expression['ExpressionAttributeNames'] = names
+    if values:
+        expression['ExpressionAttributeValues'] = values
+    return (index['name'] if index else None), expression
+
+
+def list_items(table_name, query_params, paths=None):
+    """
+    List items with cursor pagination. Filters that match a secondary index
+    are answered with a Query; other filters use a filtered parallel scan.
+    """
+    try:
+        limit = int(query_params.get('limit', DEFAULT_LIST_LIMIT))
+        segments = int(query_params.get('segments', 0))
+    except (TypeError, ValueError):
+        raise InvalidRequest('limit and segments must be integers')
+    limit = max(1, min(limit, MAX_LIST_LIMIT))
+
+    if not segments and str(query_params.get('parallel', '')).lower() == 'true':
+        segments = DEFAULT_SCAN_SEGMENTS
+
+    # lastKey is accepted as an alias for cursor
+    cursor = query_params.get('cursor') or query_params.get('lastKey')
+    state = decode_cursor(cursor) if cursor else {}
+
+    filters = parse_filters(query_params)
+
+    # A page cut short resumes from its last item, so the index keys are
+    # projected even when fields= leaves them out
+    index = choose_index(filters)
+    key_attributes = ['id']
+    if index:
+        key_attributes += [key for key in (index['hash_key'], index.get('range_key')) if key]
+    hidden = [key for key in key_attributes if paths and (key,) not in paths]
+    if hidden:
+        paths = paths + [(key,) for key in hidden]
+
+    index_name, expression = list_expression(filters, paths)
+
+    # Query cursors name their index; scan cursors must not be mixed with them
+    if state and state.get('i') != index_name:
+        raise InvalidRequest('Cursor does not match the filters')
+
+    if index_name:
+        items, next_state = list_items_sequential(table_name, limit, state, expression, query_page, key_attributes)
+        if next_state:
+            next_state['i'] = index_name
+    else:
+        # Filters without a matching index read the whole table, so spread
+        # the scan over segments
+        if filters and not segments:
+            segments = DEFAULT_SCAN_SEGMENTS
+        if 't' in state or (segments and 'k' not in state):
+            items, next_state = list_items_parallel(table_name, limit, segments, state, expression)
+        else:
+            items, next_state = list_items_sequential(table_name, limit, state, expression)
+
+    for item in items:
+        for key in hidden:
+            item.pop(key, None)
+
+    result = {
+        'items': items,
+        'count': len(items)
+    }
+
+    if next_state:
+        result['cursor'] = encode_cursor(next_state)
+
+    return result
+
+
+def get_item(table_name, item_id, consistent=False, paths=None):
+    """
+    Get a single item through the warm-container cache.
+    Strongly consistent reads bypass the cache and refresh it. With paths
+    only those attributes are returned; cached items answer projections of
+    top-level attributes, nested ones are read with a ProjectionExpression.
+    """
+    key = {'id': {'S': item_id}}
+    cache_key = (table_name, item_id)
+
+    if item_cache.enabled and not consistent:
+        cached = item_cache.get(cache_key)
+        if cached and paths:
+            # Projected reads use the cache only while it is fresh
+            projected = project_item(cached[0], paths) if cached[2] else None
+            if projected is not None:
+                return projected
+        elif cached:
+            item, updated_at, fresh = cached
+            if fresh:
+                return item
+            if ITEM_CACHE_REVALIDATE and updated_at is not None:
+                # Expired entry: only fetch updated_at and keep the cached
+                # item when it has not changed
+                response = get_client('dynamodb').get_item(
+                    TableName=table_name,
+                    Key=key,
+                    ProjectionExpression='#updated_at',
+                    ExpressionAttributeNames={'#updated_at': 'updated_at'}
+                )
+                if 'Item' not in response:
+                    item_cache.invalidate(cache_key)
+                    return None
+                if response['Item'].get('updated_at', {}).get('S') == updated_at:
+                    item_cache.touch(cache_key)
+                    return item
+
+    if paths:
+        response = get_client('dynamodb').get_item(
+            TableName=table_name, Key=key, ConsistentRead=consistent, **build_projection(paths)
+        )
+        if 'Item' not in response:
+            item_cache.invalidate(cache_key)
+            return None
+        return deserialize_item(response['Item'])
+
+    response = get_client('dynamodb').get_item(TableName=table_name, Key=key, ConsistentRead=consistent)
+    item = deserialize_item(response['Item']) if 'Item' in response else None
+    if item:
+        item_cache.put(cache_key, item)
+    else:
+        item_cache.invalidate(cache_key)
+    return item
+
+
+def batch_get_chunk(table_name, item_ids, consistent, projection, policy):
+    """
+    Fetch up to 100 items with BatchGetItem, retrying UnprocessedKeys with
+    the policy's backoff.
+    Returns {id: item} for the items that exist.
+    """
+    keys = [{'id': {'S': item_id}} for item_id in item_ids]
+    found = {}
+
+    backoff = policy.backoff()
+    while True:
+        request = {'Keys': keys, 'ConsistentRead': consistent}
+        if projection:
+            request.update(projection)
+        response = get_client('dynamodb').batch_get_item(RequestItems={table_name: request})
+        for item in response.get('Responses', {}).get(table_name, []):
+            item = deserialize_item(item)
+            found[item['id']] = item
+
+        keys = response.get('UnprocessedKeys', {}).get(table_name, {}).get('Keys', [])
+        if not keys:
+            return found
+        logger.warning(f"{len(keys)} unprocessed keys, retrying (attempt {backoff.attempt})")
+        if not backoff.wait():
+            raise RuntimeError(f"Unable to read {len(keys)} keys after {backoff.attempt} attempts")
+
+
+def batch_get_items(table_name, item_ids, consistent=False, paths=None, policy=None):
+    """
+    Get many items by id with concurrent BatchGetItem calls.
+    Results keep the request order and mark ids that do not exist.
+    """
+    if len(item_ids) > MAX_BATCH_GET_IDS:
+        raise InvalidRequest(f'At most {MAX_BATCH_GET_IDS} ids can be requested at once')
+
+    found = {}
+    to_fetch = []
+    for item_id in dict.fromkeys(item_ids):
+        cached = None if consistent else item_cache.get((table_name, item_id))
+        item = cached[0] if cached and cached[2] else None
+        if item is not None and paths:
+            item = project_item(item, paths)
+        if item is not None:
+            found[item_id] = item
+        else:
+            to_fetch.append(item_id)
+
+    # Projected items are partial and are not cached
+    projection = build_projection(paths) if paths else None
+    policy = policy or RetryPolicy()
+    futures = [
+        read_executor.submit(batch_get_chunk, table_name, to_fetch[i:i + BATCH_GET_SIZE], consistent,
+                             projection, policy)
+        for i in range(0, len(to_fetch), BATCH_GET_SIZE)
+    ]
+    for future in futures:
+        for item_id, item in future.result().items():
+            if not projection:
+                item_cache.put((table_name, item_id), item)
+            found[item_id] = item
+
+    results = []
+    for item_id in item_ids:
+        if item_id in found:
+            results.append({'id': item_id, 'found': True, 'item': found[item_id]})
+        else:
+            results.append({'id': item_id, 'found': False})
+
+    return {
+        'items': results,
+        'count': len(results),
+        'notFound': sum(1 for result in results if not result['found'])
+    }
+
+
+def parse_ids(value):
+    """
+    Accept ids as a list or a comma separated string
+    """
+    if isinstance(value, str):
+        value = value.split(',')
+    if not isinstance(value, list):
+        raise InvalidRequest('ids must be a list or a comma separated string')
+    return [str(item_id).strip() for item_id in value if str(item_id).strip()]
+
+
+def read(table_name, item_id, query_params, policy=None):
+    """
+    Read a single item or a page of items.
+    Returns (status_code, body).
+    """
+    try:
+        paths = parse_fields(query_params['fields']) if query_params.get('fields') else None
+
+        if item_id:
+            # Get single item
+            consistent = str(query_params.get('consistent', '')).lower() == 'true'
+            item = get_item(table_name, item_id, consistent, paths)
+
+            if item:
+                return 200, item
+            return 404, {'error': 'Item not found'}
+
+        if query_params.get('ids'):
+            consistent = str(query_params.get('consistent', '')).lower() == 'true'
+            return 200, batch_get_items(table_name, parse_ids(query_params['ids']), consistent, paths, policy)
+        return 200, list_items(table_name, query_params, paths)
+    except InvalidRequest as e:
+        return 400, {'error': str(e)}
+
+
+def handle_sqs_event(event, table_name, context=None):
+    """
+    Process get/list messages delivered by the CRUD queue.
+    Messages that hit retryable errors until the time budget ran out are
+    returned as batchItemFailures.
+    """
+    policy = RetryPolicy(context)
+    publisher = NotificationPublisher(context=context)
+    batch_item_failures = []
+    for record in event.get('Records', []):
+        try:
+            with timer('Parse'):
+                message_data = json.loads(record.get('body') or '{}')
+            operation = message_data.get('operation')
+            if operation not in ('get', 'list'):
+                logger.warning(f"Unexpected operation type: {operation}. Expected 'get' or 'list'.")
+                continue
+
+            item_id = message_data.get('id') if operation == 'get' else None
+            query_params = message_data.get('queryParams') or {}
+            if message_data.get('ids'):
+                query_params = dict(query_params, ids=message_data['ids'])
+            if policy.expired():
+                raise TimeoutError('No time left in this invocation')
+            status_code, body = policy.call(read, table_name, item_id, query_params, policy)
+
+            publisher.add(message_data.get('requestId'), operation, body,
+                          'success' if status_code < 400 else 'error')
+
+        except json.JSONDecodeError as e:
+            logger.error(f"Failed to parse message body: {str(e)}")
+        except ClientError as e:
+            logger.error(f"DynamoDB error: {str(e)}")
+            if is_retryable(e):
+                batch_item_failures.append({'itemIdentifier': record.get('messageId')})
+            else:
+                # Permanent errors would fail again on every redelivery, so
+                # the request is answered with an error instead
+                publisher.add(message_data.get('requestId'), operation,
+                              {'error': f'DynamoDB error: {str(e)}'}, 'error')
+        except Exception as e:
+            logger.error(f"Error processing record: {str(e)}")
+            batch_item_failures.append({'itemIdentifier': record.get('messageId')})
+
+    publisher.flush()
+
+    if item_cache.enabled:
+        logger.info(f"Item cache stats: {json.dumps(item_cache.snapshot())}")
+
+    if batch_item_failures:
+        logger.warning(f"{len(batch_item_failures)} read messages returned to the queue")
+
+    return {'batchItemFailures': batch_item_failures}
+
+
+@log_metrics
 def lambda_handler(event, context):
     """
     Lambda function to read an item from DynamoDB
@@ -12,84 +799,52 @@ def lambda_handler(event, context):
     try:
         # Get table name from environment variable
         table_name = os.environ.get('TABLE_NAME')
-        
+
         if not table_name:
             return {
                 'statusCode': 500,
-                'headers': {
-                    'Content-Type': 'application/json',
-                    'Access-Control-Allow-Origin': '*'
-                },
+                'headers': HEADERS,
                 'body': json.dumps({
                     'error': 'TABLE_NAME environment variable not set'
                 })
             }
-        
+
+        # Messages from the CRUD queue; an unexpected error returns the
+        # whole batch to the queue
+        if 'Records' in event:
+            try:
+                return handle_sqs_event(event, table_name, context)
+            except Exception as e:
+                logger.error(f"Unhandled exception: {str(e)}")
+                return {
+                    'batchItemFailures': [
+                        {'itemIdentifier': record.get('messageId')} for record in event['Records']
+                    ]
+                }
+
         # Extract item ID from path parameters
         item_id = None
         if 'pathParameters' in event and event['pathParameters']:
             item_id = event['pathParameters'].get('id')
-        
+
         # Get query parameters
         query_params = event.get('queryStringParameters') or {}
-        
-        # Get DynamoDB table
-        table = dynamodb.Table(table_name)
-        
-        if item_id:
-            # Get single item
-            response = table.get_item(Key={'id': item_id})
-            
-            if 'Item' in response:
-                return {
-                    'statusCode': 200,
-                    'headers': {
-                        'Content-Type': 'application/json',
-                        'Access-Control-Allow-Origin': '*'
-                    },
-                    'body': json.dumps(response['Item'])
-                }
-            else:
-                return {
-                    'statusCode': 404,
-                    'headers': {
-                        'Content-Type': 'application/json',
-                        'Access-Control-Allow-Origin': '*'
-                    },
-                    'body': json.dumps({
-                        'error': 'Item not found'
-                    })
-                }
-        else:
-            # Scan all items
-            limit = int(query_params.get('limit', 50))
-            response = table.scan(Limit=limit)
-            items = response.get('Items', [])
-            
-            result = {
-                'items': items,
-                'count': len(items)
-            }
-            
-            if 'LastEvaluatedKey' in response:
-                result['lastKey'] = response['LastEvaluatedKey']
-            
-            return {
-                'statusCode': 200,
-                'headers': {
-                    'Content-Type': 'application/json',
-                    'Access-Control-Allow-Origin': '*'
-                },
-                'body': json.dumps(result)
-            }
-        
+
+        status_code, body = read(table_name, item_id, query_params)
+
+        if item_cache.enabled:
+            logger.info(f"Item cache stats: {json.dumps(item_cache.snapshot())}")
+
+        return {
+            'statusCode': status_code,
+            'headers': HEADERS,
+            'body': json.dumps(body)
+        }
+
     except ClientError as e:
         return {
             'statusCode': 500,
-            'headers': {
-                'Content-Type': 'application/json',
-                'Access-Control-Allow-Origin': '*'
-            },
+            'headers': HEADERS,
             'body': json.dumps({
                 'error': f'DynamoDB error: {str(e)}'
             })
@@ -97,10 +852,7 @@ def lambda_handler(event, context):
     except Exception as e:
         return {
             'statusCode': 500,
-            'headers': {
-                'Content-Type': 'application/json',
-                'Access-Control-Allow-Origin': '*'
-            },
+            'headers': HEADERS,
             'body': json.dumps({
                 'error': f'Internal server error: {str(e)}'
             })
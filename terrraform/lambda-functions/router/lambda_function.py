@@ -0,0 +1,115 @@
+import importlib
+import importlib.util
+import json
+import os
+import logging
+from metrics import log_metrics, timer
+
+# Configure logging
+log_level = os.environ.get('LOG_LEVEL', 'INFO')
+logger = logging.getLogger()
+logger.setLevel(getattr(logging, log_level))
+
+# Function whose handler processes each operation of the CRUD queue
+OPERATION_FUNCTIONS = {
+    'create': 'create',
+    'get': 'read',
+    'list': 'read',
+    'update': 'update',
+    'delete': 'delete'
+}
+
+
+def load_function(function):
+    """
+    Import the lambda_function module of another CRUD function.
+    The router's zip packages them as <function>_handler.py; in the source
+    tree they are loaded from the sibling function directory.
+    """
+    module_name = f'{function}_handler'
+    try:
+        return importlib.import_module(module_name)
+    except ModuleNotFoundError as e:
+        if e.name != module_name:
+            raise
+    path = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', function, 'lambda_function.py')
+    spec = importlib.util.spec_from_file_location(module_name, path)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+def load_handler(function):
+    """
+    Return a function's lambda_handler without its metrics decorator, since
+    the router flushes one metrics record for the whole batch
+    """
+    handler = load_function(function).lambda_handler
+    return getattr(handler, '__wrapped__', handler)
+
+
+# All handlers are imported during init, so every operation is served by
+# the same warm containers and shares their AWS clients
+handlers = {function: load_handler(function) for function in sorted(set(OPERATION_FUNCTIONS.values()))}
+
+
+def group_records(records):
+    """
+    Split a mixed batch into one batch per function, in order of first
+    appearance. Records without a known operation are dropped, as the event
+    source filter of the separate functions would drop them.
+    """
+    groups = {}
+    for record in records:
+        try:
+            with timer('Parse'):
+                operation = json.loads(record.get('body') or '{}').get('operation')
+        except (json.JSONDecodeError, AttributeError) as e:
+            logger.error(f"Failed to parse message body: {str(e)}")
+            continue
+        function = OPERATION_FUNCTIONS.get(operation)
+        if not function:
+            logger.warning(f"Unexpected operation type: {operation}")
+            continue
+        groups.setdefault(function, []).append(record)
+    return groups
+
+
+@log_metrics
+def lambda_handler(event, context):
+    """
+    Lambda function that dispatches CRUD queue messages to the create, read,
+    update and delete handlers. A batch may mix operations; the failures of
+    every handler are reported back together.
+    """
+    records = event.get('Records', [])
+    batch_item_failures = []
+
+    try:
+        groups = group_records(records)
+    except Exception as e:
+        logger.error(f"Unhandled exception: {str(e)}")
+        return {
+            'batchItemFailures': [
+                {'itemIdentifier': record.get('messageId')} for record in records
+            ]
+        }
+
+    for function, group in groups.items():
+        logger.info(f"Dispatching {len(group)} records to {function}")
+        try:
+            result = handlers[function]({'Records': group}, context)
+            if 'batchItemFailures' not in result:
+                # An error response such as a missing TABLE_NAME
+                raise RuntimeError(result.get('body'))
+            batch_item_failures.extend(result['batchItemFailures'])
+        except Exception as e:
+            logger.error(f"Unhandled exception in {function}: {str(e)}")
+            batch_item_failures.extend(
+                {'itemIdentifier': record.get('messageId')} for record in group
+            )
+
+    if batch_item_failures:
+        logger.warning(f"{len(batch_item_failures)} of {len(records)} records failed")
+
+    return {'batchItemFailures': batch_item_failures}
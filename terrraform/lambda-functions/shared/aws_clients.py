@@ -0,0 +1,81 @@
+"""
+Shared AWS client factory packaged into every Lambda function.
+
+Low-level clients are created on first use and kept at module scope, so
+warm invocations reuse their connection pools instead of paying for
+endpoint resolution and TLS setup again. All of them share one tuned
+botocore Config that can be adjusted through environment variables, and
+every client is hooked up to the per-invocation metrics in metrics.py.
+
+COLD_START_MODE controls when the cost is paid. In 'lazy' mode (default)
+boto3 is not even imported until the first client is needed, which keeps
+module import cheap. In 'eager' mode boto3 is imported and the clients
+passed to preload() are built while the handler module is imported, which
+suits provisioned concurrency where the init phase is not on the request path.
+"""
+import os
+import threading
+
+from metrics import instrument_client
+
+# Connection pool and timeout settings
+AWS_MAX_POOL_CONNECTIONS = int(os.environ.get('AWS_MAX_POOL_CONNECTIONS', '32'))
+AWS_CONNECT_TIMEOUT = float(os.environ.get('AWS_CONNECT_TIMEOUT', '2'))
+AWS_READ_TIMEOUT = float(os.environ.get('AWS_READ_TIMEOUT', '5'))
+
+# Retry settings (botocore reads the same variables natively)
+AWS_MAX_ATTEMPTS = int(os.environ.get('AWS_MAX_ATTEMPTS', '5'))
+AWS_RETRY_MODE = os.environ.get('AWS_RETRY_MODE', 'adaptive')
+
+COLD_START_MODE = os.environ.get('COLD_START_MODE', 'lazy').lower()
+
+_config = None
+_clients = {}
+_lock = threading.Lock()
+
+
+def get_client_config():
+    """
+    Return the botocore Config shared by every client
+    """
+    global _config
+    if _config is None:
+        from botocore.config import Config
+        _config = Config(
+            max_pool_connections=AWS_MAX_POOL_CONNECTIONS,
+            connect_timeout=AWS_CONNECT_TIMEOUT,
+            read_timeout=AWS_READ_TIMEOUT,
+            tcp_keepalive=True,
+            retries={
+                'max_attempts': AWS_MAX_ATTEMPTS,
+                'mode': AWS_RETRY_MODE
+            }
+        )
+    return _config
+
+
+def get_client(service_name, endpoint_url=None):
+    """
+    Return the cached low-level client for a service and endpoint
+    """
+    key = (service_name, endpoint_url)
+    client = _clients.get(key)
+    if client is None:
+        with _lock:
+            client = _clients.get(key)
+            if client is None:
+                import boto3
+                client = boto3.client(service_name, endpoint_url=endpoint_url, config=get_client_config())
+                _clients[key] = instrument_client(client)
+    return client
+
+
+def preload(clients=()):
+    """
+    Build the given clients up front in eager mode.
+    Does nothing in lazy mode.
+    """
+    if COLD_START_MODE != 'eager':
+        return
+    for service_name in clients:
+        get_client(service_name)
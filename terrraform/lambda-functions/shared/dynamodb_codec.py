@@ -0,0 +1,147 @@
+"""
+Conversion between DynamoDB AttributeValue maps and JSON-ready Python values.
+
+Used with the low-level dynamodb client in place of the resource layer's
+TypeSerializer/TypeDeserializer. Numbers come back as int or float instead
+of Decimal and binary values as base64 strings, so results can be passed to
+json.dumps directly. Flat items made of strings and numbers, which is what
+most items are, take a fast path that avoids the generic recursion.
+
+Floats carry about 15 significant digits; DynamoDB numbers with more
+precision lose the extra digits when read.
+"""
+import base64
+from decimal import Decimal
+
+
+def parse_number(text):
+    """
+    Convert the string form of a DynamoDB number to int or float
+    """
+    try:
+        return int(text)
+    except ValueError:
+        return float(text)
+
+
+def format_number(value):
+    """
+    Convert an int, float or Decimal to the string form DynamoDB expects
+    """
+    if isinstance(value, float):
+        if value != value or value in (float('inf'), float('-inf')):
+            raise ValueError('Infinity and NaN are not supported by DynamoDB')
+        if value.is_integer() and abs(value) < 1e16:
+            return str(int(value))
+        return repr(value)
+    if isinstance(value, Decimal):
+        if not value.is_finite():
+            raise ValueError('Infinity and NaN are not supported by DynamoDB')
+        return str(value)
+    return str(value)
+
+
+def deserialize(value):
+    """
+    Convert one AttributeValue to a JSON-ready Python value
+    """
+    for kind, data in value.items():
+        if kind == 'S':
+            return data
+        if kind == 'N':
+            return parse_number(data)
+        if kind == 'M':
+            return deserialize_item(data)
+        if kind == 'L':
+            return [deserialize(element) for element in data]
+        if kind == 'BOOL':
+            return data
+        if kind == 'NULL':
+            return None
+        if kind == 'SS':
+            return list(data)
+        if kind == 'NS':
+            return [parse_number(element) for element in data]
+        if kind == 'B':
+            return base64.b64encode(data).decode('ascii')
+        if kind == 'BS':
+            return [base64.b64encode(element).decode('ascii') for element in data]
+        raise TypeError(f'Unsupported DynamoDB type {kind}')
+    raise TypeError('Empty AttributeValue')
+
+
+def deserialize_item(item):
+    """
+    Convert an AttributeValue map to a dict of JSON-ready values
+    """
+    result = {}
+    for key, value in item.items():
+        # Fast path for the string and number attributes of flat items
+        data = value.get('S')
+        if data is not None:
+            result[key] = data
+            continue
+        data = value.get('N')
+        if data is not None:
+            try:
+                result[key] = int(data)
+            except ValueError:
+                result[key] = float(data)
+            continue
+        result[key] = deserialize(value)
+    return result
+
+
+def serialize(value):
+    """
+    Convert a Python value to an AttributeValue
+    """
+    if isinstance(value, str):
+        return {'S': value}
+    # bool is a subclass of int, so it must be checked first
+    if isinstance(value, bool):
+        return {'BOOL': value}
+    if isinstance(value, (int, float, Decimal)):
+        return {'N': format_number(value)}
+    if value is None:
+        return {'NULL': True}
+    if isinstance(value, dict):
+        return {'M': serialize_item(value)}
+    if isinstance(value, (list, tuple)):
+        return {'L': [serialize(element) for element in value]}
+    if isinstance(value, (bytes, bytearray)):
+        return {'B': bytes(value)}
+    if isinstance(value, (set, frozenset)):
+        if not value:
+            raise ValueError('Empty sets are not supported by DynamoDB')
+        if all(isinstance(element, str) for element in value):
+            return {'SS': sorted(value)}
+        if all(isinstance(element, (int, float, Decimal)) and not isinstance(element, bool) for element in value):
+            return {'NS': [format_number(element) for element in value]}
+        if all(isinstance(element, (bytes, bytearray)) for element in value):
+            return {'BS': [bytes(element) for element in value]}
+        raise TypeError('Sets must contain only strings, numbers or binary values')
+    raise TypeError(f'Unsupported type {type(value).__name__} for DynamoDB')
+
+
+def serialize_item(item):
+    """
+    Convert a dict of Python values to an AttributeValue map
+    """
+    result = {}
+    for key, value in item.items():
+        # Fast path for the string and number attributes of flat items
+        if type(value) is str:
+            result[key] = {'S': value}
+        elif type(value) is int:
+            result[key] = {'N': str(value)}
+        else:
+            result[key] = serialize(value)
+    return result
+
+
+def serialize_values(values):
+    """
+    Convert ExpressionAttributeValues given as Python values
+    """
+    return {placeholder: serialize(value) for placeholder, value in values.items()}
@@ -0,0 +1,254 @@
+"""
+Idempotent processing of SQS redeliveries, keyed by the API Gateway requestId.
+
+Before a message is processed its requestId is claimed with a conditional
+PutItem on the idempotency table. A claim fails when the request is
+already completed, or when another invocation still holds it. Completed
+requests are written back with their result and a TTL, and are also
+remembered in a small warm-container cache that answers repeated
+deliveries without a DynamoDB call. Requests whose processing failed are
+released so that the redelivery can try again.
+
+Without IDEMPOTENCY_TABLE_NAME every request is treated as new.
+"""
+import functools
+import json
+import logging
+import os
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+from botocore.exceptions import ClientError
+
+from aws_clients import get_client
+from metrics import add_metric
+from notifications import json_default
+
+logger = logging.getLogger()
+
+IDEMPOTENCY_TABLE_NAME = os.environ.get('IDEMPOTENCY_TABLE_NAME')
+
+# How long completed requests are remembered, and how long a claim blocks
+# other invocations before it is considered abandoned
+IDEMPOTENCY_TTL_SECONDS = int(os.environ.get('IDEMPOTENCY_TTL_SECONDS', '86400'))
+IDEMPOTENCY_LOCK_SECONDS = int(os.environ.get('IDEMPOTENCY_LOCK_SECONDS', '60'))
+
+IDEMPOTENCY_CACHE_MAX_ENTRIES = int(os.environ.get('IDEMPOTENCY_CACHE_MAX_ENTRIES', '4096'))
+IDEMPOTENCY_WORKERS = int(os.environ.get('IDEMPOTENCY_WORKERS', '8'))
+
+# Results larger than this are not stored, only the completion itself
+MAX_STORED_RESULT_BYTES = 300 * 1024
+
+# BatchWriteItem accepts at most 25 requests per call
+BATCH_WRITE_SIZE = 25
+
+NEW = 'new'
+COMPLETED = 'completed'
+IN_PROGRESS = 'in_progress'
+
+# Claims are conditional writes on the low-level client, which is thread safe
+claim_executor = ThreadPoolExecutor(max_workers=IDEMPOTENCY_WORKERS)
+
+
+class Claim:
+    """Outcome of claiming one requestId"""
+
+    def __init__(self, status, result=None):
+        self.status = status
+        self.result = result
+
+
+class CompletedCache:
+    """
+    Thread-safe LRU of completed requestIds -> (expires_at, result)
+    """
+
+    def __init__(self, max_entries):
+        self.max_entries = max_entries
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+
+    def get(self, request_id):
+        with self.lock:
+            entry = self.entries.get(request_id)
+            if entry is None:
+                return None
+            if entry[0] <= time.time():
+                del self.entries[request_id]
+                return None
+            self.entries.move_to_end(request_id)
+            return entry
+
+    def put(self, request_id, expires_at, result):
+        if self.max_entries <= 0:
+            return
+        with self.lock:
+            self.entries[request_id] = (expires_at, result)
+            self.entries.move_to_end(request_id)
+            while len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+
+
+completed_cache = CompletedCache(IDEMPOTENCY_CACHE_MAX_ENTRIES)
+
+
+def enabled():
+    return bool(IDEMPOTENCY_TABLE_NAME)
+
+
+def claim_one(request_id):
+    """
+    Claim a single requestId with a conditional PutItem
+    """
+    now = int(time.time())
+    try:
+        get_client('dynamodb').put_item(
+            TableName=IDEMPOTENCY_TABLE_NAME,
+            Item={
+                'requestId': {'S': request_id},
+                'status': {'S': IN_PROGRESS},
+                'locked_until': {'N': str(now + IDEMPOTENCY_LOCK_SECONDS)},
+                'expires_at': {'N': str(now + IDEMPOTENCY_TTL_SECONDS)}
+            },
+            # Expired records may still exist until TTL deletion catches up
+            ConditionExpression=(
+                'attribute_not_exists(#request_id) OR #expires_at < :now'
+                ' OR (#status = :in_progress AND #locked_until < :now)'
+            ),
+            ExpressionAttributeNames={
+                '#request_id': 'requestId',
+                '#status': 'status',
+                '#locked_until': 'locked_until',
+                '#expires_at': 'expires_at'
+            },
+            ExpressionAttributeValues={
+                ':now': {'N': str(now)},
+                ':in_progress': {'S': IN_PROGRESS}
+            },
+            ReturnValuesOnConditionCheckFailure='ALL_OLD'
+        )
+    except ClientError as e:
+        if e.response.get('Error', {}).get('Code') != 'ConditionalCheckFailedException':
+            raise
+        current = e.response.get('Item') or {}
+        if current.get('status', {}).get('S') != COMPLETED:
+            return Claim(IN_PROGRESS)
+        result = current.get('result', {}).get('S')
+        result = json.loads(result) if result else None
+        completed_cache.put(request_id, int(current['expires_at']['N']), result)
+        return Claim(COMPLETED, result)
+    return Claim(NEW)
+
+
+def claim(request_ids, policy=None):
+    """
+    Claim the requestIds of a batch, retrying retryable errors with the
+    handler's RetryPolicy when one is given.
+    Returns one Claim per entry of request_ids, in the same order. Entries
+    without a requestId are always new; a requestId that repeats within the
+    batch is reported as in progress after its first occurrence.
+    """
+    claim_request = claim_one if policy is None else functools.partial(policy.call, claim_one)
+    first = {}
+    to_claim = []
+    for request_id in request_ids:
+        if not request_id or request_id in first:
+            continue
+        if not enabled():
+            first[request_id] = Claim(NEW)
+            continue
+        cached = completed_cache.get(request_id)
+        if cached:
+            first[request_id] = Claim(COMPLETED, cached[1])
+        else:
+            first[request_id] = None
+            to_claim.append(request_id)
+
+    if len(to_claim) == 1:
+        first[to_claim[0]] = claim_request(to_claim[0])
+    elif to_claim:
+        futures = {request_id: claim_executor.submit(claim_request, request_id) for request_id in to_claim}
+        for request_id, future in futures.items():
+            first[request_id] = future.result()
+
+    claims = []
+    seen = set()
+    for request_id in request_ids:
+        if not request_id:
+            claims.append(Claim(NEW))
+        elif request_id in seen:
+            claims.append(Claim(IN_PROGRESS))
+        else:
+            seen.add(request_id)
+            claims.append(first[request_id])
+
+    duplicates = sum(1 for c in claims if c.status == COMPLETED)
+    if duplicates:
+        add_metric('DuplicateDeliveries', duplicates)
+    return claims
+
+
+def write_records(requests):
+    """
+    Send PutRequest/DeleteRequest entries with BatchWriteItem, retrying
+    unprocessed ones once. Failures are logged; an unfinished record only
+    delays a redelivery until its lock expires.
+    """
+    for i in range(0, len(requests), BATCH_WRITE_SIZE):
+        chunk = requests[i:i + BATCH_WRITE_SIZE]
+        for _ in range(2):
+            try:
+                response = get_client('dynamodb').batch_write_item(
+                    RequestItems={IDEMPOTENCY_TABLE_NAME: chunk}
+                )
+            except ClientError as e:
+                logger.error(f"Failed to write idempotency records: {str(e)}")
+                break
+            chunk = response.get('UnprocessedItems', {}).get(IDEMPOTENCY_TABLE_NAME, [])
+            if not chunk:
+                break
+        else:
+            logger.error(f"{len(chunk)} idempotency records could not be written")
+
+
+def complete(results):
+    """
+    Record the result of every completed request, {request_id: result}
+    """
+    if not results or not enabled():
+        return
+    expires_at = int(time.time()) + IDEMPOTENCY_TTL_SECONDS
+    requests = []
+    for request_id, result in results.items():
+        item = {
+            'requestId': {'S': request_id},
+            'status': {'S': COMPLETED},
+            'expires_at': {'N': str(expires_at)}
+        }
+        encoded = json.dumps(result, default=json_default)
+        if len(encoded) <= MAX_STORED_RESULT_BYTES:
+            item['result'] = {'S': encoded}
+        else:
+            result = None
+        requests.append({'PutRequest': {'Item': item}})
+        completed_cache.put(request_id, expires_at, result)
+    write_records(requests)
+
+
+def release(request_ids):
+    """
+    Drop the claims of requests that failed so a redelivery can retry them
+    """
+    request_ids = [request_id for request_id in request_ids if request_id]
+    if not request_ids or not enabled():
+        return
+    write_records([
+        {'DeleteRequest': {'Key': {'requestId': {'S': request_id}}}}
+        for request_id in dict.fromkeys(request_ids)
+    ])
@@ -0,0 +1,57 @@
+"""
+Stamping of new items, shared by the create handler and tools/bulk_items.py.
+
+Items without an id get one derived from a stable name such as the
+requestId, so writing the same request twice produces the same item;
+without a name the id is random. created_at and updated_at are set to the
+current UTC time.
+
+Attributes that key a secondary index (LIST_INDEXES) are declared as
+strings, so DynamoDB rejects a write that stores anything else under them.
+index_key_error finds such values before the write is attempted.
+"""
+import json
+import os
+import uuid
+from datetime import datetime
+
+# Item IDs derived from a requestId are stable across redeliveries
+ITEM_ID_NAMESPACE = uuid.UUID('6f1f3c2e-8d4b-5a7e-9c0d-2b6e4f8a1d35')
+
+INDEX_KEY_ATTRIBUTES = sorted({
+    key
+    for index in json.loads(os.environ.get('LIST_INDEXES') or '[]')
+    for key in (index.get('hash_key'), index.get('range_key'))
+    if key
+})
+
+
+def stamp_new_item(item, id_name=None, now=None):
+    """
+    Add the id and timestamps of a new item in place and return it
+    """
+    if 'id' not in item:
+        if id_name:
+            item['id'] = str(uuid.uuid5(ITEM_ID_NAMESPACE, id_name))
+        else:
+            item['id'] = str(uuid.uuid4())
+
+    now = now or datetime.utcnow().isoformat()
+    item['created_at'] = now
+    item['updated_at'] = now
+    return item
+
+
+def index_key_error(attributes, keys=None):
+    """
+    Describe the index key attributes whose values DynamoDB would reject.
+    keys defaults to the attributes of LIST_INDEXES.
+    Returns None when all of them are non-empty strings.
+    """
+    invalid = [
+        key for key in (INDEX_KEY_ATTRIBUTES if keys is None else keys)
+        if key in attributes and not (isinstance(attributes[key], str) and attributes[key])
+    ]
+    if invalid:
+        return f"Secondary index key attributes must be non-empty strings: {', '.join(invalid)}"
+    return None
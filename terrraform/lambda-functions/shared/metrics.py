@@ -0,0 +1,201 @@
+"""
+Per-invocation hot-path metrics in CloudWatch Embedded Metric Format (EMF).
+
+Stages are timed and counted in memory while an invocation runs and written
+as one aggregated EMF record when the handler returns, so the cost does not
+grow with the number of records in a batch. AWS calls made through
+aws_clients are timed automatically from botocore events: DynamoDB calls,
+SQS sends (the notification enqueue stage) and API Gateway Management API
+posts (the WebSocket post stage). Retries and throttled attempts are counted
+from the same events.
+
+The namespace and service dimension come from POWERTOOLS_METRICS_NAMESPACE
+and POWERTOOLS_SERVICE_NAME; METRICS_ENABLED=false turns everything off.
+"""
+import functools
+import json
+import os
+import sys
+import threading
+import time
+from contextlib import contextmanager
+
+METRICS_ENABLED = os.environ.get('METRICS_ENABLED', 'true').lower() == 'true'
+METRICS_NAMESPACE = os.environ.get('POWERTOOLS_METRICS_NAMESPACE', 'ServerlessCRUD')
+METRICS_SERVICE = os.environ.get('POWERTOOLS_SERVICE_NAME') or os.environ.get('AWS_LAMBDA_FUNCTION_NAME', 'unknown')
+
+# Stage names for AWS calls, keyed by botocore service name
+SERVICE_STAGES = {
+    'dynamodb': 'DynamoDB',
+    'sqs': 'Enqueue',
+    'apigatewaymanagementapi': 'WebSocketPost'
+}
+
+THROTTLING_ERROR_CODES = {
+    'ProvisionedThroughputExceededException',
+    'ThrottlingException',
+    'Throttling',
+    'RequestLimitExceeded',
+    'TooManyRequestsException',
+    'LimitExceededException',
+    'RequestThrottled',
+    'RequestThrottledException'
+}
+
+
+class Metrics:
+    """
+    Thread-safe accumulator for one invocation.
+    Timings are kept as {stage: [calls, total_ms]}, counters as {name: value}.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.timings = {}
+        self.counters = {}
+        self.cold_start = True
+
+    def reset(self):
+        with self.lock:
+            self.timings = {}
+            self.counters = {}
+
+    def record(self, stage, elapsed_ms):
+        with self.lock:
+            timing = self.timings.get(stage)
+            if timing is None:
+                self.timings[stage] = [1, elapsed_ms]
+            else:
+                timing[0] += 1
+                timing[1] += elapsed_ms
+
+    def add(self, name, value=1):
+        with self.lock:
+            self.counters[name] = self.counters.get(name, 0) + value
+
+    @contextmanager
+    def timer(self, stage):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.record(stage, (time.perf_counter() - start) * 1000)
+
+    def build_record(self, duration_ms, function_name=None):
+        """
+        Return the EMF document for everything recorded since the last reset
+        """
+        with self.lock:
+            timings = dict(self.timings)
+            counters = dict(self.counters)
+
+        definitions = [{'Name': 'Duration', 'Unit': 'Milliseconds'}]
+        record = {'Service': METRICS_SERVICE, 'Duration': round(duration_ms, 3)}
+        for stage, (calls, total_ms) in sorted(timings.items()):
+            definitions.append({'Name': f'{stage}Time', 'Unit': 'Milliseconds'})
+            definitions.append({'Name': f'{stage}Calls', 'Unit': 'Count'})
+            record[f'{stage}Time'] = round(total_ms, 3)
+            record[f'{stage}Calls'] = calls
+        for name, value in sorted(counters.items()):
+            definitions.append({'Name': name, 'Unit': 'Count'})
+            record[name] = value
+        if function_name:
+            record['FunctionName'] = function_name
+
+        record['_aws'] = {
+            'Timestamp': int(time.time() * 1000),
+            'CloudWatchMetrics': [{
+                'Namespace': METRICS_NAMESPACE,
+                'Dimensions': [['Service']],
+                'Metrics': definitions
+            }]
+        }
+        return record
+
+    def flush(self, duration_ms, function_name=None):
+        """
+        Write one EMF record to stdout and start over
+        """
+        record = self.build_record(duration_ms, function_name)
+        self.reset()
+        sys.stdout.write(json.dumps(record) + '\n')
+        sys.stdout.flush()
+
+
+metrics = Metrics()
+
+
+@contextmanager
+def timer(stage):
+    """
+    Time a block of code as one call of a stage
+    """
+    if not METRICS_ENABLED:
+        yield
+        return
+    with metrics.timer(stage):
+        yield
+
+
+def add_metric(name, value=1):
+    if METRICS_ENABLED:
+        metrics.add(name, value)
+
+
+def log_metrics(handler):
+    """
+    Decorator for lambda_handler that flushes one EMF record per invocation
+    """
+    if not METRICS_ENABLED:
+        return handler
+
+    @functools.wraps(handler)
+    def wrapper(event, context):
+        metrics.reset()
+        if metrics.cold_start:
+            metrics.cold_start = False
+            metrics.add('ColdStart')
+        if isinstance(event, dict) and 'Records' in event:
+            metrics.add('Records', len(event['Records']))
+        start = time.perf_counter()
+        try:
+            return handler(event, context)
+        finally:
+            metrics.flush((time.perf_counter() - start) * 1000, getattr(context, 'function_name', None))
+
+    return wrapper
+
+
+def _before_call(model, context, **kwargs):
+    context['metrics_start'] = time.perf_counter()
+
+
+def _after_call(parsed, model, context, **kwargs):
+    start = context.get('metrics_start')
+    stage = SERVICE_STAGES.get(model.service_model.service_name, 'AWS')
+    if start is not None:
+        metrics.record(stage, (time.perf_counter() - start) * 1000)
+    retries = (parsed or {}).get('ResponseMetadata', {}).get('RetryAttempts', 0)
+    if retries:
+        metrics.add('Retries', retries)
+    if (parsed or {}).get('Error', {}).get('Code'):
+        metrics.add(f'{stage}Errors')
+
+
+def _needs_retry(response=None, **kwargs):
+    # Called once per attempt; returning None leaves the retry decision to botocore
+    if response is not None:
+        error_code = (response[1] or {}).get('Error', {}).get('Code')
+        if error_code in THROTTLING_ERROR_CODES:
+            metrics.add('Throttles')
+
+
+def instrument_client(client):
+    """
+    Register the timing and retry hooks on a botocore client
+    """
+    if METRICS_ENABLED:
+        client.meta.events.register('before-call', _before_call)
+        client.meta.events.register('after-call', _after_call)
+        client.meta.events.register('needs-retry', _needs_retry)
+    return client
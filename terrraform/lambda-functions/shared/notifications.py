@@ -0,0 +1,251 @@
+"""
+Buffered publisher for operation completion notifications.
+
+Handlers add one notification per processed request while they work and
+flush once at the end of the invocation. The buffered messages are packed
+into SendMessageBatch calls of at most 10 entries and 256 KB, the batches
+are sent in parallel, and entries that fail are retried one by one with
+SendMessage. Results larger than NOTIFICATION_MAX_RESULT_BYTES are cut
+down to their key attributes before they are queued; list pages keep
+their count and cursor. Bulk results with a per-id results list are
+split into several notifications instead, each carrying the summary
+fields, a slice of results and its page and pages numbers.
+"""
+import json
+import logging
+import os
+from concurrent.futures import ThreadPoolExecutor
+from decimal import Decimal
+
+from botocore.exceptions import BotoCoreError, ClientError
+
+from aws_clients import get_client
+from retry import RetryPolicy, is_retryable
+
+logger = logging.getLogger()
+
+# SendMessageBatch limits
+NOTIFICATION_BATCH_SIZE = 10
+NOTIFICATION_BATCH_MAX_BYTES = 256 * 1024
+
+# Number of batches sent in parallel
+NOTIFICATION_PUBLISH_WORKERS = int(os.environ.get('NOTIFICATION_PUBLISH_WORKERS', '4'))
+
+# Larger results are replaced by their key attributes
+NOTIFICATION_MAX_RESULT_BYTES = int(os.environ.get('NOTIFICATION_MAX_RESULT_BYTES', str(64 * 1024)))
+
+# Attributes kept by keys-only notifications
+KEY_ATTRIBUTES = ('id', 'updated_at')
+
+# Kept at module scope so warm invocations reuse its threads
+publish_executor = ThreadPoolExecutor(max_workers=NOTIFICATION_PUBLISH_WORKERS)
+
+
+def json_default(value):
+    """
+    JSON encoder fallback for the Decimal values returned by DynamoDB
+    """
+    if isinstance(value, Decimal):
+        return int(value) if value == value.to_integral_value() else float(value)
+    if isinstance(value, set):
+        return sorted(value, key=str)
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+
+def keys_only(result):
+    """
+    Reduce a result to the attributes that identify the item.
+    List and batch get results keep count, cursor and their other fields,
+    and every entry is reduced to its keys, so the client can still fetch
+    the items and continue paging. Bulk results keep their summary fields
+    and the per-id outcomes, which hold nothing but keys and a status.
+    """
+    if not isinstance(result, dict):
+        return None
+    if isinstance(result.get('results'), list):
+        return {key: value for key, value in result.items() if not isinstance(value, dict)}
+    if isinstance(result.get('items'), list):
+        reduced = dict(result)
+        reduced['items'] = [
+            # Batch get entries wrap the item with its id and found flag
+            {key: value for key, value in entry.items() if key != 'item'}
+            if isinstance(entry, dict) and 'found' in entry else keys_only(entry)
+            for entry in result['items']
+        ]
+        return reduced
+    return {key: result[key] for key in KEY_ATTRIBUTES if key in result}
+
+
+class NotificationPublisher:
+    """
+    Collects notifications during one invocation and sends them in batches
+    """
+
+    def __init__(self, queue_url=None, context=None):
+        self.queue_url = queue_url or os.environ.get('NOTIFICATION_QUEUE_URL')
+        # Notifications are flushed last, so they may use the time the
+        # handlers keep in reserve
+        self.policy = RetryPolicy(context, reserve_ms=0)
+        # (request_id, message body)
+        self.pending = []
+
+    def add(self, request_id, operation, result, status='success', changed=None):
+        """
+        Buffer the notification for one request.
+        changed lists the attributes an update modified, for delta subscribers.
+        """
+        if not request_id:
+            return
+        message = {
+            'requestId': request_id,
+            'operation': operation,
+            'status': status,
+            'result': result
+        }
+        if changed is not None:
+            message['changed'] = list(changed)
+        body = json.dumps(message, default=json_default)
+        if len(body.encode('utf-8')) > NOTIFICATION_MAX_RESULT_BYTES:
+            if isinstance(result, dict) and isinstance(result.get('results'), list):
+                logger.info(f"Result for requestId {request_id} is too large, sending it in pages")
+                self.pending.extend((request_id, page) for page in self.result_pages(message))
+                return
+            logger.info(f"Result for requestId {request_id} is too large, sending its keys only")
+            message.update(result=keys_only(result), truncated=True)
+            body = json.dumps(message, default=json_default)
+        self.pending.append((request_id, body))
+
+    def result_pages(self, message):
+        """
+        Split a bulk result into message bodies of at most
+        NOTIFICATION_MAX_RESULT_BYTES. Every page keeps the summary fields
+        of the result and carries a slice of its results list.
+        """
+        result = message['result']
+        # Page numbers are sized for the largest possible count
+        base = dict(message, result=dict(result, results=[]), page=len(result['results']),
+                    pages=len(result['results']))
+        base_size = len(json.dumps(base, default=json_default).encode('utf-8'))
+        slices = []
+        current = []
+        size = base_size
+        for entry in result['results']:
+            entry_size = len(json.dumps(entry, default=json_default).encode('utf-8')) + 2
+            if current and size + entry_size > NOTIFICATION_MAX_RESULT_BYTES:
+                slices.append(current)
+                current = []
+                size = base_size
+            current.append(entry)
+            size += entry_size
+        slices.append(current)
+        return [
+            json.dumps(dict(message, result=dict(result, results=entries), page=page, pages=len(slices)),
+                       default=json_default)
+            for page, entries in enumerate(slices, 1)
+        ]
+
+    def batches(self, messages):
+        """
+        Split messages into SendMessageBatch sized groups.
+        Returns (batches, too_large) where too_large cannot be sent at all.
+        """
+        batches = []
+        too_large = []
+        current = []
+        current_bytes = 0
+        for request_id, body in messages:
+            size = len(body.encode('utf-8'))
+            if size > NOTIFICATION_BATCH_MAX_BYTES:
+                too_large.append(request_id)
+                continue
+            if current and (len(current) >= NOTIFICATION_BATCH_SIZE or current_bytes + size > NOTIFICATION_BATCH_MAX_BYTES):
+                batches.append(current)
+                current = []
+                current_bytes = 0
+            current.append((request_id, body))
+            current_bytes += size
+        if current:
+            batches.append(current)
+        return batches, too_large
+
+    def send_individually(self, messages):
+        """
+        Retry messages one by one with the policy's backoff.
+        Returns the request IDs that could not be sent.
+        """
+        failed = []
+        for request_id, body in messages:
+            backoff = self.policy.backoff()
+            while True:
+                try:
+                    get_client('sqs').send_message(QueueUrl=self.queue_url, MessageBody=body)
+                    break
+                except (ClientError, BotoCoreError) as e:
+                    logger.warning(f"Notification for requestId {request_id} failed (attempt {backoff.attempt}): {str(e)}")
+                    if not is_retryable(e) or not backoff.wait():
+                        failed.append(request_id)
+                        break
+        return failed
+
+    def send_batch(self, batch):
+        """
+        Send one batch and retry its failed entries individually.
+        Returns the request IDs that could not be sent.
+        """
+        try:
+            response = get_client('sqs').send_message_batch(
+                QueueUrl=self.queue_url,
+                Entries=[
+                    {'Id': str(index), 'MessageBody': body}
+                    for index, (_, body) in enumerate(batch)
+                ]
+            )
+        except (ClientError, BotoCoreError) as e:
+            logger.warning(f"Notification batch failed, retrying entries individually: {str(e)}")
+            return self.send_individually(batch)
+
+        failed_entries = response.get('Failed', [])
+        if not failed_entries:
+            return []
+        logger.warning(f"{len(failed_entries)} notifications rejected in batch, retrying individually")
+        return self.send_individually([batch[int(entry['Id'])] for entry in failed_entries])
+
+    def try_send_batch(self, batch):
+        """
+        send_batch that reports unexpected errors as failed entries instead
+        of raising them
+        """
+        try:
+            return self.send_batch(batch)
+        except Exception as e:
+            logger.error(f"Notification batch failed: {str(e)}")
+            return [request_id for request_id, _ in batch]
+
+    def flush(self):
+        """
+        Send every buffered notification. Failures are logged and never
+        raised, since the operations they report on have already happened.
+        Returns the request IDs whose notification could not be sent.
+        """
+        messages, self.pending = self.pending, []
+        if not messages:
+            return []
+        if not self.queue_url:
+            logger.warning("NOTIFICATION_QUEUE_URL not set, skipping notifications")
+            return []
+
+        batches, failed = self.batches(messages)
+        for request_id in failed:
+            logger.error(f"Notification for requestId {request_id} exceeds the SQS message size limit")
+
+        if len(batches) == 1:
+            failed.extend(self.try_send_batch(batches[0]))
+        else:
+            futures = [publish_executor.submit(self.try_send_batch, batch) for batch in batches]
+            for future in futures:
+                failed.extend(future.result())
+
+        if failed:
+            logger.error(f"Failed to send notifications for {len(failed)} requests")
+        logger.info(f"Sent {len(messages) - len(failed)} notifications in {len(batches)} batches")
+        return failed
@@ -0,0 +1,126 @@
+"""
+Retry and backpressure policy shared by the CRUD consumers.
+
+botocore already retries every call a few times. When DynamoDB keeps
+throttling beyond that, the consumers retry the operation in-process with
+decorrelated jitter (each delay is drawn between the base delay and three
+times the previous one) for as long as the invocation's remaining time
+allows. Only retryable errors are retried: throttling, 5xx responses and
+connection failures. What still fails when the budget runs out is reported
+as batchItemFailures, so SQS redelivers it instead of deleting it, and a
+load spike turns into slower processing rather than lost operations.
+"""
+import logging
+import os
+import random
+import time
+
+from botocore.exceptions import ClientError, ConnectionError, HTTPClientError
+
+from metrics import THROTTLING_ERROR_CODES, add_metric, timer
+
+logger = logging.getLogger()
+
+RETRY_MAX_ATTEMPTS = int(os.environ.get('RETRY_MAX_ATTEMPTS', '8'))
+RETRY_BASE_DELAY = float(os.environ.get('RETRY_BASE_DELAY', '0.05'))
+RETRY_MAX_DELAY = float(os.environ.get('RETRY_MAX_DELAY', '2.0'))
+
+# Time kept back from retries for flushing notifications and idempotency
+# records before the invocation times out
+RETRY_RESERVE_MS = int(os.environ.get('RETRY_RESERVE_MS', '2000'))
+
+RETRYABLE_ERROR_CODES = THROTTLING_ERROR_CODES | {
+    'InternalServerError',
+    'InternalFailure',
+    'ServiceUnavailable',
+    'TransactionInProgressException',
+    'RequestTimeout',
+    'RequestTimeoutException'
+}
+
+
+def is_retryable(error):
+    """
+    Tell transient errors that may succeed on a later attempt from permanent ones
+    """
+    # Timeouts and connection failures, including EndpointConnectionError
+    if isinstance(error, (HTTPClientError, ConnectionError)):
+        return True
+    if not isinstance(error, ClientError):
+        return False
+    if error.response.get('Error', {}).get('Code') in RETRYABLE_ERROR_CODES:
+        return True
+    return error.response.get('ResponseMetadata', {}).get('HTTPStatusCode', 0) >= 500
+
+
+class Backoff:
+    """
+    Decorrelated jitter delays of one operation
+    """
+
+    def __init__(self, policy):
+        self.policy = policy
+        self.attempt = 1
+        self.delay = policy.base_delay
+
+    def wait(self):
+        """
+        Sleep before the next attempt.
+        Returns False when the attempts or the time budget are used up.
+        """
+        if self.attempt >= self.policy.max_attempts:
+            return False
+        delay = min(self.policy.max_delay, random.uniform(self.policy.base_delay, self.delay * 3))
+        if delay > self.policy.remaining():
+            return False
+        self.attempt += 1
+        self.delay = delay
+        with timer('Backoff'):
+            time.sleep(delay)
+        return True
+
+
+class RetryPolicy:
+    """
+    Retry budget of one invocation, bounded by the Lambda context's remaining time
+    """
+
+    def __init__(self, context=None, max_attempts=RETRY_MAX_ATTEMPTS, base_delay=RETRY_BASE_DELAY,
+                 max_delay=RETRY_MAX_DELAY, reserve_ms=RETRY_RESERVE_MS):
+        self.max_attempts = max_attempts
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.deadline = None
+        if context is not None and hasattr(context, 'get_remaining_time_in_millis'):
+            self.deadline = time.monotonic() + (context.get_remaining_time_in_millis() - reserve_ms) / 1000
+
+    def remaining(self):
+        """
+        Seconds left for retries, infinite without a context
+        """
+        if self.deadline is None:
+            return float('inf')
+        return max(0.0, self.deadline - time.monotonic())
+
+    def expired(self):
+        return self.remaining() <= 0
+
+    def backoff(self):
+        return Backoff(self)
+
+    def call(self, function, *args, **kwargs):
+        """
+        Call function, retrying retryable errors while the budget allows.
+        The last error is raised when it is permanent or the budget is used up.
+        """
+        backoff = self.backoff()
+        while True:
+            try:
+                return function(*args, **kwargs)
+            except Exception as e:
+                if not is_retryable(e):
+                    raise
+                if not backoff.wait():
+                    add_metric('RetriesExhausted')
+                    raise
+                logger.warning(f"Retrying after {type(e).__name__} (attempt {backoff.attempt}): {str(e)}")
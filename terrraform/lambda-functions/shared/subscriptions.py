@@ -0,0 +1,154 @@
+"""
+Rows of the WebSocket connections table.
+
+Every row is one subscription keyed by (connectionId, requestId), so a
+single connection can follow many requests while the requestId-index
+still finds all connections of a request. Rows are written and deleted
+with BatchWriteItem in parallel chunks, and carry an expires_at TTL
+attribute so subscriptions of connections that never disconnect cleanly
+expire on their own. A row may also carry the payload mode its
+notifications are sent in.
+"""
+import logging
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from botocore.exceptions import ClientError
+
+from aws_clients import get_client
+from retry import RetryPolicy, is_retryable
+
+logger = logging.getLogger()
+
+# API Gateway closes WebSocket connections after two hours at most
+CONNECTION_TTL_SECONDS = int(os.environ.get('CONNECTION_TTL_SECONDS', '7200'))
+
+# Notification payload modes a subscription can ask for
+FULL = 'full'
+KEYS_ONLY = 'keys-only'
+DELTA = 'delta'
+COMPRESSED = 'compressed'
+PAYLOAD_MODES = (FULL, KEYS_ONLY, DELTA, COMPRESSED)
+
+# BatchWriteItem accepts at most 25 requests per call
+BATCH_WRITE_SIZE = 25
+
+# Number of chunks written in parallel
+SUBSCRIPTION_WRITE_WORKERS = int(os.environ.get('SUBSCRIPTION_WRITE_WORKERS', '8'))
+
+# Kept at module scope so warm invocations reuse its threads
+write_executor = ThreadPoolExecutor(max_workers=SUBSCRIPTION_WRITE_WORKERS)
+
+
+def table_name():
+    return os.environ.get('CONNECTIONS_TABLE_NAME')
+
+
+def subscription_item(connection_id, request_id, mode=None, now=None):
+    """
+    Build the AttributeValue map of one subscription row
+    """
+    now = int(now if now is not None else time.time())
+    item = {
+        'connectionId': {'S': connection_id},
+        'requestId': {'S': request_id},
+        'timestamp': {'N': str(now)},
+        'expires_at': {'N': str(now + CONNECTION_TTL_SECONDS)}
+    }
+    if mode and mode != FULL:
+        item['mode'] = {'S': mode}
+    return item
+
+
+def subscription_key(connection_id, request_id):
+    return {'connectionId': {'S': connection_id}, 'requestId': {'S': request_id}}
+
+
+def write_chunk(requests, policy):
+    """
+    Send up to 25 write requests, retrying UnprocessedItems and retryable
+    errors with the policy's backoff.
+    Returns the requestIds whose rows could not be written.
+    """
+    pending = requests
+    backoff = policy.backoff()
+    while True:
+        try:
+            response = get_client('dynamodb').batch_write_item(
+                RequestItems={table_name(): pending}
+            )
+        except ClientError as e:
+            logger.error(f"Failed to write subscriptions: {str(e)}")
+            if not is_retryable(e) or not backoff.wait():
+                break
+            continue
+        pending = response.get('UnprocessedItems', {}).get(table_name(), [])
+        if not pending:
+            return []
+        logger.warning(f"{len(pending)} unprocessed subscription writes, retrying (attempt {backoff.attempt})")
+        if not backoff.wait():
+            break
+
+    failed = []
+    for request in pending:
+        row = request.get('PutRequest', {}).get('Item') or request['DeleteRequest']['Key']
+        failed.append(row['requestId']['S'])
+    return failed
+
+
+def write_requests(requests, policy=None):
+    """
+    Send write requests in parallel BatchWriteItem chunks.
+    Returns the requestIds whose rows could not be written.
+    """
+    policy = policy or RetryPolicy()
+    chunks = [requests[i:i + BATCH_WRITE_SIZE] for i in range(0, len(requests), BATCH_WRITE_SIZE)]
+    if len(chunks) <= 1:
+        return write_chunk(chunks[0], policy) if chunks else []
+    failed = []
+    for future in [write_executor.submit(write_chunk, chunk, policy) for chunk in chunks]:
+        failed.extend(future.result())
+    return failed
+
+
+def subscribe(connection_id, request_ids, mode=None, policy=None):
+    """
+    Store one row per requestId for a connection.
+    Returns the requestIds that could not be stored.
+    """
+    now = int(time.time())
+    return write_requests([
+        {'PutRequest': {'Item': subscription_item(connection_id, request_id, mode, now)}}
+        for request_id in request_ids
+    ], policy)
+
+
+def unsubscribe(rows, policy=None):
+    """
+    Delete (connection_id, request_id) rows.
+    Returns the requestIds whose rows could not be deleted.
+    """
+    return write_requests([
+        {'DeleteRequest': {'Key': subscription_key(connection_id, request_id)}}
+        for connection_id, request_id in rows
+    ], policy)
+
+
+def connection_request_ids(connection_id):
+    """
+    Return every requestId a connection is subscribed to, following pagination
+    """
+    request_ids = []
+    query_kwargs = {
+        'TableName': table_name(),
+        'KeyConditionExpression': 'connectionId = :connection_id',
+        'ExpressionAttributeValues': {':connection_id': {'S': connection_id}},
+        'ProjectionExpression': 'requestId'
+    }
+    while True:
+        response = get_client('dynamodb').query(**query_kwargs)
+        request_ids.extend(item['requestId']['S'] for item in response.get('Items', []))
+        if 'LastEvaluatedKey' not in response:
+            return request_ids
+        query_kwargs['ExclusiveStartKey'] = response['LastEvaluatedKey']
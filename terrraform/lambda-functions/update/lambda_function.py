@@ -1,11 +1,312 @@
 import json
-import boto3
 import os
+import logging
+from collections import deque
 from datetime import datetime
+from decimal import Decimal
 from botocore.exceptions import ClientError
+from aws_clients import get_client, preload
+from dynamodb_codec import deserialize_item, serialize_values
+from items import index_key_error
+from metrics import add_metric, log_metrics, timer
+from notifications import NotificationPublisher, json_default
+from retry import RetryPolicy, is_retryable
+import idempotency
 
-dynamodb = boto3.resource('dynamodb')
+# Configure logging
+log_level = os.environ.get('LOG_LEVEL', 'INFO')
+logger = logging.getLogger()
+logger.setLevel(getattr(logging, log_level))
 
+# Build AWS clients during init only when COLD_START_MODE=eager
+preload(clients=['dynamodb', 'sqs'])
+
+# Attributes that cannot be changed through an update
+PROTECTED_ATTRIBUTES = ('id', 'version', 'created_at')
+
+HEADERS = {
+    'Content-Type': 'application/json',
+    'Access-Control-Allow-Origin': '*'
+}
+
+
+class InvalidRequest(Exception):
+    """Raised when request parameters cannot be used"""
+
+
+def parse_expected_version(value):
+    """
+    Parse an If-Match style expected version, e.g. 3 or "3" or '"3"'
+    """
+    if value is None or value == '':
+        return None
+    try:
+        return int(str(value).strip().strip('"'))
+    except ValueError:
+        raise InvalidRequest('Expected version must be an integer')
+
+
+def build_update(update_data, expected_version, increment=1):
+    """
+    Build a single conditional UpdateItem request.
+    The item must exist, the version counter is incremented atomically and,
+    when an expected version is given, it must match the stored one.
+    increment is the number of logical updates the request stands for.
+    """
+    set_clauses = []
+    expression_attribute_names = {'#id': 'id', '#version': 'version'}
+    expression_attribute_values = {':zero': 0, ':increment': increment}
+
+    for index, (key, value) in enumerate(update_data.items()):
+        if key in PROTECTED_ATTRIBUTES:  # Don't update the primary key or version
+            continue
+        attr_name = f"#f{index}"
+        attr_value = f":f{index}"
+        set_clauses.append(f"{attr_name} = {attr_value}")
+        expression_attribute_names[attr_name] = key
+        expression_attribute_values[attr_value] = value
+
+    set_clauses.append("#version = if_not_exists(#version, :zero) + :increment")
+
+    condition_expression = "attribute_exists(#id)"
+    if expected_version is not None:
+        if expected_version == 0:
+            # Items written before versioning have no version attribute
+            condition_expression += " AND attribute_not_exists(#version)"
+        else:
+            condition_expression += " AND #version = :expected_version"
+            expression_attribute_values[':expected_version'] = expected_version
+
+    return {
+        'UpdateExpression': "SET " + ", ".join(set_clauses),
+        'ConditionExpression': condition_expression,
+        'ExpressionAttributeNames': expression_attribute_names,
+        'ExpressionAttributeValues': expression_attribute_values
+    }
+
+
+def update_item(table_name, item_id, update_data, expected_version=None, increment=1):
+    """
+    Update an item with one conditional UpdateItem call.
+    Returns (status_code, body).
+    """
+    if not isinstance(update_data, dict):
+        return 400, {'error': 'Request body must be a JSON object'}
+
+    error = index_key_error(update_data)
+    if error:
+        return 400, {'error': error}
+
+    # Add updated_at timestamp
+    update_data = dict(update_data, updated_at=datetime.utcnow().isoformat())
+
+    request = build_update(update_data, expected_version, increment)
+    try:
+        request['ExpressionAttributeValues'] = serialize_values(request['ExpressionAttributeValues'])
+    except (TypeError, ValueError) as e:
+        return 400, {'error': str(e)}
+
+    try:
+        response = get_client('dynamodb').update_item(
+            TableName=table_name,
+            Key={'id': {'S': item_id}},
+            ReturnValues='ALL_NEW',
+            ReturnValuesOnConditionCheckFailure='ALL_OLD',
+            **request
+        )
+    except ClientError as e:
+        if e.response.get('Error', {}).get('Code') != 'ConditionalCheckFailedException':
+            raise
+        current = e.response.get('Item')
+        if not current:
+            return 404, {'error': 'Item not found'}
+        current_version = int(current.get('version', {}).get('N', 0))
+        return 409, {
+            'error': 'Version conflict',
+            'expectedVersion': expected_version,
+            'currentVersion': current_version
+        }
+
+    return 200, deserialize_item(response['Attributes'])
+
+
+def coalesce_updates(updates):
+    """
+    Group update requests per item id, keeping queue order.
+    A request that carries an expected version starts a new group, because
+    its condition refers to the item as it was before that request.
+    Returns a list of groups, each a list of requests for one id.
+    """
+    groups = []
+    open_groups = {}
+    for update in updates:
+        group = open_groups.get(update['id'])
+        if group is None or update['expected_version'] is not None:
+            group = []
+            groups.append(group)
+            open_groups[update['id']] = group
+        group.append(update)
+    return groups
+
+
+def merge_payloads(group):
+    """
+    Merge the payloads of a group in order, the last write of an attribute wins
+    """
+    merged = {}
+    for update in group:
+        merged.update(update['payload'])
+    return merged
+
+
+def apply_group(table_name, group):
+    """
+    Apply a group of updates for one id with a single UpdateItem call.
+    Returns [(update, (status_code, body))] with a result for every request.
+    """
+    head = group[0]
+    status_code, body = update_item(table_name, head['id'], merge_payloads(group),
+                                    head['expected_version'], len(group))
+    if status_code != 409 or len(group) == 1:
+        return [(update, (status_code, body)) for update in group]
+
+    # Only the head carries the failed condition; the rest of the group
+    # would have succeeded on its own
+    return [(head, (status_code, body))] + apply_group(table_name, group[1:])
+
+
+def handle_sqs_event(event, table_name, context=None):
+    """
+    Process update messages delivered by the CRUD queue.
+    Updates of the same id within the batch are coalesced into one UpdateItem
+    call and every original request still gets its own notification.
+    Messages that hit retryable errors until the time budget ran out are
+    returned as batchItemFailures.
+    """
+    publisher = NotificationPublisher(context=context)
+    policy = RetryPolicy(context)
+    batch_item_failures = []
+    updates = []
+    for record in event.get('Records', []):
+        try:
+            with timer('Parse'):
+                message_data = json.loads(record.get('body') or '{}', parse_float=Decimal)
+            operation = message_data.get('operation')
+            if operation != 'update':
+                logger.warning(f"Unexpected operation type: {operation}. Expected 'update'.")
+                continue
+
+            item_id = message_data.get('id')
+            if not item_id:
+                logger.error("No item ID in message")
+                continue
+
+            payload = message_data.get('payload') or {}
+            if not isinstance(payload, dict):
+                publisher.add(message_data.get('requestId'), 'update',
+                              {'error': 'Request body must be a JSON object'}, 'error')
+                continue
+            # Checked before coalescing, so a bad payload is not merged
+            # into the writes of other requests
+            error = index_key_error(payload)
+            if error:
+                publisher.add(message_data.get('requestId'), 'update', {'error': error}, 'error')
+                continue
+
+            updates.append({
+                'message_id': record.get('messageId'),
+                'request_id': message_data.get('requestId'),
+                'id': item_id,
+                'expected_version': parse_expected_version(message_data.get('expectedVersion')),
+                'payload': payload
+            })
+
+        except json.JSONDecodeError as e:
+            logger.error(f"Failed to parse message body: {str(e)}")
+        except InvalidRequest as e:
+            logger.error(f"Invalid update request: {str(e)}")
+            publisher.add(message_data.get('requestId'), 'update', {'error': str(e)}, 'error')
+        except Exception as e:
+            logger.error(f"Error processing record: {str(e)}")
+
+    # Redeliveries of completed requests are not applied again; without
+    # this a version increment would be repeated. Requests another
+    # invocation still holds go back to the queue.
+    claims = idempotency.claim([update['request_id'] for update in updates], policy)
+    new_updates = []
+    for update, claim in zip(updates, claims):
+        if claim.status == idempotency.NEW:
+            new_updates.append(update)
+        elif claim.status == idempotency.IN_PROGRESS:
+            logger.info(f"Update request {update['request_id']} is already in progress")
+            batch_item_failures.append({'itemIdentifier': update['message_id']})
+        else:
+            logger.info(f"Skipping redelivered update request {update['request_id']} ({claim.status})")
+    updates = new_updates
+
+    groups = coalesce_updates(updates)
+    if len(groups) < len(updates):
+        add_metric('CoalescedUpdates', len(updates) - len(groups))
+        logger.info(f"Coalesced {len(updates)} updates into {len(groups)} writes")
+
+    completed = {}
+    released = []
+    pending = deque(groups)
+    while pending:
+        group = pending.popleft()
+        item_id = group[0]['id']
+        try:
+            if policy.expired():
+                raise TimeoutError('No time left in this invocation')
+            results = policy.call(apply_group, table_name, group)
+        except ClientError as e:
+            logger.error(f"DynamoDB error updating item {item_id}: {str(e)}")
+            if is_retryable(e):
+                released.extend(update['request_id'] for update in group)
+                batch_item_failures.extend({'itemIdentifier': update['message_id']} for update in group)
+            elif len(group) > 1:
+                # One bad payload must not fail the requests merged with it,
+                # so the group is replayed one request at a time
+                logger.warning(f"Replaying {len(group)} merged updates of item {item_id} one at a time")
+                pending.extendleft([update] for update in reversed(group))
+            else:
+                # Permanent errors would fail again on every redelivery, so
+                # the request is answered with an error instead
+                update = group[0]
+                body = {'error': f'DynamoDB error: {str(e)}'}
+                publisher.add(update['request_id'], 'update', body, 'error')
+                if update['request_id']:
+                    completed[update['request_id']] = {'statusCode': 500, 'body': body}
+            continue
+        except Exception as e:
+            logger.error(f"Error updating item {item_id}: {str(e)}")
+            released.extend(update['request_id'] for update in group)
+            batch_item_failures.extend({'itemIdentifier': update['message_id']} for update in group)
+            continue
+
+        for update, (status_code, body) in results:
+            logger.info(f"Update of item {item_id} finished with status {status_code}")
+            changed = None
+            if status_code < 400:
+                changed = [key for key in update['payload'] if key not in PROTECTED_ATTRIBUTES]
+                changed += ['updated_at', 'version']
+            publisher.add(update['request_id'], 'update', body,
+                          'success' if status_code < 400 else 'error', changed)
+            if update['request_id']:
+                completed[update['request_id']] = {'statusCode': status_code, 'body': body}
+
+    publisher.flush()
+
+    idempotency.release(released)
+    idempotency.complete(completed)
+
+    if batch_item_failures:
+        logger.warning(f"{len(batch_item_failures)} update messages returned to the queue")
+
+    return {'batchItemFailures': batch_item_failures}
+
+
+@log_metrics
 def lambda_handler(event, context):
     """
     Lambda function to update an item in DynamoDB
@@ -13,112 +314,80 @@ def lambda_handler(event, context):
     try:
         # Get table name from environment variable
         table_name = os.environ.get('TABLE_NAME')
-        
+
         if not table_name:
             return {
                 'statusCode': 500,
-                'headers': {
-                    'Content-Type': 'application/json',
-                    'Access-Control-Allow-Origin': '*'
-                },
+                'headers': HEADERS,
                 'body': json.dumps({
                     'error': 'TABLE_NAME environment variable not set'
                 })
             }
-        
+
+        # Messages from the CRUD queue; an unexpected error returns the
+        # whole batch to the queue
+        if 'Records' in event:
+            try:
+                return handle_sqs_event(event, table_name, context)
+            except Exception as e:
+                logger.error(f"Unhandled exception: {str(e)}")
+                return {
+                    'batchItemFailures': [
+                        {'itemIdentifier': record.get('messageId')} for record in event['Records']
+                    ]
+                }
+
         # Extract item ID from path parameters
         item_id = None
         if 'pathParameters' in event and event['pathParameters']:
             item_id = event['pathParameters'].get('id')
-        
+
         if not item_id:
             return {
                 'statusCode': 400,
-                'headers': {
-                    'Content-Type': 'application/json',
-                    'Access-Control-Allow-Origin': '*'
-                },
+                'headers': HEADERS,
                 'body': json.dumps({
                     'error': 'Item ID is required in path'
                 })
             }
-        
+
         # Parse the request body
         if 'body' in event and event['body']:
-            update_data = json.loads(event['body'])
+            update_data = json.loads(event['body'], parse_float=Decimal)
         else:
             return {
                 'statusCode': 400,
-                'headers': {
-                    'Content-Type': 'application/json',
-                    'Access-Control-Allow-Origin': '*'
-                },
+                'headers': HEADERS,
                 'body': json.dumps({
                     'error': 'Request body is required'
                 })
             }
-        
-        # Get DynamoDB table
-        table = dynamodb.Table(table_name)
-        
-        # Check if item exists
-        existing_item = table.get_item(Key={'id': item_id})
-        if 'Item' not in existing_item:
+
+        # Optional If-Match header carries the expected version
+        headers = {key.lower(): value for key, value in (event.get('headers') or {}).items()}
+        try:
+            expected_version = parse_expected_version(headers.get('if-match'))
+        except InvalidRequest as e:
             return {
-                'statusCode': 404,
-                'headers': {
-                    'Content-Type': 'application/json',
-                    'Access-Control-Allow-Origin': '*'
-                },
+                'statusCode': 400,
+                'headers': HEADERS,
                 'body': json.dumps({
-                    'error': 'Item not found'
+                    'error': str(e)
                 })
             }
-        
-        # Build update expression
-        update_expression = "SET "
-        expression_attribute_values = {}
-        expression_attribute_names = {}
-        
-        # Add updated_at timestamp
-        update_data['updated_at'] = datetime.utcnow().isoformat()
-        
-        for key, value in update_data.items():
-            if key != 'id':  # Don't update the primary key
-                attr_name = f"#{key}"
-                attr_value = f":{key}"
-                update_expression += f"{attr_name} = {attr_value}, "
-                expression_attribute_names[attr_name] = key
-                expression_attribute_values[attr_value] = value
-        
-        # Remove trailing comma and space
-        update_expression = update_expression.rstrip(', ')
-        
-        # Update item in DynamoDB
-        response = table.update_item(
-            Key={'id': item_id},
-            UpdateExpression=update_expression,
-            ExpressionAttributeNames=expression_attribute_names,
-            ExpressionAttributeValues=expression_attribute_values,
-            ReturnValues='ALL_NEW'
-        )
-        
+
+        status_code, body = update_item(table_name, item_id, update_data, expected_version)
+
         return {
-            'statusCode': 200,
-            'headers': {
-                'Content-Type': 'application/json',
-                'Access-Control-Allow-Origin': '*'
-            },
-            'body': json.dumps(response['Attributes'])
+            'statusCode': status_code,
+            'headers': HEADERS,
+            'body': json.dumps(body, default=json_default)
         }
-        
+
     except ClientError as e:
         return {
             'statusCode': 500,
-            'headers': {
-                'Content-Type': 'application/json',
-                'Access-Control-Allow-Origin': '*'
-            },
+            'headers': HEADERS,
             'body': json.dumps({
                 'error': f'DynamoDB error: {str(e)}'
             })
@@ -126,10 +395,7 @@ def lambda_handler(event, context):
     except Exception as e:
         return {
             'statusCode': 500,
-            'headers': {
-                'Content-Type': 'application/json',
-                'Access-Control-Allow-Origin': '*'
-            },
+            'headers': HEADERS,
             'body': json.dumps({
                 'error': f'Internal server error: {str(e)}'
             })
@@ -1,15 +1,15 @@
 import json
 import os
-import boto3
 import logging
+from aws_clients import get_client, preload
+from subscriptions import PAYLOAD_MODES, subscription_item
 
 # Configure logging
 logger = logging.getLogger()
 logger.setLevel(logging.INFO)
 
-# Initialize DynamoDB client
-dynamodb = boto3.resource('dynamodb')
-table = dynamodb.Table(os.environ.get('CONNECTIONS_TABLE_NAME'))
+# Build AWS clients during init only when COLD_START_MODE=eager
+preload(clients=['dynamodb'])
 
 def lambda_handler(event, context):
     """
@@ -23,22 +23,27 @@ def lambda_handler(event, context):
             logger.error("No connection ID found in event")
             return {'statusCode': 400, 'body': 'No connection ID'}
         
-        # Store connection ID in DynamoDB
-        # Client can send requestId as a query parameter to associate with their connection
-        request_id = event.get('queryStringParameters', {}).get('requestId', '')
-        
-        item = {
-            'connectionId': connection_id,
-            'timestamp': int(boto3.client('dynamodb').get_item(
-                TableName='DynamoDB',
-                Key={'id': {'S': 'id'}}
-            )['Item']['timestamp']['N']),
-            'requestId': request_id
-        }
-        
-        # Store in DynamoDB
-        table.put_item(Item=item)
-        
+        # Client can send requestId as a query parameter to subscribe to it
+        # right away; more requests can be added with subscribe messages
+        query = event.get('queryStringParameters') or {}
+        request_id = query.get('requestId', '')
+        # Optional payload mode for the notifications of this request
+        mode = query.get('mode')
+        if mode is not None and mode not in PAYLOAD_MODES:
+            return {'statusCode': 400, 'body': f"mode must be one of {', '.join(PAYLOAD_MODES)}"}
+        if not request_id:
+            logger.info(f"Connection {connection_id} opened without a requestId")
+            return {
+                'statusCode': 200,
+                'body': json.dumps({'message': 'Connected'})
+            }
+
+        # Store the subscription in DynamoDB
+        get_client('dynamodb').put_item(
+            TableName=os.environ.get('CONNECTIONS_TABLE_NAME'),
+            Item=subscription_item(connection_id, request_id, mode)
+        )
+
         logger.info(f"Connection {connection_id} stored with requestId {request_id}")
         
         return {
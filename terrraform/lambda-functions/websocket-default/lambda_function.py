@@ -1,53 +1,114 @@
 import json
 import os
-import boto3
 import logging
+from aws_clients import get_client, preload
+from retry import RetryPolicy
+from subscriptions import PAYLOAD_MODES, subscribe, unsubscribe
 
 # Configure logging
 logger = logging.getLogger()
 logger.setLevel(logging.INFO)
 
-# Initialize DynamoDB client
-dynamodb = boto3.resource('dynamodb')
-table = dynamodb.Table(os.environ.get('CONNECTIONS_TABLE_NAME'))
+# Build AWS clients during init only when COLD_START_MODE=eager
+preload(clients=['dynamodb'])
+
+# Upper bound on the requestIds of one subscribe/unsubscribe message
+MAX_SUBSCRIPTIONS_PER_MESSAGE = int(os.environ.get('MAX_SUBSCRIPTIONS_PER_MESSAGE', '500'))
+
+
+class InvalidRequest(Exception):
+    """Raised when a subscription message cannot be used"""
+
+
+def parse_request_ids(body):
+    """
+    Read the requestIds of a subscribe/unsubscribe message, which carries
+    either a requestIds list or a single requestId
+    """
+    request_ids = body.get('requestIds')
+    if request_ids is None:
+        request_ids = [body['requestId']] if body.get('requestId') else []
+    if not isinstance(request_ids, list) or not request_ids:
+        raise InvalidRequest('requestIds must be a non-empty list')
+    if not all(isinstance(request_id, str) and request_id for request_id in request_ids):
+        raise InvalidRequest('requestIds must be non-empty strings')
+    if len(request_ids) > MAX_SUBSCRIPTIONS_PER_MESSAGE:
+        raise InvalidRequest(f'At most {MAX_SUBSCRIPTIONS_PER_MESSAGE} requestIds can be sent at once')
+    return list(dict.fromkeys(request_ids))
+
+
+def handle_subscription(connection_id, action, body, policy=None):
+    """
+    Add or remove the subscriptions of one message.
+    Returns the reply for the client.
+    """
+    mode = body.get('mode')
+    try:
+        request_ids = parse_request_ids(body)
+        if mode is not None and mode not in PAYLOAD_MODES:
+            raise InvalidRequest(f"mode must be one of {', '.join(PAYLOAD_MODES)}")
+    except InvalidRequest as e:
+        return {'type': 'error', 'action': action, 'message': str(e)}
+
+    if action == 'subscribe':
+        failed = subscribe(connection_id, request_ids, mode, policy)
+    else:
+        failed = unsubscribe([(connection_id, request_id) for request_id in request_ids], policy)
+    logger.info(f"Connection {connection_id} {action}d {len(request_ids) - len(failed)} requestIds")
+
+    failed_ids = set(failed)
+    return {
+        'type': f'{action}d',
+        'requestIds': [request_id for request_id in request_ids if request_id not in failed_ids],
+        'failed': failed
+    }
+
 
 def lambda_handler(event, context):
     """
-    Lambda function to handle default WebSocket messages
+    Lambda function to handle default WebSocket messages.
+    subscribe/unsubscribe messages manage the requestIds a connection is
+    notified about; anything else is echoed back.
     """
     try:
         # Get connection ID
         connection_id = event.get('requestContext', {}).get('connectionId')
-        
+
         if not connection_id:
             logger.error("No connection ID found in event")
             return {'statusCode': 400, 'body': 'No connection ID'}
-        
+
         # Parse message body
-        body = json.loads(event.get('body', '{}'))
-        
-        # Echo the message back to the client
-        api_gateway_management_api = boto3.client(
+        body = json.loads(event.get('body') or '{}')
+        action = body.get('action') if isinstance(body, dict) else None
+
+        if action in ('subscribe', 'unsubscribe'):
+            reply = handle_subscription(connection_id, action, body, RetryPolicy(context))
+        else:
+            # Echo the message back to the client
+            reply = {
+                'message': 'Echo: ' + json.dumps(body),
+                'type': 'echo'
+            }
+
+        api_gateway_management_api = get_client(
             'apigatewaymanagementapi',
             endpoint_url=f"https://{event['requestContext']['domainName']}/{event['requestContext']['stage']}"
         )
-        
+
         api_gateway_management_api.post_to_connection(
             ConnectionId=connection_id,
-            Data=json.dumps({
-                'message': 'Echo: ' + json.dumps(body),
-                'type': 'echo'
-            })
+            Data=json.dumps(reply)
         )
-        
+
         return {
             'statusCode': 200,
             'body': json.dumps({'message': 'Message received'})
         }
-        
+
     except Exception as e:
         logger.error(f"Error handling message: {str(e)}")
         return {
             'statusCode': 500,
             'body': json.dumps({'error': str(e)})
-        }
\ No newline at end of file
+        }
@@ -1,15 +1,15 @@
 import json
-import os
-import boto3
 import logging
+from aws_clients import preload
+from retry import RetryPolicy
+from subscriptions import connection_request_ids, unsubscribe
 
 # Configure logging
 logger = logging.getLogger()
 logger.setLevel(logging.INFO)
 
-# Initialize DynamoDB client
-dynamodb = boto3.resource('dynamodb')
-table = dynamodb.Table(os.environ.get('CONNECTIONS_TABLE_NAME'))
+# Build AWS clients during init only when COLD_START_MODE=eager
+preload(clients=['dynamodb'])
 
 def lambda_handler(event, context):
     """
@@ -23,10 +23,13 @@ def lambda_handler(event, context):
             logger.error("No connection ID found in event")
             return {'statusCode': 400, 'body': 'No connection ID'}
         
-        # Remove connection ID from DynamoDB
-        table.delete_item(Key={'connectionId': connection_id})
-        
-        logger.info(f"Connection {connection_id} removed")
+        # Remove every subscription of the connection from DynamoDB
+        request_ids = connection_request_ids(connection_id)
+        failed = unsubscribe([(connection_id, request_id) for request_id in request_ids], RetryPolicy(context))
+        if failed:
+            logger.warning(f"{len(failed)} subscriptions of connection {connection_id} left to expire")
+
+        logger.info(f"Connection {connection_id} removed with {len(request_ids)} subscriptions")
         
         return {
             'statusCode': 200,
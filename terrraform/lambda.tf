@@ -1,38 +1,116 @@
 # Get AWS account ID
 data "aws_caller_identity" "current" {}
 
+locals {
+  lambda_source_dir   = "${path.module}/lambda-functions"
+  shared_lambda_files = fileset("${local.lambda_source_dir}/shared", "*.py")
+
+  # Either the router or the four per-operation functions consume the CRUD queue
+  crud_function_count = var.enable_crud_router ? 0 : 1
+  router_count        = var.enable_crud_router ? 1 : 0
+}
+
 # Archive Lambda function code
 data "archive_file" "create_lambda_zip" {
+  count       = local.crud_function_count
   type        = "zip"
-  source_dir  = "${path.module}/lambda-functions/create"
   output_path = "${path.module}/lambda-functions/create.zip"
+
+  dynamic "source" {
+    for_each = fileset("${local.lambda_source_dir}/create", "*.py")
+    content {
+      content  = file("${local.lambda_source_dir}/create/${source.value}")
+      filename = source.value
+    }
+  }
+
+  # Shared runtime modules are packaged next to every handler
+  dynamic "source" {
+    for_each = local.shared_lambda_files
+    content {
+      content  = file("${local.lambda_source_dir}/shared/${source.value}")
+      filename = source.value
+    }
+  }
 }
 
 data "archive_file" "read_lambda_zip" {
+  count       = local.crud_function_count
   type        = "zip"
-  source_dir  = "${path.module}/lambda-functions/read"
   output_path = "${path.module}/lambda-functions/read.zip"
+
+  dynamic "source" {
+    for_each = fileset("${local.lambda_source_dir}/read", "*.py")
+    content {
+      content  = file("${local.lambda_source_dir}/read/${source.value}")
+      filename = source.value
+    }
+  }
+
+  # Shared runtime modules are packaged next to every handler
+  dynamic "source" {
+    for_each = local.shared_lambda_files
+    content {
+      content  = file("${local.lambda_source_dir}/shared/${source.value}")
+      filename = source.value
+    }
+  }
 }
 
 data "archive_file" "update_lambda_zip" {
+  count       = local.crud_function_count
   type        = "zip"
-  source_dir  = "${path.module}/lambda-functions/update"
   output_path = "${path.module}/lambda-functions/update.zip"
+
+  dynamic "source" {
+    for_each = fileset("${local.lambda_source_dir}/update", "*.py")
+    content {
+      content  = file("${local.lambda_source_dir}/update/${source.value}")
+      filename = source.value
+    }
+  }
+
+  # Shared runtime modules are packaged next to every handler
+  dynamic "source" {
+    for_each = local.shared_lambda_files
+    content {
+      content  = file("${local.lambda_source_dir}/shared/${source.value}")
+      filename = source.value
+    }
+  }
 }
 
 data "archive_file" "delete_lambda_zip" {
+  count       = local.crud_function_count
   type        = "zip"
-  source_dir  = "${path.module}/lambda-functions/delete"
   output_path = "${path.module}/lambda-functions/delete.zip"
+
+  dynamic "source" {
+    for_each = fileset("${local.lambda_source_dir}/delete", "*.py")
+    content {
+      content  = file("${local.lambda_source_dir}/delete/${source.value}")
+      filename = source.value
+    }
+  }
+
+  # Shared runtime modules are packaged next to every handler
+  dynamic "source" {
+    for_each = local.shared_lambda_files
+    content {
+      content  = file("${local.lambda_source_dir}/shared/${source.value}")
+      filename = source.value
+    }
+  }
 }
 
 # Create Lambda Function
 resource "aws_lambda_function" "create_lambda" {
-  filename         = data.archive_file.create_lambda_zip.output_path
+  count            = local.crud_function_count
+  filename         = data.archive_file.create_lambda_zip[0].output_path
   function_name    = "${var.project_name}-create"
   role            = aws_iam_role.lambda_role.arn
   handler         = "lambda_function.lambda_handler"
-  source_code_hash = data.archive_file.create_lambda_zip.output_base64sha256
+  source_code_hash = data.archive_file.create_lambda_zip[0].output_base64sha256
   runtime         = "python3.12"
   timeout         = var.lambda_timeout
   memory_size      = var.lambda_memory_size
@@ -51,9 +129,15 @@ resource "aws_lambda_function" "create_lambda" {
     variables = {
       TABLE_NAME    = aws_dynamodb_table.crud_table.name
       LOG_LEVEL     = var.log_level
+      COLD_START_MODE = var.cold_start_mode
+      METRICS_ENABLED = var.metrics_enabled
       POWERTOOLS_SERVICE_NAME = "${var.project_name}-create"
       POWERTOOLS_METRICS_NAMESPACE = var.project_name
       NOTIFICATION_QUEUE_URL = aws_sqs_queue.notification_queue.url
+      LIST_INDEXES = jsonencode(var.item_indexes)
+      IDEMPOTENCY_TABLE_NAME = aws_dynamodb_table.idempotency_table.name
+      IDEMPOTENCY_TTL_SECONDS = var.idempotency_ttl_seconds
+      IDEMPOTENCY_LOCK_SECONDS = var.lambda_timeout
     }
   }
 
@@ -68,10 +152,18 @@ resource "aws_lambda_function" "create_lambda" {
 
 # SQS Event Source Mapping for Create Lambda
 resource "aws_lambda_event_source_mapping" "create_event_source" {
+  count            = local.crud_function_count
   event_source_arn = aws_sqs_queue.crud_queue.arn
-  function_name    = aws_lambda_function.create_lambda.arn
-  batch_size       = 1
+  function_name    = aws_lambda_function.create_lambda[0].arn
+  batch_size       = var.create_batch_size
   enabled          = true
+
+  # Batches larger than 10 require a batching window
+  maximum_batching_window_in_seconds = var.create_batch_size > 10 ? var.create_batching_window_seconds : 0
+
+  # Only failed messages are returned to the queue
+  function_response_types = ["ReportBatchItemFailures"]
+
   filter_criteria {
     filter {
       pattern = jsonencode({
@@ -83,11 +175,12 @@ resource "aws_lambda_event_source_mapping" "create_event_source" {
 
 # Read Lambda Function
 resource "aws_lambda_function" "read_lambda" {
-  filename         = data.archive_file.read_lambda_zip.output_path
+  count            = local.crud_function_count
+  filename         = data.archive_file.read_lambda_zip[0].output_path
   function_name    = "${var.project_name}-read"
   role            = aws_iam_role.lambda_role.arn
   handler         = "lambda_function.lambda_handler"
-  source_code_hash = data.archive_file.read_lambda_zip.output_base64sha256
+  source_code_hash = data.archive_file.read_lambda_zip[0].output_base64sha256
   runtime         = "python3.12"
   timeout         = var.lambda_timeout
   memory_size      = var.lambda_memory_size
@@ -104,8 +197,15 @@ resource "aws_lambda_function" "read_lambda" {
     variables = {
       TABLE_NAME    = aws_dynamodb_table.crud_table.name
       LOG_LEVEL     = var.log_level
+      COLD_START_MODE = var.cold_start_mode
+      METRICS_ENABLED = var.metrics_enabled
       POWERTOOLS_SERVICE_NAME = "${var.project_name}-read"
       POWERTOOLS_METRICS_NAMESPACE = var.project_name
+      NOTIFICATION_QUEUE_URL = aws_sqs_queue.notification_queue.url
+      SCAN_SEGMENTS = var.read_scan_segments
+      LIST_INDEXES = jsonencode(var.item_indexes)
+      LIST_FILTER_ATTRIBUTES = var.read_list_filter_attributes
+      ITEM_CACHE_TTL = var.read_item_cache_ttl
     }
   }
 
@@ -120,10 +220,15 @@ resource "aws_lambda_function" "read_lambda" {
 
 # SQS Event Source Mapping for Read Lambda
 resource "aws_lambda_event_source_mapping" "read_event_source" {
+  count            = local.crud_function_count
   event_source_arn = aws_sqs_queue.crud_queue.arn
-  function_name    = aws_lambda_function.read_lambda.arn
+  function_name    = aws_lambda_function.read_lambda[0].arn
   batch_size       = 1
   enabled          = true
+
+  # Only failed messages are returned to the queue
+  function_response_types = ["ReportBatchItemFailures"]
+
   filter_criteria {
     filter {
       pattern = jsonencode({
@@ -135,11 +240,12 @@ resource "aws_lambda_event_source_mapping" "read_event_source" {
 
 # Update Lambda Function
 resource "aws_lambda_function" "update_lambda" {
-  filename         = data.archive_file.update_lambda_zip.output_path
+  count            = local.crud_function_count
+  filename         = data.archive_file.update_lambda_zip[0].output_path
   function_name    = "${var.project_name}-update"
   role            = aws_iam_role.lambda_role.arn
   handler         = "lambda_function.lambda_handler"
-  source_code_hash = data.archive_file.update_lambda_zip.output_base64sha256
+  source_code_hash = data.archive_file.update_lambda_zip[0].output_base64sha256
   runtime         = "python3.12"
   timeout         = var.lambda_timeout
   memory_size      = var.lambda_memory_size
@@ -156,8 +262,15 @@ resource "aws_lambda_function" "update_lambda" {
     variables = {
       TABLE_NAME    = aws_dynamodb_table.crud_table.name
       LOG_LEVEL     = var.log_level
+      COLD_START_MODE = var.cold_start_mode
+      METRICS_ENABLED = var.metrics_enabled
       POWERTOOLS_SERVICE_NAME = "${var.project_name}-update"
       POWERTOOLS_METRICS_NAMESPACE = var.project_name
+      NOTIFICATION_QUEUE_URL = aws_sqs_queue.notification_queue.url
+      LIST_INDEXES = jsonencode(var.item_indexes)
+      IDEMPOTENCY_TABLE_NAME = aws_dynamodb_table.idempotency_table.name
+      IDEMPOTENCY_TTL_SECONDS = var.idempotency_ttl_seconds
+      IDEMPOTENCY_LOCK_SECONDS = var.lambda_timeout
     }
   }
 
@@ -172,10 +285,19 @@ resource "aws_lambda_function" "update_lambda" {
 
 # SQS Event Source Mapping for Update Lambda
 resource "aws_lambda_event_source_mapping" "update_event_source" {
+  count            = local.crud_function_count
   event_source_arn = aws_sqs_queue.crud_queue.arn
-  function_name    = aws_lambda_function.update_lambda.arn
-  batch_size       = 1
+  function_name    = aws_lambda_function.update_lambda[0].arn
+  batch_size       = var.update_batch_size
   enabled          = true
+
+  # A short window lets bursts of updates to one id arrive in one batch,
+  # where they are coalesced into a single UpdateItem
+  maximum_batching_window_in_seconds = var.update_batching_window_seconds
+
+  # Only failed messages are returned to the queue
+  function_response_types = ["ReportBatchItemFailures"]
+
   filter_criteria {
     filter {
       pattern = jsonencode({
@@ -187,11 +309,12 @@ resource "aws_lambda_event_source_mapping" "update_event_source" {
 
 # Delete Lambda Function
 resource "aws_lambda_function" "delete_lambda" {
-  filename         = data.archive_file.delete_lambda_zip.output_path
+  count            = local.crud_function_count
+  filename         = data.archive_file.delete_lambda_zip[0].output_path
   function_name    = "${var.project_name}-delete"
   role            = aws_iam_role.lambda_role.arn
   handler         = "lambda_function.lambda_handler"
-  source_code_hash = data.archive_file.delete_lambda_zip.output_base64sha256
+  source_code_hash = data.archive_file.delete_lambda_zip[0].output_base64sha256
   runtime         = "python3.12"
   timeout         = var.lambda_timeout
   memory_size      = var.lambda_memory_size
@@ -208,8 +331,14 @@ resource "aws_lambda_function" "delete_lambda" {
     variables = {
       TABLE_NAME    = aws_dynamodb_table.crud_table.name
       LOG_LEVEL     = var.log_level
+      COLD_START_MODE = var.cold_start_mode
+      METRICS_ENABLED = var.metrics_enabled
       POWERTOOLS_SERVICE_NAME = "${var.project_name}-delete"
       POWERTOOLS_METRICS_NAMESPACE = var.project_name
+      NOTIFICATION_QUEUE_URL = aws_sqs_queue.notification_queue.url
+      IDEMPOTENCY_TABLE_NAME = aws_dynamodb_table.idempotency_table.name
+      IDEMPOTENCY_TTL_SECONDS = var.idempotency_ttl_seconds
+      IDEMPOTENCY_LOCK_SECONDS = var.lambda_timeout
     }
   }
 
@@ -224,10 +353,15 @@ resource "aws_lambda_function" "delete_lambda" {
 
 # SQS Event Source Mapping for Delete Lambda
 resource "aws_lambda_event_source_mapping" "delete_event_source" {
+  count            = local.crud_function_count
   event_source_arn = aws_sqs_queue.crud_queue.arn
-  function_name    = aws_lambda_function.delete_lambda.arn
+  function_name    = aws_lambda_function.delete_lambda[0].arn
   batch_size       = 1
   enabled          = true
+
+  # Only failed messages are returned to the queue
+  function_response_types = ["ReportBatchItemFailures"]
+
   filter_criteria {
     filter {
       pattern = jsonencode({
@@ -237,8 +371,113 @@ resource "aws_lambda_event_source_mapping" "delete_event_source" {
   }
 }
 
+# Router Lambda: one function for every CRUD operation, deployed instead of
+# the four functions above when enable_crud_router is set. The handlers of
+# the other functions are packaged next to it as <function>_handler.py.
+data "archive_file" "router_lambda_zip" {
+  count       = local.router_count
+  type        = "zip"
+  output_path = "${path.module}/lambda-functions/router.zip"
+
+  dynamic "source" {
+    for_each = fileset("${local.lambda_source_dir}/router", "*.py")
+    content {
+      content  = file("${local.lambda_source_dir}/router/${source.value}")
+      filename = source.value
+    }
+  }
+
+  dynamic "source" {
+    for_each = toset(["create", "read", "update", "delete"])
+    content {
+      content  = file("${local.lambda_source_dir}/${source.value}/lambda_function.py")
+      filename = "${source.value}_handler.py"
+    }
+  }
+
+  # Shared runtime modules are packaged next to every handler
+  dynamic "source" {
+    for_each = local.shared_lambda_files
+    content {
+      content  = file("${local.lambda_source_dir}/shared/${source.value}")
+      filename = source.value
+    }
+  }
+}
+
+resource "aws_lambda_function" "router_lambda" {
+  count            = local.router_count
+  filename         = data.archive_file.router_lambda_zip[0].output_path
+  function_name    = "${var.project_name}-router"
+  role            = aws_iam_role.lambda_role.arn
+  handler         = "lambda_function.lambda_handler"
+  source_code_hash = data.archive_file.router_lambda_zip[0].output_base64sha256
+  runtime         = "python3.12"
+  timeout         = var.lambda_timeout
+  memory_size      = var.lambda_memory_size
+
+  tracing_config {
+    mode = var.enable_xray_tracing ? "Active" : "PassThrough"
+  }
+
+  dead_letter_config {
+    target_arn = aws_sqs_queue.dlq.arn
+  }
+
+  environment {
+    variables = {
+      TABLE_NAME    = aws_dynamodb_table.crud_table.name
+      LOG_LEVEL     = var.log_level
+      COLD_START_MODE = var.cold_start_mode
+      METRICS_ENABLED = var.metrics_enabled
+      POWERTOOLS_SERVICE_NAME = "${var.project_name}-router"
+      POWERTOOLS_METRICS_NAMESPACE = var.project_name
+      NOTIFICATION_QUEUE_URL = aws_sqs_queue.notification_queue.url
+      IDEMPOTENCY_TABLE_NAME = aws_dynamodb_table.idempotency_table.name
+      IDEMPOTENCY_TTL_SECONDS = var.idempotency_ttl_seconds
+      IDEMPOTENCY_LOCK_SECONDS = var.lambda_timeout
+      SCAN_SEGMENTS = var.read_scan_segments
+      LIST_INDEXES = jsonencode(var.item_indexes)
+      LIST_FILTER_ATTRIBUTES = var.read_list_filter_attributes
+      ITEM_CACHE_TTL = var.read_item_cache_ttl
+    }
+  }
+
+  tags = {
+    Name        = "${var.project_name}-router-lambda"
+    Environment = var.environment
+    Service     = "crud-api"
+  }
+
+  depends_on = [aws_cloudwatch_log_group.router_lambda_logs]
+}
+
+# SQS Event Source Mapping for Router Lambda
+resource "aws_lambda_event_source_mapping" "router_event_source" {
+  count            = local.router_count
+  event_source_arn = aws_sqs_queue.crud_queue.arn
+  function_name    = aws_lambda_function.router_lambda[0].arn
+  batch_size       = var.router_batch_size
+  enabled          = true
+
+  # Batches larger than 10 require a batching window
+  maximum_batching_window_in_seconds = var.router_batch_size > 10 ? var.router_batching_window_seconds : 0
+
+  # Only failed messages are returned to the queue
+  function_response_types = ["ReportBatchItemFailures"]
+
+  filter_criteria {
+    filter {
+      pattern = jsonencode({
+        operation = ["create", "get", "list", "update", "delete"]
+      })
+    }
+  }
+}
+
 # CloudWatch Log Groups for Lambda functions (Best Practice: Create before Lambda)
 resource "aws_cloudwatch_log_group" "create_lambda_logs" {
+  count             = local.crud_function_count
   name              = "/aws/lambda/${var.project_name}-create"
   retention_in_days = var.log_retention_days
   kms_key_id        = var.enable_log_encryption ? aws_kms_key.logs[0].arn : null
@@ -251,6 +490,7 @@ resource "aws_cloudwatch_log_group" "create_lambda_logs" {
 }
 
 resource "aws_cloudwatch_log_group" "read_lambda_logs" {
+  count             = local.crud_function_count
   name              = "/aws/lambda/${var.project_name}-read"
   retention_in_days = var.log_retention_days
   kms_key_id        = var.enable_log_encryption ? aws_kms_key.logs[0].arn : null
@@ -263,6 +503,7 @@ resource "aws_cloudwatch_log_group" "read_lambda_logs" {
 }
 
 resource "aws_cloudwatch_log_group" "update_lambda_logs" {
+  count             = local.crud_function_count
   name              = "/aws/lambda/${var.project_name}-update"
   retention_in_days = var.log_retention_days
   kms_key_id        = var.enable_log_encryption ? aws_kms_key.logs[0].arn : null
@@ -275,6 +516,7 @@ resource "aws_cloudwatch_log_group" "update_lambda_logs" {
 }
 
 resource "aws_cloudwatch_log_group" "delete_lambda_logs" {
+  count             = local.crud_function_count
   name              = "/aws/lambda/${var.project_name}-delete"
   retention_in_days = var.log_retention_days
   kms_key_id        = var.enable_log_encryption ? aws_kms_key.logs[0].arn : null
@@ -285,3 +527,16 @@ resource "aws_cloudwatch_log_group" "delete_lambda_logs" {
     Service     = "crud-api"
   }
 }
+
+resource "aws_cloudwatch_log_group" "router_lambda_logs" {
+  count             = local.router_count
+  name              = "/aws/lambda/${var.project_name}-router"
+  retention_in_days = var.log_retention_days
+  kms_key_id        = var.enable_log_encryption ? aws_kms_key.logs[0].arn : null
+
+  tags = {
+    Name        = "${var.project_name}-router-logs"
+    Environment = var.environment
+    Service     = "crud-api"
+  }
+}
@@ -16,15 +16,19 @@ output "dynamodb_table_name" {
 
 output "lambda_function_names" {
   description = "Names of the Lambda functions"
-  value = {
-    create       = aws_lambda_function.create_lambda.function_name
-    read         = aws_lambda_function.read_lambda.function_name
-    update       = aws_lambda_function.update_lambda.function_name
-    delete       = aws_lambda_function.delete_lambda.function_name
-    notification = aws_lambda_function.notification_lambda.function_name
-    ws_connect   = aws_lambda_function.websocket_connect_lambda.function_name
-    ws_disconnect = aws_lambda_function.websocket_disconnect_lambda.function_name
-  }
+  # Only the CRUD functions of the deployed layout (router or split) are listed
+  value = merge(
+    { for function in aws_lambda_function.router_lambda : "router" => function.function_name },
+    { for function in aws_lambda_function.create_lambda : "create" => function.function_name },
+    { for function in aws_lambda_function.read_lambda : "read" => function.function_name },
+    { for function in aws_lambda_function.update_lambda : "update" => function.function_name },
+    { for function in aws_lambda_function.delete_lambda : "delete" => function.function_name },
+    {
+      notification = aws_lambda_function.notification_lambda.function_name
+      ws_connect   = aws_lambda_function.websocket_connect_lambda.function_name
+      ws_disconnect = aws_lambda_function.websocket_disconnect_lambda.function_name
+    }
+  )
 }
 
 output "api_endpoints" {
@@ -33,4 +37,12 @@ output "api_endpoints" {
     rest_api = "${aws_api_gateway_stage.crud_api_stage.invoke_url}/items"
     websocket_api = "${aws_apigatewayv2_api.websocket_api.api_endpoint}/${aws_apigatewayv2_stage.websocket_stage.name}"
   }
-}
\ No newline at end of file
+}
+output "queue_urls" {
+  description = "URLs of the SQS queues, used by tools/dlq_redrive.py"
+  value = {
+    crud         = aws_sqs_queue.crud_queue.url
+    notification = aws_sqs_queue.notification_queue.url
+    dlq          = aws_sqs_queue.dlq.url
+  }
+}
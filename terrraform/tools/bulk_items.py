@@ -0,0 +1,537 @@
+#!/usr/bin/env python3
+"""
+Bulk import and export of the items table.
+
+import streams NDJSON (plain or gzip, or - for stdin) into the table. Each
+line is one JSON item and is checked and stamped like the create handler
+does it. Lines whose id is not a non-empty string (numbers are converted)
+or whose index key attributes are not non-empty strings are rejected
+before they are written. Items
+without an id get a random one, or with --id-namespace one derived from
+the namespace and line number, so re-running an interrupted import of the
+same input writes the same items again. created_at/updated_at are set
+unless --keep-timestamps is given. Items are
+packed into 25-item BatchWriteItem chunks and written by a pool of
+workers. Unprocessed items and throttling are retried with the shared
+retry policy, and a chunk DynamoDB rejects as invalid is written again
+item by item so one bad line does not fail the others. Lines that cannot
+be parsed or written are copied to --rejects so they can be imported
+again.
+
+export runs a parallel segmented scan into gzip-compressed NDJSON shards,
+one series of shards per segment, rotated every --shard-items items. A
+shard is written under a .tmp name and renamed when complete, and the
+checkpoint file then records the segment's scan position. An interrupted
+export resumes from the checkpoint; --restart deletes the checkpoint and the
+shards instead, and a new export refuses to mix its shards with ones left
+without a checkpoint. Numbers are exported as JSON numbers,
+which keep about 15 significant digits.
+
+Both modes read and write one chunk or page at a time per worker, so
+memory use does not grow with the size of the table or the input.
+
+Usage:
+    python tools/bulk_items.py import --table crud-items items.ndjson.gz
+    zcat dump.gz | python tools/bulk_items.py import --table crud-items - --keep-timestamps
+    python tools/bulk_items.py import --table crud-items items.ndjson.gz --id-namespace items-2024-06
+    python tools/bulk_items.py export --table crud-items --output-dir export/ --segments 8
+    python tools/bulk_items.py export --table crud-items --output-dir export/   # resumes
+"""
+import argparse
+import glob
+import gzip
+import io
+import json
+import os
+import queue
+import sys
+import threading
+import time
+from decimal import Decimal
+
+TOOLS_DIR = os.path.dirname(os.path.abspath(__file__))
+SHARED_DIR = os.path.join(os.path.dirname(TOOLS_DIR), 'lambda-functions', 'shared')
+
+# The shared modules record metrics for Lambda invocations only
+os.environ.setdefault('METRICS_ENABLED', 'false')
+sys.path.insert(0, SHARED_DIR)
+
+from botocore.exceptions import ClientError  # noqa: E402
+
+from dynamodb_codec import deserialize, deserialize_item, serialize_item  # noqa: E402
+from items import index_key_error, stamp_new_item  # noqa: E402
+from notifications import json_default  # noqa: E402
+from rate_limit import TokenBucket, error_code  # noqa: E402
+from retry import RetryPolicy, is_retryable  # noqa: E402
+
+# BatchWriteItem accepts at most 25 put requests per call
+BATCH_WRITE_SIZE = 25
+
+# DynamoDB rejects partition keys longer than this
+MAX_ID_BYTES = 2048
+
+GZIP_MAGIC = b'\x1f\x8b'
+
+CHECKPOINT_VERSION = 1
+
+
+def create_dynamodb_client(workers):
+    import boto3
+    from botocore.config import Config
+    return boto3.client('dynamodb', config=Config(
+        max_pool_connections=max(10, workers * 2),
+        retries={'max_attempts': 3, 'mode': 'standard'}
+    ))
+
+
+class Progress:
+    """
+    Thread-safe counters printed to stderr while a run is going
+    """
+
+    def __init__(self, interval):
+        self.interval = interval
+        self.lock = threading.Lock()
+        self.started = time.monotonic()
+        self.printed = self.started
+        self.counts = {}
+
+    def add(self, name, value=1):
+        with self.lock:
+            self.counts[name] = self.counts.get(name, 0) + value
+
+    def get(self, name):
+        with self.lock:
+            return self.counts.get(name, 0)
+
+    def elapsed(self):
+        return time.monotonic() - self.started
+
+    def maybe_print(self, rate_counter):
+        if not self.interval or time.monotonic() - self.printed < self.interval:
+            return
+        self.printed = time.monotonic()
+        with self.lock:
+            counts = dict(self.counts)
+        elapsed = self.elapsed()
+        rate = counts.get(rate_counter, 0) / elapsed if elapsed else 0.0
+        summary = '  '.join(f'{name} {value}' for name, value in sorted(counts.items()))
+        print(f"{elapsed:8.1f}s  {summary}  ({rate:.0f} items/s)", file=sys.stderr)
+
+
+# ---------------------------------------------------------------------------
+# Import
+# ---------------------------------------------------------------------------
+
+def open_input(path):
+    """
+    Open a plain or gzip NDJSON source as text, - being stdin
+    """
+    stream = sys.stdin.buffer if path == '-' else open(path, 'rb')
+    if stream.peek(2)[:2] == GZIP_MAGIC:
+        stream = gzip.GzipFile(fileobj=stream)
+    return io.TextIOWrapper(stream, encoding='utf-8')
+
+
+class Rejects:
+    """
+    Appends rejected lines to an NDJSON file, so they can be imported again
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.file = None
+        self.lock = threading.Lock()
+
+    def write(self, line):
+        if not self.path:
+            return
+        with self.lock:
+            if self.file is None:
+                self.file = open(self.path, 'a', encoding='utf-8')
+            self.file.write(line.rstrip('\n') + '\n')
+
+    def close(self):
+        if self.file is not None:
+            self.file.close()
+
+
+def index_keys(client, table_name):
+    """
+    Return the string attributes that key a secondary index of the table
+    """
+    table = client.describe_table(TableName=table_name)['Table']
+    string_attributes = {
+        definition['AttributeName'] for definition in table.get('AttributeDefinitions', [])
+        if definition['AttributeType'] == 'S'
+    }
+    return sorted({
+        key['AttributeName']
+        for index in table.get('GlobalSecondaryIndexes', []) + table.get('LocalSecondaryIndexes', [])
+        for key in index['KeySchema']
+        if key['AttributeName'] in string_attributes
+    })
+
+
+def item_id(item):
+    """
+    Return the id of a stamped item as a string. Numbers are accepted as
+    their string form; anything else DynamoDB would reject as a key raises
+    ValueError.
+    """
+    value = item['id']
+    if isinstance(value, int) and not isinstance(value, bool):
+        value = str(value)
+    if not isinstance(value, str) or not 0 < len(value.encode('utf-8')) <= MAX_ID_BYTES:
+        raise ValueError(f'id must be a non-empty string of at most {MAX_ID_BYTES} bytes')
+    return value
+
+
+def put_items_individually(client, table_name, chunk, policy):
+    """
+    Fallback used when a whole BatchWriteItem call is rejected as invalid,
+    so that a single bad item does not fail the rest of the chunk.
+    Returns {id: error} for the items that could not be written.
+    """
+    failed = {}
+    for item_id, (attributes, _) in chunk.items():
+        try:
+            policy.call(client.put_item, TableName=table_name, Item=attributes)
+        except ClientError as e:
+            failed[item_id] = error_code(e)
+    return failed
+
+
+def write_chunk(client, table_name, chunk, policy):
+    """
+    Write one chunk {id: (attributes, item)} with BatchWriteItem, retrying
+    unprocessed items and retryable errors.
+    Returns {id: error} for the items that could not be written.
+    """
+    pending = dict(chunk)
+    backoff = policy.backoff()
+    error = None
+    while pending:
+        try:
+            response = client.batch_write_item(RequestItems={
+                table_name: [{'PutRequest': {'Item': attributes}} for attributes, _ in pending.values()]
+            })
+        except ClientError as e:
+            error = error_code(e)
+            if error == 'ValidationException':
+                return put_items_individually(client, table_name, pending, policy)
+            if not is_retryable(e):
+                break
+        else:
+            unprocessed = response.get('UnprocessedItems', {}).get(table_name, [])
+            unprocessed_ids = {deserialize(request['PutRequest']['Item']['id']) for request in unprocessed}
+            pending = {item_id: entry for item_id, entry in pending.items() if item_id in unprocessed_ids}
+            error = 'UnprocessedItems'
+        if pending and not backoff.wait():
+            break
+    return {item_id: error for item_id in pending}
+
+
+def import_worker(client, options, chunks, bucket, progress, rejects):
+    policy = RetryPolicy(max_attempts=options.max_attempts)
+    while True:
+        chunk = chunks.get()
+        if chunk is None:
+            return
+        bucket.acquire(len(chunk))
+        try:
+            failed = write_chunk(client, options.table, chunk, policy)
+        except Exception as e:
+            failed = {item_id: error_code(e) for item_id in chunk}
+        progress.add('written', len(chunk) - len(failed))
+        for item_id, error in failed.items():
+            progress.add(f'failed ({error})')
+            rejects.write(json.dumps(chunk[item_id][1], default=json_default))
+
+
+def import_items(options):
+    """
+    Stream the input into the table with a pool of BatchWriteItem workers
+    """
+    client = create_dynamodb_client(options.workers)
+    keys = index_keys(client, options.table)
+    bucket = TokenBucket(options.rate)
+    progress = Progress(options.progress_seconds)
+    rejects = Rejects(options.rejects)
+    # Bounded, so reading never runs far ahead of the writers
+    chunks = queue.Queue(maxsize=options.workers * 2)
+    workers = [
+        threading.Thread(target=import_worker, args=(client, options, chunks, bucket, progress, rejects), daemon=True)
+        for _ in range(options.workers)
+    ]
+    for worker in workers:
+        worker.start()
+
+    chunk = {}
+    try:
+        with open_input(options.input) as lines:
+            for line_number, line in enumerate(lines, 1):
+                if not line.strip():
+                    continue
+                progress.add('read')
+                try:
+                    item = json.loads(line, parse_float=Decimal)
+                    if not isinstance(item, dict):
+                        raise ValueError('line is not a JSON object')
+                    kept = {}
+                    if options.keep_timestamps:
+                        kept = {key: item[key] for key in ('created_at', 'updated_at') if item.get(key)}
+                    id_name = f'{options.id_namespace}:{line_number}' if options.id_namespace else None
+                    stamp_new_item(item, id_name)
+                    item.update(kept)
+                    item['id'] = item_id(item)
+                    error = index_key_error(item, keys)
+                    if error:
+                        raise ValueError(error)
+                    attributes = serialize_item(item)
+                except (TypeError, ValueError) as e:
+                    progress.add(f'invalid ({type(e).__name__})')
+                    rejects.write(line)
+                    continue
+
+                # A BatchWriteItem call rejects duplicate keys
+                if item['id'] in chunk or len(chunk) >= BATCH_WRITE_SIZE:
+                    chunks.put(chunk)
+                    chunk = {}
+                chunk[item['id']] = (attributes, item)
+                progress.maybe_print('written')
+        if chunk:
+            chunks.put(chunk)
+    finally:
+        for _ in workers:
+            chunks.put(None)
+        for worker in workers:
+            worker.join()
+        rejects.close()
+
+    with progress.lock:
+        counts = dict(progress.counts)
+    rejected = sum(value for name, value in counts.items() if name.startswith(('invalid', 'failed')))
+    return {
+        'mode': 'import',
+        'table': options.table,
+        'elapsed_seconds': round(progress.elapsed(), 3),
+        'read': counts.get('read', 0),
+        'written': counts.get('written', 0),
+        'rejected': rejected,
+        'items_per_second': round(counts.get('written', 0) / progress.elapsed(), 1),
+        'errors': {name: value for name, value in counts.items() if name.startswith(('invalid', 'failed'))}
+    }
+
+
+# ---------------------------------------------------------------------------
+# Export
+# ---------------------------------------------------------------------------
+
+class Checkpoint:
+    """
+    Export state per segment, saved atomically after every completed shard:
+    {"key": resume key, "shard": next shard number, "items": exported items,
+    "files": completed shards, "done": bool}
+    """
+
+    def __init__(self, path, state):
+        self.path = path
+        self.state = state
+        self.lock = threading.Lock()
+
+    @classmethod
+    def load(cls, path, options):
+        fresh = {
+            'version': CHECKPOINT_VERSION,
+            'table': options.table,
+            'segments': options.segments,
+            'prefix': options.prefix,
+            'segment_state': {
+                str(segment): {'key': None, 'shard': 0, 'items': 0, 'files': [], 'done': False}
+                for segment in range(options.segments)
+            }
+        }
+        if options.restart or not os.path.exists(path):
+            return cls(path, fresh)
+        with open(path) as f:
+            state = json.load(f)
+        if (state.get('version'), state.get('table'), state.get('prefix')) != (
+                CHECKPOINT_VERSION, options.table, options.prefix):
+            raise SystemExit(f'{path} belongs to another export; use --restart to discard it')
+        return cls(path, state)
+
+    def segment(self, segment):
+        with self.lock:
+            return dict(self.state['segment_state'][str(segment)])
+
+    def update(self, segment, **changes):
+        with self.lock:
+            self.state['segment_state'][str(segment)].update(changes)
+            tmp_path = self.path + '.tmp'
+            with open(tmp_path, 'w') as f:
+                json.dump(self.state, f, indent=1)
+            os.replace(tmp_path, self.path)
+
+
+def export_segment(client, options, checkpoint, segment, bucket, progress):
+    """
+    Scan one segment into its shards, resuming from the checkpoint
+    """
+    state = checkpoint.segment(segment)
+    if state['done']:
+        return
+    policy = RetryPolicy(max_attempts=options.max_attempts)
+    start_key = state['key']
+    shard = state['shard']
+    total = state['items']
+    files = list(state['files'])
+    writer = None
+    shard_items = 0
+
+    while True:
+        scan_kwargs = {
+            'TableName': options.table,
+            'Segment': segment,
+            'TotalSegments': checkpoint.state['segments'],
+            'Limit': options.page_size
+        }
+        if start_key:
+            scan_kwargs['ExclusiveStartKey'] = start_key
+        response = policy.call(client.scan, **scan_kwargs)
+        page = response.get('Items', [])
+        bucket.acquire(len(page))
+        start_key = response.get('LastEvaluatedKey')
+
+        if page and writer is None:
+            name = f"{options.prefix}-{segment:04d}-{shard:05d}.ndjson.gz"
+            path = os.path.join(options.output_dir, name)
+            writer = gzip.open(path + '.tmp', 'wt', encoding='utf-8', compresslevel=options.compress_level)
+        for item in page:
+            writer.write(json.dumps(deserialize_item(item), separators=(',', ':')) + '\n')
+        shard_items += len(page)
+        progress.add('exported', len(page))
+
+        if writer is not None and (shard_items >= options.shard_items or not start_key):
+            writer.close()
+            os.replace(path + '.tmp', path)
+            writer = None
+            total += shard_items
+            shard_items = 0
+            shard += 1
+            files.append(name)
+            progress.add('files')
+            checkpoint.update(segment, key=start_key, shard=shard, items=total, files=files, done=not start_key)
+        elif not start_key:
+            checkpoint.update(segment, key=None, done=True)
+        if not start_key:
+            return
+
+
+def export_items(options):
+    """
+    Export the table with a parallel segmented scan into gzip NDJSON shards
+    """
+    os.makedirs(options.output_dir, exist_ok=True)
+    checkpoint_path = options.checkpoint or os.path.join(options.output_dir, 'checkpoint.json')
+    resuming = not options.restart and os.path.exists(checkpoint_path)
+    checkpoint = Checkpoint.load(checkpoint_path, options)
+    # Shards of an interrupted run were never completed
+    for leftover in glob.glob(os.path.join(options.output_dir, f'{options.prefix}-*.ndjson.gz.tmp')):
+        os.remove(leftover)
+    # A new export must not mix its shards with those of an earlier one
+    shards = glob.glob(os.path.join(options.output_dir, f'{options.prefix}-*.ndjson.gz'))
+    if shards and not resuming:
+        if not options.restart:
+            raise SystemExit(f'{options.output_dir} already holds {options.prefix} shards without a checkpoint; '
+                             'use --restart to discard them or pick another --output-dir')
+        for shard in shards:
+            os.remove(shard)
+
+    segments = checkpoint.state['segments']
+    client = create_dynamodb_client(segments)
+    bucket = TokenBucket(options.rate)
+    progress = Progress(options.progress_seconds)
+    errors = {}
+
+    def run(segment):
+        try:
+            export_segment(client, options, checkpoint, segment, bucket, progress)
+        except Exception as e:
+            errors[segment] = f'{error_code(e)}: {str(e)}'
+
+    threads = [threading.Thread(target=run, args=(segment,), daemon=True) for segment in range(segments)]
+    for thread in threads:
+        thread.start()
+    while any(thread.is_alive() for thread in threads):
+        time.sleep(0.2)
+        progress.maybe_print('exported')
+
+    segment_state = checkpoint.state['segment_state']
+    return {
+        'mode': 'export',
+        'table': options.table,
+        'elapsed_seconds': round(progress.elapsed(), 3),
+        'exported': progress.get('exported'),
+        'total_items': sum(state['items'] for state in segment_state.values()),
+        'files': sum(len(state['files']) for state in segment_state.values()),
+        'complete': all(state['done'] for state in segment_state.values()),
+        'items_per_second': round(progress.get('exported') / progress.elapsed(), 1),
+        'checkpoint': checkpoint_path,
+        'errors': {str(segment): error for segment, error in sorted(errors.items())}
+    }
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    subparsers = parser.add_subparsers(dest='mode', required=True)
+
+    common = argparse.ArgumentParser(add_help=False)
+    common.add_argument('--table', required=True, help='items table name')
+    common.add_argument('--rate', type=float, default=0, help='items per second across all workers, 0 for no limit')
+    common.add_argument('--max-attempts', type=int, default=10, help='attempts per call for retryable errors')
+    common.add_argument('--progress-seconds', type=float, default=10, help='progress interval, 0 to disable')
+    common.add_argument('--output', help='write the report to this JSON file')
+
+    importer = subparsers.add_parser('import', parents=[common], help='load NDJSON into the table')
+    importer.add_argument('input', help='NDJSON file, optionally gzip-compressed, or - for stdin')
+    importer.add_argument('--workers', type=int, default=8, help='concurrent BatchWriteItem workers')
+    importer.add_argument('--keep-timestamps', action='store_true',
+                          help='keep created_at/updated_at present in the input')
+    importer.add_argument('--rejects', help='append lines that were not imported to this file')
+    importer.add_argument('--id-namespace',
+                          help='derive missing ids from this name and the line number instead of random ids, '
+                               'so a rerun of the same input rewrites the same items; use one name per input')
+
+    exporter = subparsers.add_parser('export', parents=[common], help='dump the table to gzip NDJSON shards')
+    exporter.add_argument('--output-dir', required=True, help='directory for shards and the checkpoint')
+    exporter.add_argument('--segments', type=int, default=8, help='parallel scan segments (fixed when resuming)')
+    exporter.add_argument('--shard-items', type=int, default=100000, help='items per shard file')
+    exporter.add_argument('--page-size', type=int, default=1000, help='Limit of each Scan call')
+    exporter.add_argument('--prefix', default='items', help='shard file name prefix')
+    exporter.add_argument('--compress-level', type=int, default=6, choices=range(1, 10), metavar='1-9')
+    exporter.add_argument('--checkpoint', help='checkpoint file (default: <output-dir>/checkpoint.json)')
+    exporter.add_argument('--restart', action='store_true',
+                          help='discard an existing checkpoint and the --prefix shards in --output-dir')
+
+    options = parser.parse_args(argv)
+    if getattr(options, 'workers', 1) < 1 or getattr(options, 'segments', 1) < 1:
+        parser.error('--workers and --segments must be at least 1')
+    return options
+
+
+def main(argv=None):
+    options = parse_args(argv)
+    summary = import_items(options) if options.mode == 'import' else export_items(options)
+
+    print(json.dumps(summary, indent=2))
+    if options.output:
+        with open(options.output, 'w') as f:
+            json.dump(summary, f, indent=2)
+    if options.mode == 'import':
+        return 1 if summary['rejected'] else 0
+    return 0 if summary['complete'] and not summary['errors'] else 1
+
+
+if __name__ == '__main__':
+    sys.exit(main())
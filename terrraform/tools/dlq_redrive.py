@@ -0,0 +1,511 @@
+#!/usr/bin/env python3
+"""
+Redrive messages from the dead-letter queue.
+
+A pool of workers long-polls the DLQ in batches of 10 and classifies every
+message: CRUD requests by their operation, notification queue messages
+(which carry a status and a result) as 'notification', anything else as
+unknown. Each class is replayed either back onto its source queue
+(--target queue, the default) or through the matching Lambda handler
+in-process (--target handler). A token bucket shared by all workers caps
+the replay rate, so draining a large backlog does not throttle the items
+table. A message is deleted from the DLQ only after its replay succeeded;
+failed and skipped messages become visible again when the visibility
+timeout expires. The run ends when the DLQ is drained or --max-messages
+have been received, and reports throughput, per-class counts and a
+breakdown of errors.
+
+Replayed CRUD messages keep their requestId, so requests that completed
+before they were dead-lettered are skipped by the idempotency table.
+
+Usage:
+    python tools/dlq_redrive.py --dlq-url "$(terraform output -json queue_urls | jq -r .dlq)" \\
+        --crud-queue-url "$(terraform output -json queue_urls | jq -r .crud)"
+    python tools/dlq_redrive.py ... --rate 200 --workers 16 --operations update delete
+    python tools/dlq_redrive.py ... --dry-run --max-messages 1000
+    python tools/dlq_redrive.py --dlq-url ... --target handler \\
+        --env TABLE_NAME=crud-items IDEMPOTENCY_TABLE_NAME=crud-app-idempotency
+"""
+import argparse
+import importlib.util
+import json
+import os
+import sys
+import threading
+import time
+import uuid
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+
+from rate_limit import TokenBucket, error_code
+
+TOOLS_DIR = os.path.dirname(os.path.abspath(__file__))
+FUNCTIONS_DIR = os.path.join(os.path.dirname(TOOLS_DIR), 'lambda-functions')
+SHARED_DIR = os.path.join(FUNCTIONS_DIR, 'shared')
+
+# ReceiveMessage, SendMessageBatch and DeleteMessageBatch limits
+SQS_BATCH_SIZE = 10
+SQS_BATCH_MAX_BYTES = 256 * 1024
+
+NOTIFICATION = 'notification'
+UNKNOWN = 'unknown'
+
+# Function that handles each message class
+HANDLER_FUNCTIONS = {
+    'create': 'create',
+    'get': 'read',
+    'list': 'read',
+    'update': 'update',
+    'delete': 'delete',
+    NOTIFICATION: 'notification'
+}
+
+# Time budget reported to handlers, the default lambda_timeout
+HANDLER_TIMEOUT_MS = 15000
+
+
+class Context:
+    """Minimal Lambda context for in-process replays"""
+    function_name = 'dlq-redrive'
+
+    def __init__(self):
+        self.aws_request_id = str(uuid.uuid4())
+        self.deadline = time.monotonic() + HANDLER_TIMEOUT_MS / 1000
+
+    def get_remaining_time_in_millis(self):
+        return max(0, int((self.deadline - time.monotonic()) * 1000))
+
+
+def classify(body):
+    """
+    Return the message class of a DLQ message body
+    """
+    try:
+        data = json.loads(body)
+    except ValueError:
+        return UNKNOWN
+    if not isinstance(data, dict):
+        return UNKNOWN
+    if 'status' in data and 'result' in data:
+        return NOTIFICATION
+    operation = data.get('operation')
+    return operation if operation in HANDLER_FUNCTIONS else UNKNOWN
+
+
+def pack(messages):
+    """
+    Split messages into SendMessageBatch sized groups
+    """
+    batches = []
+    current = []
+    current_bytes = 0
+    for message in messages:
+        size = len(message['Body'].encode('utf-8'))
+        if current and (len(current) >= SQS_BATCH_SIZE or current_bytes + size > SQS_BATCH_MAX_BYTES):
+            batches.append(current)
+            current = []
+            current_bytes = 0
+        current.append(message)
+        current_bytes += size
+    if current:
+        batches.append(current)
+    return batches
+
+
+class QueueReplayer:
+    """
+    Sends messages back onto the queue they were dead-lettered from
+    """
+
+    def __init__(self, sqs, crud_queue_url, notification_queue_url):
+        self.sqs = sqs
+        self.crud_queue_url = crud_queue_url
+        self.notification_queue_url = notification_queue_url
+
+    def route(self, message_class):
+        return self.notification_queue_url if message_class == NOTIFICATION else self.crud_queue_url
+
+    def replay(self, queue_url, messages):
+        """
+        Returns {MessageId: error} for the messages that were not sent
+        """
+        errors = {}
+        for batch in pack(messages):
+            entries = []
+            for index, message in enumerate(batch):
+                entry = {'Id': str(index), 'MessageBody': message['Body']}
+                if message.get('MessageAttributes'):
+                    entry['MessageAttributes'] = message['MessageAttributes']
+                entries.append(entry)
+            try:
+                response = self.sqs.send_message_batch(QueueUrl=queue_url, Entries=entries)
+            except Exception as e:
+                for message in batch:
+                    errors[message['MessageId']] = f'SendMessageBatch {error_code(e)}'
+                continue
+            for entry in response.get('Failed', []):
+                errors[batch[int(entry['Id'])]['MessageId']] = f"SendMessageBatch {entry.get('Code')}"
+        return errors
+
+
+class HandlerReplayer:
+    """
+    Invokes the matching Lambda handler in-process with an SQS event
+    """
+
+    def __init__(self):
+        self.handlers = {}
+        self.lock = threading.Lock()
+
+    def route(self, message_class):
+        return HANDLER_FUNCTIONS.get(message_class)
+
+    def handler(self, function):
+        with self.lock:
+            if function not in self.handlers:
+                path = os.path.join(FUNCTIONS_DIR, function, 'lambda_function.py')
+                spec = importlib.util.spec_from_file_location(f"redrive_{function}", path)
+                module = importlib.util.module_from_spec(spec)
+                spec.loader.exec_module(module)
+                self.handlers[function] = module.lambda_handler
+            return self.handlers[function]
+
+    def replay(self, function, messages):
+        """
+        Returns {MessageId: error} for the messages the handler did not process
+        """
+        event = {
+            'Records': [
+                {
+                    'messageId': message['MessageId'],
+                    'receiptHandle': message['ReceiptHandle'],
+                    'body': message['Body'],
+                    'attributes': message.get('Attributes', {}),
+                    'eventSource': 'aws:sqs'
+                }
+                for message in messages
+            ]
+        }
+        try:
+            result = self.handler(function)(event, Context())
+        except Exception as e:
+            return {message['MessageId']: f'{function} handler {error_code(e)}' for message in messages}
+
+        if isinstance(result, dict) and 'batchItemFailures' in result:
+            return {
+                failure['itemIdentifier']: f'{function} handler batchItemFailure'
+                for failure in result['batchItemFailures']
+            }
+        status_code = result.get('statusCode', 200) if isinstance(result, dict) else 500
+        if isinstance(status_code, int) and status_code >= 400:
+            return {message['MessageId']: f'{function} handler status {status_code}' for message in messages}
+        return {}
+
+
+class Report:
+    """
+    Thread-safe counters of one redrive run
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.started = time.monotonic()
+        # {message class: Counter(received, replayed, deleted, failed, skipped)}
+        self.classes = {}
+        self.errors = Counter()
+        self.skipped = Counter()
+
+    def count(self, message_class, outcome, value=1):
+        with self.lock:
+            self.classes.setdefault(message_class, Counter())[outcome] += value
+
+    def error(self, message_class, error):
+        with self.lock:
+            self.classes.setdefault(message_class, Counter())['failed'] += 1
+            self.errors[f'{message_class}: {error}'] += 1
+
+    def skip(self, message_class, reason):
+        with self.lock:
+            self.classes.setdefault(message_class, Counter())['skipped'] += 1
+            self.skipped[f'{message_class}: {reason}'] += 1
+
+    def totals(self):
+        with self.lock:
+            totals = Counter()
+            for counts in self.classes.values():
+                totals.update(counts)
+            return totals
+
+    def summary(self):
+        elapsed = time.monotonic() - self.started
+        with self.lock:
+            classes = {name: dict(counts) for name, counts in sorted(self.classes.items())}
+            errors = dict(self.errors.most_common())
+            skipped = dict(self.skipped.most_common())
+        totals = Counter()
+        for counts in classes.values():
+            totals.update(counts)
+        return {
+            'elapsed_seconds': round(elapsed, 3),
+            'received': totals['received'],
+            'replayed': totals['replayed'],
+            'deleted': totals['deleted'],
+            'failed': totals['failed'],
+            'skipped': totals['skipped'],
+            'messages_per_second': round(totals['replayed'] / elapsed, 1) if elapsed else 0.0,
+            'classes': classes,
+            'errors': errors,
+            'skipped_reasons': skipped
+        }
+
+
+class Redrive:
+    """
+    Receives, replays and deletes DLQ messages with a pool of workers
+    """
+
+    def __init__(self, options, sqs, replayer):
+        self.options = options
+        self.sqs = sqs
+        self.replayer = replayer
+        self.bucket = TokenBucket(options.rate, options.burst)
+        self.report = Report()
+        self.stop = threading.Event()
+        self.lock = threading.Lock()
+        self.remaining = options.max_messages
+        # MessageIds handled in this run; failed and skipped messages that
+        # become visible again are not replayed twice
+        self.seen = set()
+        self.last_progress = time.monotonic()
+
+    def take(self, count):
+        """
+        Reserve up to count messages of the --max-messages budget
+        """
+        with self.lock:
+            if self.remaining is None:
+                return count
+            granted = min(count, self.remaining)
+            self.remaining -= granted
+            return granted
+
+    def receive(self):
+        """
+        Long-poll one batch. Returns only messages not seen before in this run.
+        """
+        count = self.take(SQS_BATCH_SIZE)
+        if not count:
+            self.stop.set()
+            return None
+        response = self.sqs.receive_message(
+            QueueUrl=self.options.dlq_url,
+            MaxNumberOfMessages=count,
+            WaitTimeSeconds=self.options.wait_seconds,
+            VisibilityTimeout=self.options.visibility_timeout,
+            MessageAttributeNames=['All'],
+            AttributeNames=['ApproximateReceiveCount']
+        )
+        messages = response.get('Messages', [])
+        with self.lock:
+            new = [message for message in messages if message['MessageId'] not in self.seen]
+            self.seen.update(message['MessageId'] for message in new)
+            if self.remaining is not None:
+                self.remaining += count - len(new)
+        return new
+
+    def delete(self, messages):
+        """
+        Delete replayed messages from the DLQ in one call
+        """
+        try:
+            response = self.sqs.delete_message_batch(
+                QueueUrl=self.options.dlq_url,
+                Entries=[
+                    {'Id': str(index), 'ReceiptHandle': message['ReceiptHandle']}
+                    for index, message in enumerate(messages)
+                ]
+            )
+        except Exception as e:
+            for message in messages:
+                self.report.error(message['class'], f'DeleteMessageBatch {error_code(e)}')
+            return
+        for entry in response.get('Successful', []):
+            self.report.count(messages[int(entry['Id'])]['class'], 'deleted')
+        for entry in response.get('Failed', []):
+            self.report.error(messages[int(entry['Id'])]['class'], f"DeleteMessageBatch {entry.get('Code')}")
+
+    def process(self, messages):
+        """
+        Classify, replay and delete one received batch
+        """
+        routes = {}
+        for message in messages:
+            message_class = classify(message['Body'])
+            message['class'] = message_class
+            self.report.count(message_class, 'received')
+            if message_class == UNKNOWN:
+                self.report.skip(message_class, 'unrecognised message')
+            elif self.options.operations and message_class not in self.options.operations:
+                self.report.skip(message_class, 'operation not selected')
+            elif self.options.dry_run:
+                self.report.skip(message_class, 'dry run')
+            elif not self.replayer.route(message_class):
+                self.report.skip(message_class, 'no target')
+            else:
+                routes.setdefault(self.replayer.route(message_class), []).append(message)
+
+        replayed = []
+        for route, batch in routes.items():
+            self.bucket.acquire(len(batch))
+            errors = self.replayer.replay(route, batch)
+            for message in batch:
+                if message['MessageId'] in errors:
+                    self.report.error(message['class'], errors[message['MessageId']])
+                else:
+                    self.report.count(message['class'], 'replayed')
+                    replayed.append(message)
+        # Only replayed messages leave the DLQ
+        if replayed:
+            self.delete(replayed)
+
+    def worker(self):
+        """
+        Loop until the DLQ stays empty for --idle-polls receives or the run stops
+        """
+        idle = 0
+        while not self.stop.is_set() and idle < self.options.idle_polls:
+            try:
+                messages = self.receive()
+            except Exception as e:
+                self.report.error('receive', f'ReceiveMessage {error_code(e)}')
+                idle += 1
+                time.sleep(1)
+                continue
+            if messages is None:
+                return
+            if not messages:
+                idle += 1
+                continue
+            idle = 0
+            self.process(messages)
+
+    def run(self, progress_seconds):
+        """
+        Run the worker pool, printing progress while it drains the DLQ
+        """
+        with ThreadPoolExecutor(max_workers=self.options.workers) as executor:
+            futures = [executor.submit(self.worker) for _ in range(self.options.workers)]
+            try:
+                while not all(future.done() for future in futures):
+                    time.sleep(0.2)
+                    if progress_seconds and time.monotonic() - self.last_progress >= progress_seconds:
+                        self.print_progress()
+            except KeyboardInterrupt:
+                print('Stopping after the batches in flight...', file=sys.stderr)
+                self.stop.set()
+            for future in futures:
+                future.result()
+        return self.report.summary()
+
+    def print_progress(self):
+        self.last_progress = time.monotonic()
+        totals = self.report.totals()
+        elapsed = self.last_progress - self.report.started
+        rate = totals['replayed'] / elapsed if elapsed else 0.0
+        print(f"{elapsed:8.1f}s  received {totals['received']}  replayed {totals['replayed']}  "
+              f"failed {totals['failed']}  skipped {totals['skipped']}  ({rate:.0f} msg/s)",
+              file=sys.stderr)
+
+
+def print_report(summary):
+    print(f"Redrive finished in {summary['elapsed_seconds']:.1f} s: "
+          f"{summary['replayed']} of {summary['received']} messages replayed "
+          f"({summary['messages_per_second']:.1f} messages/s), {summary['deleted']} deleted, "
+          f"{summary['failed']} failed, {summary['skipped']} skipped")
+    print()
+    print(f"{'class':<14}{'received':>10}{'replayed':>10}{'deleted':>10}{'failed':>10}{'skipped':>10}")
+    for name, counts in summary['classes'].items():
+        print(f"{name:<14}" + ''.join(
+            f"{counts.get(outcome, 0):>10}"
+            for outcome in ('received', 'replayed', 'deleted', 'failed', 'skipped')
+        ))
+    for title, breakdown in (('Errors', summary['errors']), ('Skipped', summary['skipped_reasons'])):
+        if breakdown:
+            print()
+            print(f'{title}:')
+            for reason, count in breakdown.items():
+                print(f'  {count:>8}  {reason}')
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--dlq-url', required=True, help='URL of the dead-letter queue')
+    parser.add_argument('--target', choices=('queue', 'handler'), default='queue',
+                        help='replay onto the source queues or through the handlers in-process')
+    parser.add_argument('--crud-queue-url', help='queue for CRUD messages (--target queue)')
+    parser.add_argument('--notification-queue-url', help='queue for notification messages (--target queue)')
+    parser.add_argument('--operations', nargs='+', choices=sorted(HANDLER_FUNCTIONS),
+                        help='only replay these message classes')
+    parser.add_argument('--rate', type=float, default=500,
+                        help='replayed messages per second across all workers, 0 for no limit')
+    parser.add_argument('--burst', type=float, help='token bucket size (default: one second of --rate)')
+    parser.add_argument('--workers', type=int, default=16, help='concurrent receive/replay workers')
+    parser.add_argument('--max-messages', type=int, help='stop after receiving this many messages')
+    parser.add_argument('--wait-seconds', type=int, default=5, help='ReceiveMessage long-poll wait (0-20)')
+    parser.add_argument('--idle-polls', type=int, default=2,
+                        help='empty receives after which a worker stops')
+    parser.add_argument('--visibility-timeout', type=int, default=300,
+                        help='seconds received messages stay hidden from other consumers')
+    parser.add_argument('--dry-run', action='store_true', help='classify and count only')
+    parser.add_argument('--env', nargs='*', default=[], metavar='KEY=VALUE',
+                        help='environment for the handlers (--target handler)')
+    parser.add_argument('--progress-seconds', type=float, default=10, help='progress interval, 0 to disable')
+    parser.add_argument('--output', help='write the report to this JSON file')
+    options = parser.parse_args(argv)
+    if options.target == 'queue' and not options.dry_run and not (options.crud_queue_url or options.notification_queue_url):
+        parser.error('--target queue needs --crud-queue-url and/or --notification-queue-url')
+    if not 0 <= options.wait_seconds <= 20:
+        parser.error('--wait-seconds must be between 0 and 20')
+    if options.workers < 1:
+        parser.error('--workers must be at least 1')
+    return options
+
+
+def create_sqs_client(workers):
+    import boto3
+    from botocore.config import Config
+    return boto3.client('sqs', config=Config(
+        max_pool_connections=max(10, workers * 2),
+        retries={'max_attempts': 5, 'mode': 'adaptive'}
+    ))
+
+
+def main(argv=None):
+    options = parse_args(argv)
+
+    if options.target == 'handler':
+        # Handlers read their settings at import time
+        os.environ.setdefault('METRICS_ENABLED', 'false')
+        for assignment in options.env:
+            key, _, value = assignment.partition('=')
+            os.environ[key] = value
+        os.environ.setdefault('AWS_MAX_POOL_CONNECTIONS', str(max(32, options.workers * 2)))
+        sys.path.insert(0, SHARED_DIR)
+        replayer = HandlerReplayer()
+    else:
+        replayer = None
+
+    sqs = create_sqs_client(options.workers)
+    if replayer is None:
+        replayer = QueueReplayer(sqs, options.crud_queue_url, options.notification_queue_url)
+
+    summary = Redrive(options, sqs, replayer).run(options.progress_seconds)
+    print_report(summary)
+    if options.output:
+        with open(options.output, 'w') as f:
+            json.dump(summary, f, indent=2)
+    return 1 if summary['failed'] else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,50 @@
+"""
+Rate limiting and error helpers shared by the command-line tools.
+"""
+import threading
+import time
+
+
+def error_code(error):
+    """
+    Return the AWS error code of a botocore ClientError, or the exception type
+    """
+    response = getattr(error, 'response', None)
+    if isinstance(response, dict) and response.get('Error', {}).get('Code'):
+        return response['Error']['Code']
+    return type(error).__name__
+
+
+class TokenBucket:
+    """
+    Thread-safe token bucket refilled at rate tokens per second, holding at
+    most burst tokens (one second of rate by default).
+    A rate of 0 disables the limit.
+    """
+
+    def __init__(self, rate, burst=None):
+        self.rate = rate
+        self.capacity = burst or rate
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def acquire(self, count):
+        """
+        Block until count tokens have been taken. Counts larger than the
+        bucket are taken in slices of at most its capacity.
+        """
+        if self.rate <= 0:
+            return
+        while count > 0:
+            needed = min(count, self.capacity)
+            with self.lock:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= needed:
+                    self.tokens -= needed
+                    count -= needed
+                    continue
+                wait = (needed - self.tokens) / self.rate
+            time.sleep(wait)
@@ -85,3 +85,137 @@ variable "enable_deletion_protection" {
   type        = bool
   default     = false
 }
+
+variable "create_batch_size" {
+  description = "Maximum number of SQS messages delivered to the create Lambda per invocation"
+  type        = number
+  default     = 100
+  validation {
+    condition     = var.create_batch_size >= 1 && var.create_batch_size <= 10000
+    error_message = "Create batch size must be between 1 and 10000."
+  }
+}
+
+variable "create_batching_window_seconds" {
+  description = "Maximum time in seconds to gather records for the create Lambda when batch size is above 10"
+  type        = number
+  default     = 1
+}
+
+variable "update_batch_size" {
+  description = "Maximum number of SQS messages delivered to the update Lambda per invocation; updates of one id in a batch are coalesced"
+  type        = number
+  default     = 10
+  validation {
+    condition     = var.update_batch_size >= 1 && var.update_batch_size <= 10000
+    error_message = "Update batch size must be between 1 and 10000."
+  }
+}
+
+variable "update_batching_window_seconds" {
+  description = "Maximum time in seconds to gather records for the update Lambda, so bursts of updates to one id share a batch"
+  type        = number
+  default     = 1
+}
+
+variable "enable_crud_router" {
+  description = "Deploy one router Lambda for all CRUD operations instead of separate create, read, update and delete functions"
+  type        = bool
+  default     = false
+}
+
+variable "router_batch_size" {
+  description = "Maximum number of SQS messages delivered to the router Lambda per invocation"
+  type        = number
+  default     = 10
+  validation {
+    condition     = var.router_batch_size >= 1 && var.router_batch_size <= 10000
+    error_message = "Router batch size must be between 1 and 10000."
+  }
+}
+
+variable "router_batching_window_seconds" {
+  description = "Maximum time in seconds to gather records for the router Lambda when batch size is above 10"
+  type        = number
+  default     = 1
+}
+
+variable "notification_batch_size" {
+  description = "Maximum number of SQS messages delivered to the notification Lambda per invocation"
+  type        = number
+  default     = 10
+}
+
+variable "notification_fanout_workers" {
+  description = "Maximum number of concurrent WebSocket posts per notification Lambda invocation"
+  type        = number
+  default     = 16
+}
+
+variable "notification_connection_cache_ttl" {
+  description = "Seconds the notification Lambda caches requestId connection lookups (0 disables the cache)"
+  type        = number
+  default     = 5
+}
+
+variable "read_scan_segments" {
+  description = "Default number of segments used by parallel list scans in the read Lambda"
+  type        = number
+  default     = 4
+}
+
+variable "item_indexes" {
+  description = "Global secondary indexes on string attributes used by filtered list queries (range_key may be empty)"
+  type = list(object({
+    name      = string
+    hash_key  = string
+    range_key = string
+  }))
+  default = [
+    {
+      name      = "status-created_at-index"
+      hash_key  = "status"
+      range_key = "created_at"
+    }
+  ]
+}
+
+variable "read_list_filter_attributes" {
+  description = "Comma separated attributes, besides index keys, that list requests may filter on"
+  type        = string
+  default     = ""
+}
+
+variable "read_item_cache_ttl" {
+  description = "Seconds the read Lambda serves single items from its warm-container cache (0 disables the cache)"
+  type        = number
+  default     = 5
+}
+
+variable "cold_start_mode" {
+  description = "When Lambda functions build their AWS clients: lazy (on first use) or eager (during init, e.g. with provisioned concurrency)"
+  type        = string
+  default     = "lazy"
+  validation {
+    condition     = contains(["lazy", "eager"], var.cold_start_mode)
+    error_message = "Cold start mode must be one of: lazy, eager."
+  }
+}
+
+variable "metrics_enabled" {
+  description = "Emit per-invocation stage timings as CloudWatch Embedded Metric Format records"
+  type        = bool
+  default     = true
+}
+
+variable "idempotency_ttl_seconds" {
+  description = "How long completed requests are remembered to skip SQS redeliveries"
+  type        = number
+  default     = 86400
+}
+
+variable "websocket_connection_ttl_seconds" {
+  description = "Lifetime of WebSocket connection records before DynamoDB TTL removes them"
+  type        = number
+  default     = 7200
+}
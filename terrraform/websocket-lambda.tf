@@ -18,8 +18,24 @@ resource "aws_sqs_queue" "notification_queue" {
 # Notification Lambda Function
 data "archive_file" "notification_lambda_zip" {
   type        = "zip"
-  source_dir  = "${path.module}/lambda-functions/notification"
   output_path = "${path.module}/lambda-functions/notification.zip"
+
+  dynamic "source" {
+    for_each = fileset("${local.lambda_source_dir}/notification", "*.py")
+    content {
+      content  = file("${local.lambda_source_dir}/notification/${source.value}")
+      filename = source.value
+    }
+  }
+
+  # Shared runtime modules are packaged next to every handler
+  dynamic "source" {
+    for_each = local.shared_lambda_files
+    content {
+      content  = file("${local.lambda_source_dir}/shared/${source.value}")
+      filename = source.value
+    }
+  }
 }
 
 resource "aws_lambda_function" "notification_lambda" {
@@ -37,6 +53,12 @@ resource "aws_lambda_function" "notification_lambda" {
       CONNECTIONS_TABLE_NAME  = aws_dynamodb_table.connections_table.name
       WEBSOCKET_API_ENDPOINT  = "${aws_apigatewayv2_api.websocket_api.api_endpoint}/${aws_apigatewayv2_stage.websocket_stage.name}"
       LOG_LEVEL              = var.log_level
+      COLD_START_MODE        = var.cold_start_mode
+      METRICS_ENABLED        = var.metrics_enabled
+      POWERTOOLS_SERVICE_NAME = "${var.project_name}-notification"
+      POWERTOOLS_METRICS_NAMESPACE = var.project_name
+      FANOUT_MAX_WORKERS     = var.notification_fanout_workers
+      CONNECTION_CACHE_TTL   = var.notification_connection_cache_ttl
     }
   }
 
@@ -51,7 +73,7 @@ resource "aws_lambda_function" "notification_lambda" {
 resource "aws_lambda_event_source_mapping" "notification_event_source" {
   event_source_arn = aws_sqs_queue.notification_queue.arn
   function_name    = aws_lambda_function.notification_lambda.arn
-  batch_size       = 1
+  batch_size       = var.notification_batch_size
   enabled          = true
 }
 
@@ -71,20 +93,68 @@ resource "aws_cloudwatch_log_group" "notification_lambda_logs" {
 # WebSocket Lambda Functions
 data "archive_file" "websocket_connect_lambda_zip" {
   type        = "zip"
-  source_dir  = "${path.module}/lambda-functions/websocket-connect"
   output_path = "${path.module}/lambda-functions/websocket-connect.zip"
+
+  dynamic "source" {
+    for_each = fileset("${local.lambda_source_dir}/websocket-connect", "*.py")
+    content {
+      content  = file("${local.lambda_source_dir}/websocket-connect/${source.value}")
+      filename = source.value
+    }
+  }
+
+  # Shared runtime modules are packaged next to every handler
+  dynamic "source" {
+    for_each = local.shared_lambda_files
+    content {
+      content  = file("${local.lambda_source_dir}/shared/${source.value}")
+      filename = source.value
+    }
+  }
 }
 
 data "archive_file" "websocket_disconnect_lambda_zip" {
   type        = "zip"
-  source_dir  = "${path.module}/lambda-functions/websocket-disconnect"
   output_path = "${path.module}/lambda-functions/websocket-disconnect.zip"
+
+  dynamic "source" {
+    for_each = fileset("${local.lambda_source_dir}/websocket-disconnect", "*.py")
+    content {
+      content  = file("${local.lambda_source_dir}/websocket-disconnect/${source.value}")
+      filename = source.value
+    }
+  }
+
+  # Shared runtime modules are packaged next to every handler
+  dynamic "source" {
+    for_each = local.shared_lambda_files
+    content {
+      content  = file("${local.lambda_source_dir}/shared/${source.value}")
+      filename = source.value
+    }
+  }
 }
 
 data "archive_file" "websocket_default_lambda_zip" {
   type        = "zip"
-  source_dir  = "${path.module}/lambda-functions/websocket-default"
   output_path = "${path.module}/lambda-functions/websocket-default.zip"
+
+  dynamic "source" {
+    for_each = fileset("${local.lambda_source_dir}/websocket-default", "*.py")
+    content {
+      content  = file("${local.lambda_source_dir}/websocket-default/${source.value}")
+      filename = source.value
+    }
+  }
+
+  # Shared runtime modules are packaged next to every handler
+  dynamic "source" {
+    for_each = local.shared_lambda_files
+    content {
+      content  = file("${local.lambda_source_dir}/shared/${source.value}")
+      filename = source.value
+    }
+  }
 }
 
 resource "aws_lambda_function" "websocket_connect_lambda" {
@@ -101,6 +171,8 @@ resource "aws_lambda_function" "websocket_connect_lambda" {
     variables = {
       CONNECTIONS_TABLE_NAME = aws_dynamodb_table.connections_table.name
       LOG_LEVEL             = var.log_level
+      COLD_START_MODE       = var.cold_start_mode
+      CONNECTION_TTL_SECONDS = var.websocket_connection_ttl_seconds
     }
   }
 
@@ -125,6 +197,7 @@ resource "aws_lambda_function" "websocket_disconnect_lambda" {
     variables = {
       CONNECTIONS_TABLE_NAME = aws_dynamodb_table.connections_table.name
       LOG_LEVEL             = var.log_level
+      COLD_START_MODE       = var.cold_start_mode
     }
   }
 
@@ -149,6 +222,8 @@ resource "aws_lambda_function" "websocket_default_lambda" {
     variables = {
       CONNECTIONS_TABLE_NAME = aws_dynamodb_table.connections_table.name
       LOG_LEVEL             = var.log_level
+      COLD_START_MODE       = var.cold_start_mode
+      CONNECTION_TTL_SECONDS = var.websocket_connection_ttl_seconds
     }
   }
 
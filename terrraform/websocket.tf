@@ -90,6 +90,8 @@ resource "aws_dynamodb_table" "connections_table" {
   name           = "${var.project_name}-connections"
   billing_mode   = "PAY_PER_REQUEST"
   hash_key       = "connectionId"
+  # One row per subscription, so a connection can follow many requests
+  range_key      = "requestId"
   
   attribute {
     name = "connectionId"
@@ -107,6 +109,12 @@ resource "aws_dynamodb_table" "connections_table" {
     projection_type    = "ALL"
   }
 
+  # Stale connections expire on their own
+  ttl {
+    attribute_name = "expires_at"
+    enabled        = true
+  }
+
   tags = {
     Name        = "${var.project_name}-connections-table"
     Environment = var.environment